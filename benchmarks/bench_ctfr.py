@@ -0,0 +1,315 @@
+"""Performance benchmarks for the ctfr combination methods.
+
+Two kinds of benchmarks are run:
+
+- ``kernel``: each combination method is called directly on a random spectrograms tensor (the power spectrograms of
+  white noise), sweeping the number of spectrograms P, of frequency bins K and of time frames M, and then each of the
+  method's window sizes (``lk``, ``lm``, ``lsk``, ``lsm``, ``lek``, ``lem``) at a fixed tensor shape.
+- ``end_to_end``: :func:`ctfr.ctfr` is called on an audio file (``data/synthetic.wav`` by default) with the STFT and the
+  CQT front-ends, so the spectrograms computation and normalization are included in the timings.
+
+For each case, the wall time of several runs, the peak resident set size (RSS) and the throughput in output
+time-frequency bins per second (K * M / fastest run time) are recorded. By default, each case runs in a fresh process, so
+the peak RSS only accounts for that case. Results are written as JSON, and can be compared with the results of a
+previous run to detect regressions::
+
+    python benchmarks/bench_ctfr.py --output results.json
+    python benchmarks/bench_ctfr.py --quick --compare results.json --threshold 1.2
+
+The package (including its Cython extensions) must be installed or built in place (``make ext``). Run with ``--help``
+for all options.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime, timezone
+from statistics import median
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_AUDIO_PATH = os.path.join(REPO_DIR, "data", "synthetic.wav")
+
+# Tensor shapes of the kernel benchmarks. All combinations of P, K and M are run for each method.
+SHAPE_GRIDS = {
+    "full": {"P": [2, 3, 5], "K": [257, 513, 1025], "M": [128, 512]},
+    "quick": {"P": [3], "K": [129], "M": [64]},
+}
+
+# Window sizes swept for each method that has the parameter, one parameter at a time, with the tensor shape below.
+WINDOW_GRIDS = {
+    "full": {
+        "lk": [11, 21, 41], "lm": [5, 11, 21],
+        "lsk": [11, 21, 41], "lsm": [5, 11, 21],
+        "lek": [5, 11, 21], "lem": [5, 11, 21],
+    },
+    "quick": {
+        "lk": [11, 41], "lm": [5, 21],
+        "lsk": [11, 41], "lsm": [5, 21],
+        "lek": [5, 21], "lem": [5, 21],
+    },
+}
+WINDOW_SHAPES = {
+    "full": {"P": 3, "K": 513, "M": 128},
+    "quick": {"P": 3, "K": 129, "M": 64},
+}
+
+# Representation types of the end-to-end benchmarks.
+REPRESENTATION_TYPES = ["stft", "cqt"]
+
+
+def _method_kwargs(method, P):
+    """Arguments required by a method when called directly on a spectrograms tensor."""
+    if method == "sls_i":
+        # Interpolation steps of 1 compute the local sparsity in every bin (the most expensive case).
+        return {"interp_steps": np.ones((P, 2), dtype=int)}
+    return {}
+
+
+# =============================================================================
+# Cases.
+
+def get_cases(args):
+    """Returns the list of benchmark cases to run, as JSON-serializable dictionaries."""
+    from ctfr import get_methods_list
+    from ctfr.utils.private import _get_method_parameters
+
+    grid = "quick" if args.quick else "full"
+    methods = args.methods if args.methods else get_methods_list()
+    cases = []
+
+    if "kernel" in args.benchmarks:
+        shapes = SHAPE_GRIDS[grid]
+        for method in methods:
+            for P in shapes["P"]:
+                for K in shapes["K"]:
+                    for M in shapes["M"]:
+                        cases.append({"benchmark": "kernel", "method": method, "P": P, "K": K, "M": M, "params": {}})
+
+            parameters = _get_method_parameters(method) or {}
+            for name, values in WINDOW_GRIDS[grid].items():
+                if name not in parameters:
+                    continue
+                for value in values:
+                    cases.append({"benchmark": "kernel", "method": method, **WINDOW_SHAPES[grid], "params": {name: value}})
+
+    if "end_to_end" in args.benchmarks:
+        for representation_type in REPRESENTATION_TYPES:
+            for method in methods:
+                cases.append({
+                    "benchmark": "end_to_end", "method": method, "representation_type": representation_type,
+                    "audio": os.path.relpath(args.audio, REPO_DIR), "params": {}
+                })
+
+    for case in cases:
+        case["id"] = _case_id(case)
+    return cases
+
+
+def _case_id(case):
+    parts = [case["benchmark"], case["method"]]
+    if case["benchmark"] == "kernel":
+        parts.append(f"P={case['P']},K={case['K']},M={case['M']}")
+    else:
+        parts.append(case["representation_type"])
+    parts.extend(f"{key}={value}" for key, value in sorted(case["params"].items()))
+    return ":".join(parts)
+
+
+# =============================================================================
+# Running.
+
+def run_case(case, repeat, audio_path):
+    """Runs a benchmark case and returns its measurements. Runs in the worker process when cases are isolated."""
+    import ctfr
+    from ctfr.exception import ArgumentRequiredError
+    from ctfr.utils.private import _get_method_function
+
+    warnings.simplefilter("ignore")
+
+    if case["benchmark"] == "kernel":
+        P, K, M = case["P"], case["K"], case["M"]
+        X = np.random.default_rng(0).exponential(size=(P, K, M))
+        function = _get_method_function(case["method"])
+        kwargs = {**_method_kwargs(case["method"], P), **case["params"]}
+        call = lambda: function(X, **kwargs)
+    else:
+        signal, sr = ctfr.load(audio_path)
+        call = lambda: ctfr.ctfr(signal, sr, case["method"], representation_type=case["representation_type"], **case["params"])
+
+    rss_before = _peak_rss_bytes()
+    times = []
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = call()
+            times.append(time.perf_counter() - start)
+    except ArgumentRequiredError as e:
+        return {"skipped": str(e)}
+    rss_after = _peak_rss_bytes()
+
+    K, M = result.shape
+    return {
+        "K": K,
+        "M": M,
+        "times": times,
+        "time_min": min(times),
+        "time_median": median(times),
+        "bins_per_second": K * M / min(times),
+        "peak_rss_bytes": rss_after,
+        "peak_rss_increase_bytes": None if rss_after is None else rss_after - rss_before,
+    }
+
+
+def _peak_rss_bytes():
+    """Peak resident set size of the current process, or None if it's not available in this platform."""
+    try:
+        import resource
+    except ImportError: # Windows.
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _run_case_in_child(connection, case, repeat, audio_path):
+    try:
+        connection.send(run_case(case, repeat, audio_path))
+    except Exception as e:
+        connection.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        connection.close()
+
+
+def run_isolated(case, repeat, audio_path):
+    """Runs a benchmark case in a new process, so the peak RSS only accounts for the case."""
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_case_in_child, args=(sender, case, repeat, audio_path))
+    process.start()
+    sender.close()
+    try:
+        measurements = receiver.recv()
+    except EOFError:
+        measurements = {"error": "Benchmark process exited unexpectedly."}
+    process.join()
+    return measurements
+
+
+def run_all(cases, args):
+    results = []
+    for index, case in enumerate(cases, start=1):
+        if args.in_process:
+            try:
+                measurements = run_case(case, args.repeat, args.audio)
+            except Exception as e:
+                measurements = {"error": f"{type(e).__name__}: {e}"}
+            # The peak RSS of the process is not specific to the case.
+            measurements.pop("peak_rss_bytes", None)
+            measurements.pop("peak_rss_increase_bytes", None)
+        else:
+            measurements = run_isolated(case, args.repeat, args.audio)
+        result = {**case, **measurements}
+        results.append(result)
+        print(f"[{index}/{len(cases)}] {_format_result(result)}", flush=True)
+    return results
+
+
+def _format_result(result):
+    if "error" in result:
+        return f"{result['id']}: error ({result['error']})"
+    if "skipped" in result:
+        return f"{result['id']}: skipped"
+    line = f"{result['id']}: {result['time_min'] * 1e3:.2f} ms, {result['bins_per_second'] / 1e6:.3f} Mbins/s"
+    if result.get("peak_rss_bytes") is not None:
+        line += f", peak RSS {result['peak_rss_bytes'] / 2**20:.1f} MiB"
+    return line
+
+
+# =============================================================================
+# Output and comparison.
+
+def get_metadata(args):
+    import ctfr
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "ctfr_version": ctfr.__version__,
+        "git_commit": commit,
+        "numpy_version": np.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "grid": "quick" if args.quick else "full",
+        "repeat": args.repeat,
+        "isolated": not args.in_process,
+    }
+
+
+def compare(results, baseline_path, threshold):
+    """Prints the time ratio of each case to the same case in a baseline results file, and returns the ids of the cases slower than threshold times the baseline."""
+    with open(baseline_path) as f:
+        baseline = {result["id"]: result for result in json.load(f)["results"]}
+
+    regressions = []
+    print(f"\nComparison with {baseline_path} (fastest run time ratio, new / baseline):")
+    for result in results:
+        previous = baseline.get(result["id"])
+        if previous is None or "time_min" not in previous or "time_min" not in result:
+            continue
+        ratio = result["time_min"] / previous["time_min"]
+        flag = ""
+        if ratio > threshold:
+            regressions.append(result["id"])
+            flag = "  <-- regression"
+        print(f"  {result['id']}: {ratio:.2f}{flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the ctfr performance benchmarks.")
+    parser.add_argument("--output", "-o", default=None, help="path of the JSON results file.")
+    parser.add_argument("--quick", action="store_true", help="use a small grid of cases, for a fast check.")
+    parser.add_argument("--methods", nargs="+", default=None, help="combination methods to benchmark. Defaults to all installed methods.")
+    parser.add_argument("--benchmarks", nargs="+", choices=["kernel", "end_to_end"], default=["kernel", "end_to_end"], help="kinds of benchmarks to run.")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed runs of each case. Defaults to 3.")
+    parser.add_argument("--audio", default=DEFAULT_AUDIO_PATH, help="audio file of the end-to-end benchmarks. Defaults to data/synthetic.wav.")
+    parser.add_argument("--in-process", action="store_true", help="run all cases in this process. Faster, but the peak RSS is not recorded.")
+    parser.add_argument("--compare", default=None, metavar="BASELINE", help="results file of a previous run to compare with.")
+    parser.add_argument("--threshold", type=float, default=1.25, help="time ratio above which a case is reported as a regression. Defaults to 1.25.")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be a positive integer.")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cases = get_cases(args)
+    results = run_all(cases, args)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"metadata": get_metadata(args), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}.")
+
+    num_errors = sum("error" in result for result in results)
+    regressions = compare(results, args.compare, args.threshold) if args.compare is not None else []
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than {args.threshold}x the baseline.")
+    return 1 if num_errors or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
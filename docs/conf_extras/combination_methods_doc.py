@@ -84,11 +84,16 @@ class CombinationMethodsWithVariantsDoc(CombinationMethodsDoc):
         params_list_list = list(self.parameter_names_map.values())
         # List of shared parameter names, sorted by the order of the first method key.
         self.shared_parameters_keys = list(set(params_list_list[0]).intersection(*params_list_list[1:]))
+        # Parameters with the same name but a different meaning in some method are documented separately for each method.
+        self.shared_parameters_keys = [
+            parameter for parameter in self.shared_parameters_keys
+            if all(self.method_entries_map[method_key]["parameters"][parameter] == self.method_entries_map[self.method_keys_iter[0]]["parameters"][parameter] for method_key in self.method_keys_iter)
+        ]
         self.shared_parameters_keys.sort(key=lambda x: self.parameter_names_map[self.method_keys_iter[0]].index(x))
 
 
     def doc_parameter_shared(self, parameter):
-        parameter_entry = self.method_entries_map[self.method_keys_iter[0]]["parameters"][parameter] # Uses type_and_info and description from the first method key. (They should be the same for all method keys)
+        parameter_entry = self.method_entries_map[self.method_keys_iter[0]]["parameters"][parameter] # Uses type_and_info and description from the first method key. (They are the same for all method keys)
         first_line = f"**{parameter}** (`{parameter_entry['type_and_info']}, optional`)"
         second_line = f"   {parameter_entry['description']}"
         return first_line + "\n\n" + second_line
@@ -1,6 +1,7 @@
 from setuptools import Extension, setup
 from os import sep, getenv
 from glob import glob
+import sys
 
 from Cython.Build import cythonize
 
@@ -8,9 +9,30 @@ from Cython.Build import cythonize
 IMPLEMENTATIONS_SOURCE_DIR = f"src{sep}ctfr{sep}implementations"
 IMPLEMENTATIONS_MODULE = "ctfr.implementations"
 
+def get_openmp_flags():
+    # OpenMP is used by the parallel (prange) sections of the kernels. Without it, these sections run serially.
+    # Set CTFR_DISABLE_OPENMP=1 to build without OpenMP.
+    if bool(int(getenv("CTFR_DISABLE_OPENMP", 0))):
+        return [], []
+    if sys.platform == "win32":
+        return ["/openmp"], []
+    if sys.platform == "darwin":
+        # Apple Clang does not ship with OpenMP support.
+        return [], []
+    return ["-fopenmp"], ["-fopenmp"]
+
 def get_cy_extensions():
     method_cy_source_paths = glob(f"{IMPLEMENTATIONS_SOURCE_DIR}{sep}*.pyx")
-    return [Extension(f"{IMPLEMENTATIONS_MODULE}.{path.split(sep)[-1].split('.')[0]}", [path]) for path in method_cy_source_paths]
+    compile_args, link_args = get_openmp_flags()
+    return [
+        Extension(
+            f"{IMPLEMENTATIONS_MODULE}.{path.split(sep)[-1].split('.')[0]}", 
+            [path],
+            extra_compile_args=compile_args,
+            extra_link_args=link_args
+        ) 
+        for path in method_cy_source_paths
+    ]
     
 extensions = get_cy_extensions()
 
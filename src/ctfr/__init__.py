@@ -1,46 +1,43 @@
 __version__ = "0.1.0"
 
-from warnings import warn as _warn
-from .utils.audio import load, stft, cqt, stft_spec, cqt_spec, specshow, power_to_db
-from .utils.methods import show_methods, show_method_params, cite_method, get_methods_list, get_method_name
-from .utils.data import list_samples, fetch_sample
+from importlib import import_module as _import_module
+from .utils.methods import show_methods, show_method_params, cite_method, get_methods_list, get_method_name, get_method_capabilities, register_method, unregister_method
+from .utils.cache import SpecsCache, PlanCache, plan_cache
+from .utils.profiling import profile
 from .core.ctfr import ctfr
 from .core.ctfr_from_specs import ctfr_from_specs
+from .core.ctfr_multi import ctfr_multi
+from .core.ctfr_batch import ctfr_batch, ctfr_from_specs_batch
+from .core.ctfr_stream import ctfr_stream
+from .core.ctfr_processor import CTFRProcessor
 from .meta import cite, show_version
 from .warning import FunctionNotBuiltWarning
 
 from . import methods
 from .methods_dict import _methods_dict
 
-
-def _export_all_method_functions(_methods_dict):
-    """Export all method functions to ctfr.methods.
-    """
-    for key in _methods_dict:
-        _from_audio_function_export(key)
-        _from_specs_function_export(key)
-
-def _from_audio_function_export(key):
-    """Export a method function that takes an audio signal as input."""
-    function_name = key
-    if not validate_function_name(function_name):
-        _warn(f"Function name already exists in module ctfr.methods and thus was not built: {function_name}.", FunctionNotBuiltWarning)
-    def _func(signal, sr, **kwargs):
-        return ctfr(signal, sr = sr, method = key, **kwargs)
-    _func.__doc__ = f"Alias for ``ctfr.ctfr(signal, method={key}, sr=sr, **kwargs)``."
-    setattr(methods, function_name, _func)
-
-def _from_specs_function_export(key):
-    """Export a method function that takes an iterable of spectrograms as input."""
-    function_name = key + "_from_specs"
-    if not validate_function_name(function_name):
-        _warn(f"Function name already exists in module ctfr.methods and thus was not built: {function_name}.", FunctionNotBuiltWarning)
-    def _func(specs_tensor, **kwargs):
-        return ctfr_from_specs(specs_tensor, method = key, **kwargs)
-    _func.__doc__ = f"Alias for ``ctfr.ctfr_from_specs(specs_tensor, method={key}, **kwargs)``."
-    setattr(methods, function_name, _func)
-
-def validate_function_name(function_name):
-    return not function_name in globals()
-
-_export_all_method_functions(_methods_dict)
\ No newline at end of file
+# Attributes imported on first access, so that importing ctfr doesn't import librosa (and matplotlib) or pooch. The
+# combination methods are also loaded on first use (see methods_dict.py and ctfr.methods).
+_LAZY_ATTRIBUTES = {
+    "load": "ctfr.utils.audio",
+    "stft": "ctfr.utils.audio",
+    "cqt": "ctfr.utils.audio",
+    "stft_spec": "ctfr.utils.audio",
+    "multi_stft_spec": "ctfr.utils.audio",
+    "cqt_spec": "ctfr.utils.audio",
+    "multi_cqt_spec": "ctfr.utils.audio",
+    "specshow": "ctfr.utils.audio",
+    "power_to_db": "ctfr.utils.audio",
+    "list_samples": "ctfr.utils.data",
+    "fetch_sample": "ctfr.utils.data",
+}
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module 'ctfr' has no attribute '{name}'")
+    value = globals()[name] = getattr(_import_module(module_name), name)
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
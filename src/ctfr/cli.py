@@ -0,0 +1,359 @@
+"""Command-line tool for computing the CTFRs of audio files in bulk, installed as the ``ctfr`` console script. See :ref:`command line`."""
+
+import argparse
+import ast
+import json
+import os
+import sys
+import time
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from math import ceil
+from ctfr import __version__
+from ctfr.core.ctfr import ctfr, _get_tfrs_function_and_params
+from ctfr.core.core_utils import _get_n_workers
+from ctfr.exception import InvalidCombinationMethodError, InvalidRepresentationTypeError
+from ctfr.utils.private import _get_method_entry, _get_method_memory
+
+_AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".mp3", ".m4a", ".aif", ".aiff", ".opus")
+_BYTES_UNITS = {"": 1, "K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+_TFRS_KEYS = ("representation_type", "win_lengths", "hop_length", "n_fft", "filter_scales", "bins_per_octave", "fmin", "n_bins")
+
+# A unit of output: a single .npy file, or a shard with multiple inputs. It's finished when the file at ``path`` exists,
+# which is written last, so interrupted units are computed again on the next run.
+_OutputUnit = namedtuple("_OutputUnit", ["path", "items"])
+# An input file and its key in the output, which is its path relative to the input directory or manifest.
+_Item = namedtuple("_Item", ["path", "key"])
+
+def main(argv=None):
+    """Entry point of the ``ctfr`` console script.
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        command-line arguments, excluding the program name. Defaults to ``sys.argv[1:]``.
+
+    Returns
+    -------
+    int
+        exit status: 0 if all inputs were processed, 1 if any of them failed, and 130 if interrupted.
+    """
+    parser = _get_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        _get_method_entry(args.method)
+        tfrs_kwargs = _get_tfrs_kwargs(args)
+        # Validates the TFRs parameters before processing any input. The sampling rate only affects the default values.
+        _get_tfrs_function_and_params(sr=args.sr or 22050, dtype=args.dtype, **tfrs_kwargs)
+        items = _find_inputs(args.input, args.extensions)
+    except (InvalidCombinationMethodError, InvalidRepresentationTypeError, ValueError, OSError) as e:
+        parser.error(str(e))
+
+    units = _get_output_units(items, args.output, args.format, args.shard_size)
+    if not args.overwrite:
+        finished = [unit for unit in units if os.path.exists(unit.path)]
+        units = [unit for unit in units if not os.path.exists(unit.path)]
+    else:
+        finished = []
+
+    progress = _Progress(
+        total = sum(len(unit.items) for unit in units),
+        skipped = sum(len(unit.items) for unit in finished),
+        quiet = args.quiet
+    )
+    options = {
+        "sr": args.sr,
+        "dtype": args.dtype,
+        "method": args.method,
+        "kwargs": {**tfrs_kwargs, **dict(args.param)}
+    }
+    n_workers = _get_n_workers(args.workers, max(1, progress.total))
+
+    try:
+        _run(units, args.format, options, n_workers, args.max_memory, progress)
+    except KeyboardInterrupt:
+        progress.report(interrupted=True)
+        return 130
+    progress.report()
+    return 1 if progress.failed else 0
+
+def _get_parser():
+    parser = argparse.ArgumentParser(
+        prog = "ctfr",
+        description = "Computes combined time-frequency representations (CTFRs) of audio files in bulk. Outputs that already exist are skipped, so an interrupted run is resumed by running the same command again."
+    )
+    parser.add_argument("input", help="directory searched recursively for audio files, or manifest file listing one audio file path per line (relative paths are relative to the manifest).")
+    parser.add_argument("output", help="output directory.")
+    parser.add_argument("-m", "--method", required=True, help="combination method key, such as 'swgm'.")
+    parser.add_argument("-p", "--param", type=_parse_param, action="append", default=[], metavar="NAME=VALUE", help="parameter of the combination method, such as 'lk=21'. Values are parsed as Python literals, or kept as strings. Can be repeated.")
+
+    tfrs = parser.add_argument_group("time-frequency representations", "See ctfr.ctfr for the defaults.")
+    tfrs.add_argument("--representation-type", choices=["stft", "cqt"], default="stft", help="type of TFRs, by default 'stft'.")
+    tfrs.add_argument("--win-lengths", type=int, nargs="+", metavar="N", help="STFT window lengths in samples.")
+    tfrs.add_argument("--hop-length", type=int, metavar="N", help="hop length in samples.")
+    tfrs.add_argument("--n-fft", type=int, metavar="N", help="STFT FFT size.")
+    tfrs.add_argument("--filter-scales", type=float, nargs="+", metavar="S", help="CQT filter scales.")
+    tfrs.add_argument("--bins-per-octave", type=int, metavar="N", help="CQT bins per octave.")
+    tfrs.add_argument("--fmin", type=float, metavar="F", help="CQT minimum frequency in Hz.")
+    tfrs.add_argument("--n-bins", type=int, metavar="N", help="number of CQT bins.")
+    tfrs.add_argument("--sr", type=float, help="sampling rate to which the inputs are resampled. If not provided, their native sampling rates are used.")
+    tfrs.add_argument("--dtype", choices=["float32", "float64"], default="float64", help="data type of the computation and of the outputs, by default 'float64'.")
+
+    output = parser.add_argument_group("output")
+    output.add_argument("--format", choices=["npy", "npz", "memmap"], default="npy", help="'npy' writes a .npy file per input, mirroring the input paths. 'npz' writes shards of inputs as .npz files, keyed by the input paths. 'memmap' writes each shard as a single .npy file, which can be memory-mapped, with the CTFRs concatenated along time, and a .json index with the frame range of each input. By default 'npy'.")
+    output.add_argument("--shard-size", type=_positive_int, default=64, metavar="N", help="number of inputs per shard, for the 'npz' and 'memmap' formats. By default 64.")
+    output.add_argument("--overwrite", action="store_true", help="compute all outputs again, instead of skipping the existing ones.")
+
+    execution = parser.add_argument_group("execution")
+    execution.add_argument("-j", "--workers", type=_positive_int, metavar="N", help="number of worker processes. Defaults to the number of CPUs. With 1, the inputs are processed in this process.")
+    execution.add_argument("--max-memory", type=_parse_bytes, metavar="SIZE", help="memory budget, such as '4G'. Inputs are only started while the estimated memory of the ones in progress fits in the budget, which limits the concurrency for long inputs. An input that doesn't fit alone is processed by itself.")
+    execution.add_argument("--extensions", nargs="+", default=list(_AUDIO_EXTENSIONS), metavar="EXT", help="extensions of the audio files searched in an input directory.")
+    execution.add_argument("-q", "--quiet", action="store_true", help="only report the summary, and not each processed input.")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    return parser
+
+def _parse_param(text):
+    """Parses a NAME=VALUE method parameter. Values are parsed as Python literals, or kept as strings."""
+    name, sep, value = text.partition("=")
+    if not sep or not name.isidentifier():
+        raise argparse.ArgumentTypeError(f"invalid parameter '{text}', expected NAME=VALUE.")
+    try:
+        value = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        pass
+    return name, value
+
+def _parse_bytes(text):
+    """Parses a size in bytes, with an optional K, M, G or T (binary) suffix."""
+    number = text.strip().upper().removesuffix("B").removesuffix("I")
+    unit = number[-1:] if number[-1:] in _BYTES_UNITS else ""
+    try:
+        size = float(number[:len(number) - len(unit)]) * _BYTES_UNITS[unit]
+    except ValueError:
+        size = -1
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"invalid size '{text}', expected a positive number of bytes such as '512M' or '4G'.")
+    return int(size)
+
+def _positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"invalid value '{text}', expected a positive integer.")
+    return value
+
+def _get_tfrs_kwargs(args):
+    return {key: getattr(args, key) for key in _TFRS_KEYS}
+
+# =============================================================================
+
+def _find_inputs(input_path, extensions):
+    """Lists the input files of a directory (searched recursively for the given extensions) or of a manifest file, in a deterministic order."""
+    if os.path.isdir(input_path):
+        extensions = tuple(extension.lower() if extension.startswith(".") else "." + extension.lower() for extension in extensions)
+        paths = []
+        for directory, subdirectories, filenames in os.walk(input_path):
+            subdirectories.sort()
+            paths.extend(os.path.join(directory, filename) for filename in sorted(filenames) if filename.lower().endswith(extensions))
+        root = input_path
+    else:
+        root = os.path.dirname(os.path.abspath(input_path))
+        with open(input_path, encoding="utf-8") as manifest:
+            lines = [line.strip() for line in manifest]
+        paths = [os.path.join(root, line) for line in lines if line and not line.startswith("#")]
+        if paths:
+            # Keys are relative to the deepest common directory, so absolute paths elsewhere are also supported.
+            root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+
+    if not paths:
+        raise ValueError(f"No input files found in '{input_path}'.")
+    return [_Item(path, os.path.relpath(path, root).replace(os.sep, "/")) for path in paths]
+
+def _get_output_units(items, output_dir, output_format, shard_size):
+    """Groups the inputs into output units. Shards have consecutive inputs, so they're the same on every run with the same inputs."""
+    if output_format == "npy":
+        return [_OutputUnit(os.path.join(output_dir, item.key + ".npy"), [item]) for item in items]
+    extension = ".npz" if output_format == "npz" else ".json"
+    return [
+        _OutputUnit(os.path.join(output_dir, f"shard-{index:05d}{extension}"), items[start:start + shard_size])
+        for index, start in enumerate(range(0, len(items), shard_size))
+    ]
+
+# =============================================================================
+
+def _run(units, output_format, options, n_workers, max_memory, progress):
+    """Computes the CTFRs of the inputs of all units with a pool of n_workers processes, writing each unit once all of its inputs are computed."""
+    # Outputs of the npy format are written by the workers, and the ones of shards are sent back to be written here.
+    tasks = (
+        (unit_index, item, unit.path if output_format == "npy" else None)
+        for unit_index, unit in enumerate(units)
+        for item in unit.items
+    )
+    results = {} # Results of the unfinished shards, by unit index.
+    remaining = {unit_index: len(unit.items) for unit_index, unit in enumerate(units)}
+    failed_units = set()
+
+    def on_done(task, outcome, error):
+        unit_index, item, _ = task
+        if error is None:
+            duration, elapsed, result = outcome
+            progress.item_done(item.key, duration, elapsed)
+            if result is not None:
+                results.setdefault(unit_index, {})[item.key] = result
+        else:
+            progress.item_failed(item.key, error)
+            failed_units.add(unit_index)
+        remaining[unit_index] -= 1
+        if remaining[unit_index] == 0 and output_format != "npy":
+            unit_results = results.pop(unit_index, {})
+            # A shard with failed inputs isn't written, so they're computed again on the next run.
+            if unit_index not in failed_units:
+                _write_shard(units[unit_index], unit_results, output_format)
+
+    estimate = None if max_memory is None else (lambda task: _estimate_item_memory(task[1].path, options))
+    if n_workers == 1:
+        for task in tasks:
+            try:
+                outcome, error = _compute_item(*task[1:], **options), None
+            except Exception as e:
+                outcome, error = None, e
+            on_done(task, outcome, error)
+    else:
+        _map_bounded(tasks, options, n_workers, max_memory, estimate, on_done)
+
+def _map_bounded(tasks, options, n_workers, max_memory, estimate, on_done):
+    """Computes the tasks with a pool of processes, keeping at most n_workers of them in progress and, if max_memory is provided, starting a task only while the estimated memory of the ones in progress fits in it."""
+    tasks = iter(tasks)
+    next_task = next(tasks, None)
+    in_progress = {}
+    reserved = 0
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        try:
+            while next_task is not None or in_progress:
+                while next_task is not None and len(in_progress) < n_workers:
+                    task_memory = 0 if estimate is None else estimate(next_task)
+                    if max_memory is not None and in_progress and reserved + task_memory > max_memory:
+                        break
+                    future = pool.submit(_compute_item, *next_task[1:], **options)
+                    in_progress[future] = (next_task, task_memory)
+                    reserved += task_memory
+                    next_task = next(tasks, None)
+
+                done, _ = wait(in_progress, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task, task_memory = in_progress.pop(future)
+                    reserved -= task_memory
+                    error = future.exception()
+                    on_done(task, None if error is not None else future.result(), error)
+        except KeyboardInterrupt:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+def _compute_item(item, output_path, sr, dtype, method, kwargs):
+    """Computes the CTFR of an input file. If output_path is provided, the CTFR is written to it and not returned. Returns the duration of the input in seconds, the elapsed time and the CTFR."""
+    from ctfr.utils.audio import load
+    start = time.perf_counter()
+    signal, sr = load(item.path, sr=sr, dtype=dtype)
+    result = ctfr(signal, sr, method, dtype=dtype, n_workers=1, **kwargs)
+    if output_path is not None:
+        _write_atomic(output_path, lambda f: np.save(f, result))
+        result = None
+    return signal.shape[-1] / sr, time.perf_counter() - start, result
+
+def _write_shard(unit, results, output_format):
+    """Writes the CTFRs of a shard, in the order of its inputs."""
+    arrays = [results[item.key] for item in unit.items]
+    if output_format == "npz":
+        _write_atomic(unit.path, lambda f: np.savez(f, **{item.key: array for item, array in zip(unit.items, arrays)}))
+        return
+
+    # The CTFRs are concatenated along time into a .npy file, and the index is written last, marking the shard as finished.
+    data_path = unit.path[:-len(".json")] + ".npy"
+    stops = np.cumsum([array.shape[1] for array in arrays])
+    tmp_path = data_path + ".tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(data_path)), exist_ok=True)
+    data = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=arrays[0].dtype, shape=(arrays[0].shape[0], int(stops[-1]) if len(stops) else 0))
+    for array, stop in zip(arrays, stops):
+        data[:, stop - array.shape[1]:stop] = array
+    data.flush()
+    del data
+    os.replace(tmp_path, data_path)
+
+    index = {
+        "data": os.path.basename(data_path),
+        "items": [{"key": item.key, "start": int(stop - array.shape[1]), "stop": int(stop)} for item, array, stop in zip(unit.items, arrays, stops)]
+    }
+    _write_atomic(unit.path, lambda f: f.write(json.dumps(index, indent=1).encode("utf-8")))
+
+def _write_atomic(path, write):
+    """Writes a file by calling write on a temporary file, which is then renamed to path, so an interrupted write doesn't leave an incomplete output."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+def _estimate_item_memory(path, options):
+    """Estimates the peak memory in bytes used to compute the CTFR of an input file, from its duration and sampling rate.
+
+    The estimate includes the signal, the spectrograms tensor, the complex TFR of one spectrogram, the output and the intermediate arrays of the combination method, as advertised by its memory order (methods that don't advertise it are assumed to allocate a tensor-sized intermediate array). Returns 0 if the file can't be inspected.
+    """
+    import librosa
+    try:
+        sr = options["sr"] or librosa.get_samplerate(path)
+        n_samples = ceil(librosa.get_duration(path=path) * sr)
+    except Exception:
+        return 0
+
+    _, params = _get_tfrs_function_and_params(sr=sr, dtype=options["dtype"], **{key: options["kwargs"][key] for key in _TFRS_KEYS})
+    itemsize = np.dtype(options["dtype"]).itemsize
+    if options["kwargs"]["representation_type"] == "stft":
+        num_specs, num_bins = len(params["win_lengths"]), params["n_fft"] // 2 + 1
+    else:
+        num_specs, num_bins = len(params["filter_scales"]), params["n_bins"]
+    spec_bytes = num_bins * (n_samples // params["hop_length"] + 1) * itemsize
+
+    method_bytes = spec_bytes if _get_method_memory(options["method"]) == "KM" else num_specs * spec_bytes
+    return n_samples * itemsize + num_specs * spec_bytes + 2 * spec_bytes + method_bytes + spec_bytes
+
+class _Progress:
+    """Reports the progress and the throughput of a run to stderr."""
+
+    def __init__(self, total, skipped, quiet=False):
+        self.total = total
+        self.skipped = skipped
+        self.quiet = quiet
+        self.done = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+        self.start = time.perf_counter()
+        if skipped:
+            self._print(f"Skipping {skipped} inputs with existing outputs.")
+
+    def item_done(self, key, duration, elapsed):
+        self.done += 1
+        self.audio_seconds += duration
+        if not self.quiet:
+            self._print(f"[{self._count()}] {key}: {duration:.1f} s of audio in {elapsed:.2f} s")
+
+    def item_failed(self, key, error):
+        self.failed += 1
+        self._print(f"[{self._count()}] {key}: failed with {type(error).__name__}: {error}")
+
+    def report(self, interrupted=False):
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        speed = self.audio_seconds / elapsed if elapsed > 0 else 0.0
+        status = "Interrupted, run the same command again to resume" if interrupted else "Done"
+        self._print(
+            f"{status}: {self.done} processed, {self.skipped} skipped, {self.failed} failed. "
+            f"{self.audio_seconds:.1f} s of audio in {elapsed:.1f} s ({rate:.2f} files/s, {speed:.1f}x real time)."
+        )
+
+    def _count(self):
+        width = len(str(self.total))
+        return f"{self.done + self.failed:>{width}}/{self.total}"
+
+    def _print(self, message):
+        print(message, file=sys.stderr, flush=True)
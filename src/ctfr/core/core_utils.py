@@ -1,13 +1,49 @@
 import numpy as np
+from os import cpu_count
 
-def _normalize_specs_tensor(specs_tensor, target_energy):
-    """Normalizes the input spectrograms to have the same total energy."""
-    specs_tensor = specs_tensor * target_energy / _get_specs_tensor_energy_array(specs_tensor)
+def _normalize_specs_tensor(specs_tensor, target_energy, copy=False):
+    """Normalizes the input spectrograms to have the same total energy, in place or into a new tensor if ``copy`` is True, and returns the normalized tensor. Spectrograms with zero energy are left unchanged."""
+    energies = _get_specs_tensor_energy_array(specs_tensor)
+    factors = np.divide(target_energy, energies, out=np.ones_like(energies), where=energies > 0)
+    return np.multiply(specs_tensor, factors, out=np.empty_like(specs_tensor) if copy else specs_tensor, casting="same_kind")
 
 def _get_specs_tensor_energy_array(specs_tensor):
     """Computes the total energy of each spectrogram in the tensor."""
     return np.sum(specs_tensor, axis=(1, 2), keepdims=True)
 
-def _normalize_spec(spec, target_energy):
-    """Normalizes spectrogram to the specified total energy."""
-    spec = spec * target_energy / np.sum(spec)
\ No newline at end of file
+def _normalize_spec(spec, target_energy, out=None):
+    """Normalizes spectrogram to the specified total energy, in place or writing to ``out`` if provided. A spectrogram with zero energy is left unchanged."""
+    energy = np.sum(spec)
+    return np.multiply(spec, target_energy / energy if energy > 0 else 1.0, out=spec if out is None else out)
+
+def _check_output_buffer(out, shape):
+    """Checks that a preallocated output buffer has the given shape."""
+    if out is not None and (not isinstance(out, np.ndarray) or out.shape != tuple(shape)):
+        raise ValueError(f"The 'out' array must be a NumPy array with shape {tuple(shape)}.")
+
+def _write_output(spec, out):
+    """Copies the spectrogram to ``out``, if provided, and returns the output array."""
+    if out is None:
+        return spec
+    np.copyto(out, spec)
+    return out
+
+def _get_specs_dtype(dtype):
+    """Validates the data type of the spectrograms tensor, which must be a single or double precision floating point type."""
+    try:
+        specs_dtype = np.dtype(dtype)
+    except TypeError:
+        specs_dtype = None
+    if specs_dtype not in (np.float32, np.float64):
+        raise ValueError(f"Invalid value for parameter 'dtype': {dtype}. Supported data types are np.float32 and np.float64.")
+    return specs_dtype
+
+def _get_n_workers(n_workers, n_items=None):
+    """Validates the number of workers of a pool. If not provided, defaults to the number of CPUs in the system, limited to the number of items if given."""
+    if n_workers is None:
+        n_workers = cpu_count() or 1
+        return n_workers if n_items is None else max(1, min(n_workers, n_items))
+    n_workers = int(n_workers)
+    if n_workers < 1:
+        raise ValueError("The 'n_workers' parameter must be a positive integer.")
+    return n_workers
@@ -1,16 +1,23 @@
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from ctfr.exception import InvalidRepresentationTypeError
-from ctfr.utils.audio import stft_spec, cqt_spec
+from ctfr.utils.audio import _multi_cqt_spec, _multi_stft_spec, _get_multi_stft_windows
 from .core_utils import (
     _normalize_specs_tensor,
     _get_specs_tensor_energy_array,
     _normalize_spec,
+    _get_specs_dtype,
+    _check_output_buffer,
+    _get_n_workers,
 )
 from ctfr.utils.private import (
     _round_to_power_of_two, 
-    _get_method_function,
-    _request_tfrs_info
+    _apply_method,
+    _request_tfrs_info,
+    _request_shared_intermediates
 )
+from ctfr.utils.cache import SpecsCache
+from ctfr.utils.profiling import _profile_stage
 from typing import Any, Iterable
 
 def ctfr(
@@ -26,6 +33,11 @@ def ctfr(
     bins_per_octave: int = None,
     fmin: float = None,
     n_bins: int = None,
+    dtype: np.dtype = np.double,
+    out: np.ndarray = None,
+    cache: SpecsCache = None,
+    channel_reduction: str = None,
+    n_workers: int = None,
     **kwargs: Any
 ) -> np.ndarray:
     """Computes a combined time-frequency representation (CTFR) of a waveform signal.
@@ -34,8 +46,8 @@ def ctfr(
 
     Parameters
     ----------
-    signal : np.ndarray [shape=(n)], real-valued
-        input signal.
+    signal : np.ndarray [shape=(n) or (C, n)], real-valued
+        input signal. A two-dimensional signal is treated as ``C`` channels, such as the ones loaded by :func:`ctfr.load` with ``mono=False``, and the CTFR of each channel is computed.
     sr : float
         sampling rate of the input signal.
     method : str
@@ -56,13 +68,23 @@ def ctfr(
         minimum frequency to use for the CQTs. If ``representation_type`` is `"cqt"` and this parameter is not provided, the default minimum frequency is 32.7 Hz. If ``representation_type`` is `"stft"`, this parameter is ignored.
     n_bins : int > 0, optional
         number of frequency bins to use for the CQTs. If ``representation_type`` is `"cqt"` and this parameter is not provided, the default number of bins is ``bins_per_octave * 8``. If ``representation_type`` is `"stft"`, this parameter is ignored.
+    dtype : {np.float32, np.float64}
+        floating point data type of the spectrograms tensor, of the intermediate arrays of the combination method and of the output, by default ``np.double``. Using ``np.float32`` halves the memory footprint and bandwidth of the computation, at the cost of precision.
+    out : np.ndarray [shape=(K, M) or (C, K, M)], optional
+        preallocated array to write the CTFR to, with the shape of the returned CTFR. If not provided, a new array is returned.
+    cache : SpecsCache, optional
+        cache of normalized spectrograms tensors. If provided, the spectrograms are retrieved from the cache when they have already been computed for the same signal and TFRs parameters, and stored in the cache otherwise. See :class:`ctfr.SpecsCache`. Each channel of a multichannel signal is cached separately.
+    channel_reduction : {None, "mid", "side", "mid_side", "energy"}
+        how to reduce the channels of a multichannel signal before the combination, by default ``None``, in which case the CTFR of each channel is computed. If `"mid"` or `"side"`, the CTFR of the mid (half the sum) or side (half the difference) signal of a stereo signal is computed. If `"mid_side"`, the CTFRs of both are computed, in this order. If `"energy"`, the spectrograms of each channel are computed and summed with weights proportional to the channel energies, and a single combination is computed. Reductions to a single channel return a single CTFR, so the combination is only computed once.
+    n_workers : int > 0, optional
+        number of threads used to process the channels of a multichannel signal in parallel. If not provided, defaults to the number of CPUs in the system, limited to the number of channels. It's ignored for one-dimensional signals. This is independent of the ``n_jobs`` parameter of some combination methods, which sets the number of threads used by each combination.
     **kwargs
         additional keyword arguments to pass to the combination method function. These are specified in their respective pages in :ref:`combination methods`.
 
     Returns
     -------
-    np.ndarray [shape=(K, M)]
-        matrix of dimensions ``K * M`` containing a squared-magnitude CTFR of the input signal, where ``K`` is the number of frequency bins and ``M`` is the number of time frames.
+    np.ndarray [shape=(K, M) or (C, K, M)]
+        matrix of dimensions ``K * M`` containing a squared-magnitude CTFR of the input signal, where ``K`` is the number of frequency bins and ``M`` is the number of time frames. For a multichannel signal, the CTFRs of the ``C`` channels (or of the channels resulting from ``channel_reduction``) are stacked along the first axis, unless the reduction results in a single channel. If ``out`` is provided, it's returned.
 
     Raises
     ------
@@ -71,45 +93,42 @@ def ctfr(
     InvalidCombinationMethodError
         If the value provided for ``method`` is not the id of an installed combination method.
     :external:class:`ValueError`
-        If ``n_fft`` is less than the largest window length.
+        If ``n_fft`` is less than the largest window length, if ``dtype`` is not a supported data type, if the shape of ``out`` doesn't match the CTFR, if ``signal`` has more than two dimensions, or if ``channel_reduction`` or ``n_workers`` are invalid.
 
+    Notes
+    -----
+    The TFRs parameters and the STFT analysis windows are resolved only once for all channels. Channels are processed by a pool of threads, in which the included Cython combination methods run in parallel, as they release the global interpreter lock (GIL). Stages of channels processed by other threads are not recorded by :func:`ctfr.profile`.
 
     See Also
     --------
     ctfr.ctfr_from_specs
     """
 
-    if representation_type == "stft":
-        params = _get_stft_params(
-            sr = sr,
-            win_lengths = win_lengths, 
-            hop_length = hop_length, 
-            n_fft = n_fft
-        )
-        return _ctfr_stfts(
-            signal = signal,
-            method = method,
-            **params,
-            **kwargs
-        )
-
-    if representation_type == "cqt":
-        params = _get_cqt_params(
-            sr = sr,
-            filter_scales = filter_scales,
-            bins_per_octave = bins_per_octave,
-            fmin = fmin,
-            n_bins = n_bins,
-            hop_length = hop_length
-        )
-        return _ctfr_cqts(
-            signal = signal,
-            method = method,
-            **params,
-            **kwargs
-        )
-
-    raise InvalidRepresentationTypeError(f"Invalid value for parameter 'representation_type': {representation_type}")
+    compute_function, params = _get_tfrs_function_and_params(
+        representation_type = representation_type,
+        sr = sr,
+        win_lengths = win_lengths,
+        hop_length = hop_length,
+        n_fft = n_fft,
+        filter_scales = filter_scales,
+        bins_per_octave = bins_per_octave,
+        fmin = fmin,
+        n_bins = n_bins,
+        dtype = dtype
+    )
+    signal = np.asarray(signal)
+    if signal.ndim == 2 or channel_reduction is not None:
+        return _ctfr_channels(compute_function, signal, method, params, channel_reduction, n_workers, out, cache, kwargs)
+    if signal.ndim != 1:
+        raise ValueError(f"The input signal must have one or two dimensions, but it has {signal.ndim}.")
+    return compute_function(
+        signal = signal,
+        method = method,
+        out = out,
+        cache = cache,
+        **params,
+        **kwargs
+    )
 
 # =============================================================================
 
@@ -119,78 +138,236 @@ def _ctfr_stfts(
     win_lengths,
     hop_length,
     n_fft,
+    dtype = np.double,
+    out = None,
+    cache = None,
+    _windows = None,
     **kwargs
 ):
-
-    specs_tensor = np.array(
-        [
-            stft_spec(
-                signal, 
-                n_fft = n_fft,
-                hop_length = hop_length,
-                win_length = win_length,
-                center = True
-            )
-            for win_length in win_lengths
-        ]
-    )
-    input_energy = np.mean(_get_specs_tensor_energy_array(specs_tensor))
-    _normalize_specs_tensor(specs_tensor, input_energy)
-
-    if _request_tfrs_info(method):
-        info = {
-            "representation_type": "stft",
-            "win_lengths": win_lengths,
-            "hop_length": hop_length,
-            "n_fft": n_fft
-        }
-        comb_spec = _get_method_function(method)(specs_tensor, _info = info, **kwargs)
-    else:
-        comb_spec = _get_method_function(method)(specs_tensor, **kwargs)
-    _normalize_spec(comb_spec, input_energy)
-    return comb_spec
+    specs_tensor, input_energy, info = _get_stft_specs(signal, win_lengths, hop_length, n_fft, dtype, cache, _windows)
+    _check_output_buffer(out, specs_tensor.shape[1:])
+    comb_spec = _combine_specs(specs_tensor, method, info, kwargs)
+    with _profile_stage("normalize_output"):
+        return _normalize_spec(comb_spec, input_energy, out=out)
 
 def _ctfr_cqts(
     signal,
     method,
+    sr,
     filter_scales,
     bins_per_octave,
     fmin,
     n_bins,
     hop_length,
+    dtype = np.double,
+    out = None,
+    cache = None,
     **kwargs
 ):
-    specs_tensor = np.array(
-        [
-            cqt_spec(
-                signal,
-                filter_scale = filter_scale,
-                bins_per_octave = bins_per_octave,
-                fmin = fmin,
-                n_bins = n_bins,
-                hop_length = hop_length
-            )
-            for filter_scale in filter_scales
-        ]
+    specs_tensor, input_energy, info = _get_cqt_specs(signal, sr, filter_scales, bins_per_octave, fmin, n_bins, hop_length, dtype, cache)
+    _check_output_buffer(out, specs_tensor.shape[1:])
+    comb_spec = _combine_specs(specs_tensor, method, info, kwargs)
+    with _profile_stage("normalize_output"):
+        return _normalize_spec(comb_spec, input_energy, out=out)
+
+def _ctfr_channels(compute_function, signal, method, params, channel_reduction, n_workers, out, cache, kwargs):
+    """Computes the CTFRs of the channels of a (C, N) signal, or of the channels resulting from a channel reduction, using a pool of threads."""
+    if signal.ndim != 2:
+        raise ValueError(f"A multichannel signal must have two dimensions, but it has {signal.ndim}.")
+    if compute_function is _ctfr_stfts:
+        params = {**params, "_windows": _get_multi_stft_windows(params["win_lengths"], params["n_fft"])}
+
+    if channel_reduction == "energy":
+        return _ctfr_energy_reduction(compute_function, signal, method, params, n_workers, out, cache, kwargs)
+
+    channels = _reduce_channels(signal, channel_reduction)
+    if channel_reduction in ("mid", "side"):
+        return compute_function(signal = channels[0], method = method, out = out, cache = cache, **params, **kwargs)
+
+    if out is not None and (not isinstance(out, np.ndarray) or out.ndim != 3 or out.shape[0] != len(channels)):
+        raise ValueError(f"The 'out' array must be a NumPy array with shape ({len(channels)}, K, M).")
+
+    def compute_channel(c):
+        with _profile_stage("channel", index=c):
+            return compute_function(signal = channels[c], method = method, out = None if out is None else out[c], cache = cache, **params, **kwargs)
+
+    comb_specs = _map_channels(compute_channel, len(channels), _get_n_workers(n_workers, len(channels)))
+    return out if out is not None else np.stack(comb_specs)
+
+def _ctfr_energy_reduction(compute_function, signal, method, params, n_workers, out, cache, kwargs):
+    """Computes a single CTFR of a (C, N) signal, combining the sum of the spectrograms tensors of its channels weighted by their energies."""
+    get_specs = _get_stft_specs if compute_function is _ctfr_stfts else _get_cqt_specs
+
+    def compute_channel(c):
+        with _profile_stage("channel", index=c):
+            return get_specs(signal[c], cache = cache, **params)
+
+    channels_specs = _map_channels(compute_channel, signal.shape[0], _get_n_workers(n_workers, signal.shape[0]))
+    energies = np.array([input_energy for _, input_energy, _ in channels_specs])
+    total_energy = np.sum(energies)
+    weights = (energies / total_energy if total_energy > 0 else np.full(len(energies), 1 / len(energies))).tolist()
+
+    # Spectrograms tensors may be stored in the cache, so they are not modified.
+    with _profile_stage("channel_reduction") as stage:
+        specs_tensor = np.multiply(channels_specs[0][0], weights[0])
+        for (channel_specs_tensor, _, _), weight in zip(channels_specs[1:], weights[1:]):
+            specs_tensor += weight * channel_specs_tensor
+        stage.set_output(specs_tensor)
+    info = channels_specs[0][2]
+    del channels_specs
+
+    _check_output_buffer(out, specs_tensor.shape[1:])
+    comb_spec = _combine_specs(specs_tensor, method, info, kwargs)
+    with _profile_stage("normalize_output"):
+        return _normalize_spec(comb_spec, np.dot(weights, energies), out=out)
+
+def _reduce_channels(signal, channel_reduction):
+    """Returns the channels of a (C, N) signal resulting from a mid/side channel reduction, or the signal itself if no reduction is requested."""
+    if channel_reduction is None:
+        return signal
+    if channel_reduction not in ("mid", "side", "mid_side"):
+        raise ValueError(f"Invalid value for parameter 'channel_reduction': {channel_reduction}")
+    if signal.shape[0] != 2:
+        raise ValueError(f"The '{channel_reduction}' channel reduction requires a stereo signal, but the signal has {signal.shape[0]} channels.")
+    mid = (signal[0] + signal[1]) / 2
+    side = (signal[0] - signal[1]) / 2
+    return {"mid": [mid], "side": [side], "mid_side": [mid, side]}[channel_reduction]
+
+def _map_channels(function, n_channels, n_workers):
+    """Calls function(c) for each channel index c, using a pool of n_workers threads, and returns the results in order."""
+    if n_workers == 1 or n_channels == 1:
+        return [function(c) for c in range(n_channels)]
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        return list(pool.map(function, range(n_channels)))
+
+def _get_stft_specs(signal, win_lengths, hop_length, n_fft, dtype = np.double, cache = None, _windows = None):
+    """Returns the normalized STFT spectrograms tensor of a signal, its mean energy and the TFRs info passed to methods that request it."""
+    params = {
+        "win_lengths": win_lengths,
+        "hop_length": hop_length,
+        "n_fft": n_fft,
+        "dtype": dtype
+    }
+    specs_tensor, input_energy = _get_normalized_specs_tensor(
+        lambda: _compute_stft_specs_tensor(signal, **params, _windows = _windows),
+        signal, "stft", params, cache
     )
-    input_energy = np.mean(_get_specs_tensor_energy_array(specs_tensor))
-    _normalize_specs_tensor(specs_tensor, input_energy)
+    info = {
+        "representation_type": "stft",
+        "win_lengths": win_lengths,
+        "hop_length": hop_length,
+        "n_fft": n_fft
+    }
+    return specs_tensor, input_energy, info
 
+def _get_cqt_specs(signal, sr, filter_scales, bins_per_octave, fmin, n_bins, hop_length, dtype = np.double, cache = None):
+    """Returns the normalized CQT spectrograms tensor of a signal, its mean energy and the TFRs info passed to methods that request it."""
+    params = {
+        "sr": sr,
+        "filter_scales": filter_scales,
+        "bins_per_octave": bins_per_octave,
+        "fmin": fmin,
+        "n_bins": n_bins,
+        "hop_length": hop_length,
+        "dtype": dtype
+    }
+    specs_tensor, input_energy = _get_normalized_specs_tensor(
+        lambda: _compute_cqt_specs_tensor(signal, **params),
+        signal, "cqt", params, cache
+    )
+    info = {
+        "representation_type": "cqt",
+        "filter_scales": filter_scales,
+        "bins_per_octave": bins_per_octave,
+        "fmin": fmin,
+        "n_bins": n_bins,
+        "hop_length": hop_length
+    }
+    return specs_tensor, input_energy, info
+
+def _combine_specs(specs_tensor, method, info, kwargs, shared = None):
+    """Combines the spectrograms tensor with a method, passing the TFRs info and the shared intermediates to methods that request them."""
     if _request_tfrs_info(method):
-        info = {
-            "representation_type": "cqt",
-            "filter_scales": filter_scales,
-            "bins_per_octave": bins_per_octave,
-            "fmin": fmin,
-            "n_bins": n_bins,
-            "hop_length": hop_length
-        }
-        comb_spec = _get_method_function(method)(specs_tensor, _info = info, **kwargs)
-    else:
-        comb_spec = _get_method_function(method)(specs_tensor, **kwargs)
-    _normalize_spec(comb_spec, input_energy)
+        kwargs = {**kwargs, "_info": info}
+    if shared is not None and _request_shared_intermediates(method):
+        kwargs = {**kwargs, "_shared": shared}
+    with _profile_stage("combination", method=method) as stage:
+        comb_spec = _apply_method(method, specs_tensor, kwargs)
+        stage.set_output(comb_spec)
     return comb_spec
 
+def _get_normalized_specs_tensor(compute_specs_tensor, signal, representation_type, params, cache):
+    """Returns the normalized spectrograms tensor of a signal and its mean energy, computing them with compute_specs_tensor unless they are in the cache."""
+    if cache is not None:
+        with _profile_stage("cache_lookup") as stage:
+            key = cache._get_key(signal, representation_type, params)
+            entry = cache._get(key)
+            stage.add_info(hit=entry is not None)
+        if entry is not None:
+            return entry
+
+    with _profile_stage("spectrograms", representation_type=representation_type) as stage:
+        specs_tensor = compute_specs_tensor()
+        stage.set_output(specs_tensor)
+    with _profile_stage("normalize_input"):
+        input_energy = np.mean(_get_specs_tensor_energy_array(specs_tensor))
+        _normalize_specs_tensor(specs_tensor, input_energy)
+
+    if cache is not None:
+        cache._put(key, specs_tensor, input_energy)
+    return specs_tensor, input_energy
+
+def _compute_stft_specs_tensor(signal, win_lengths, hop_length, n_fft, dtype, _windows = None):
+    if _windows is None:
+        _windows = _get_multi_stft_windows(win_lengths, n_fft)
+    return _multi_stft_spec(
+        signal,
+        _windows,
+        n_fft = n_fft,
+        hop_length = hop_length,
+        center = True,
+        dtype = dtype
+    )
+
+def _compute_cqt_specs_tensor(signal, sr, filter_scales, bins_per_octave, fmin, n_bins, hop_length, dtype):
+    return _multi_cqt_spec(
+        signal,
+        sr,
+        filter_scales,
+        hop_length,
+        fmin,
+        n_bins,
+        bins_per_octave,
+        dtype = dtype,
+        cqt_dtype = np.result_type(dtype, np.complex64)
+    )
+
+def _get_tfrs_function_and_params(representation_type, sr, win_lengths, hop_length, n_fft, filter_scales, bins_per_octave, fmin, n_bins, dtype=np.double):
+    """Resolves the TFRs parameters and returns them along with the function that computes the CTFR for the given representation type."""
+    if representation_type == "stft":
+        params = _get_stft_params(
+            sr = sr,
+            win_lengths = win_lengths, 
+            hop_length = hop_length, 
+            n_fft = n_fft
+        )
+        params["dtype"] = _get_specs_dtype(dtype)
+        return _ctfr_stfts, params
+
+    if representation_type == "cqt":
+        params = _get_cqt_params(
+            sr = sr,
+            filter_scales = filter_scales,
+            bins_per_octave = bins_per_octave,
+            fmin = fmin,
+            n_bins = n_bins,
+            hop_length = hop_length
+        )
+        params["dtype"] = _get_specs_dtype(dtype)
+        return _ctfr_cqts, params
+
+    raise InvalidRepresentationTypeError(f"Invalid value for parameter 'representation_type': {representation_type}")
+
 def _get_stft_params(sr, win_lengths, hop_length, n_fft):
     if win_lengths is None:
         # Default middle window length is 50ms seconds in samples, rounded to the nearest power of 2.
@@ -239,6 +416,7 @@ def _get_cqt_params(sr, filter_scales, bins_per_octave, fmin, n_bins, hop_length
         hop_length = _round_to_power_of_two(int(sr * 0.0125), mode="round")
     
     return {
+        "sr": sr,
         "filter_scales": filter_scales,
         "bins_per_octave": bins_per_octave,
         "fmin": fmin,
@@ -0,0 +1,212 @@
+import numpy as np
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Iterable, List, Union
+from ctfr.exception import BatchItemError
+from ctfr.utils.audio import _get_multi_stft_windows
+from ctfr.utils.cache import SpecsCache
+from .ctfr import (
+    _ctfr_stfts,
+    _get_tfrs_function_and_params,
+)
+from .ctfr_from_specs import ctfr_from_specs
+from .core_utils import _get_n_workers
+
+def ctfr_batch(
+    signals: Iterable[np.ndarray],
+    sr: float,
+    method: str,
+    *,
+    representation_type: str = "stft",
+    win_lengths: Iterable[int] = None,
+    hop_length: int = None,
+    n_fft: int = None,
+    filter_scales: Iterable[float] = None,
+    bins_per_octave: int = None,
+    fmin: float = None,
+    n_bins: int = None,
+    dtype: np.dtype = np.double,
+    cache: SpecsCache = None,
+    n_workers: int = None,
+    executor: str = "process",
+    return_exceptions: bool = True,
+    **kwargs: Any
+) -> List[Union[np.ndarray, BatchItemError]]:
+    """Computes combined time-frequency representations (CTFRs) of multiple waveform signals, using a pool of workers.
+
+    This function is equivalent to calling :func:`ctfr.ctfr` for each signal with the same parameters, but the TFRs parameters and the STFT analysis windows are resolved only once for the whole batch, and the signals are distributed across a pool of processes or threads.
+
+    Parameters
+    ----------
+    signals : Iterable[np.ndarray [shape=(n)], real-valued]
+        input signals, which may have different lengths. Iterators are consumed lazily, so only a bounded number of signals is held in memory by the pool at any time.
+    sr : float
+        sampling rate of the input signals, shared by all of them.
+    method : str
+        combination method to use, as specified by their id string. See :ref:`combination methods`.
+    representation_type : {"stft", "cqt"}
+        type of time-frequency representation to use, by default `"stft"`.
+    win_lengths, hop_length, n_fft, filter_scales, bins_per_octave, fmin, n_bins
+        TFRs parameters, shared by all signals. See :func:`ctfr.ctfr`.
+    dtype : {np.float32, np.float64}
+        floating point data type of the computation and of the outputs, by default ``np.double``. See :func:`ctfr.ctfr`.
+    cache : SpecsCache, optional
+        cache of normalized spectrograms tensors, shared by all signals. See :class:`ctfr.SpecsCache`. With a process pool, only the on-disk storage of the cache is shared between workers.
+    n_workers : int > 0, optional
+        number of workers in the pool. If not provided, defaults to the number of CPUs in the system. If ``n_workers`` is 1, the signals are processed sequentially in the calling process.
+    executor : {"process", "thread"}
+        type of worker pool to use, by default `"process"`.
+    return_exceptions : bool, default=True
+        if `True`, a failure when processing a signal does not stop the batch. Instead, a :class:`ctfr.exception.BatchItemError` is placed in the position of the failed signal in the returned list, with the original exception chained as its cause. If `False`, the first failure is raised as a :class:`ctfr.exception.BatchItemError` and the remaining signals are not processed.
+    **kwargs
+        additional keyword arguments to pass to the combination method function. These are specified in their respective pages in :ref:`combination methods`.
+
+    Returns
+    -------
+    list of (np.ndarray [shape=(K, M)] or BatchItemError)
+        CTFRs of the input signals, in the same order as ``signals``.
+
+    Raises
+    ------
+    InvalidRepresentationTypeError
+        If the value of provided for ``representation_type`` is invalid.
+    BatchItemError
+        If ``return_exceptions`` is `False` and processing a signal fails.
+    :external:class:`ValueError`
+        If ``n_workers``, ``executor`` or ``dtype`` are invalid, or if ``n_fft`` is less than the largest window length.
+
+    See Also
+    --------
+    ctfr.ctfr
+    """
+
+    compute_function, params = _get_tfrs_function_and_params(
+        representation_type = representation_type,
+        sr = sr,
+        win_lengths = win_lengths,
+        hop_length = hop_length,
+        n_fft = n_fft,
+        filter_scales = filter_scales,
+        bins_per_octave = bins_per_octave,
+        fmin = fmin,
+        n_bins = n_bins,
+        dtype = dtype
+    )
+    params["cache"] = cache
+    if compute_function is _ctfr_stfts:
+        params["_windows"] = _get_multi_stft_windows(params["win_lengths"], params["n_fft"])
+
+    n_workers = _get_n_workers(n_workers)
+    executor_class = _get_executor_class(executor)
+
+    return _map_batch(compute_function, signals, {"method": method, **params, **kwargs}, n_workers, executor_class, return_exceptions)
+
+def ctfr_from_specs_batch(
+    specs_batch: Iterable[Iterable[np.ndarray]],
+    method: str,
+    *,
+    normalize_input: bool = True,
+    normalize_output: bool = True,
+    dtype: np.dtype = np.double,
+    n_workers: int = None,
+    return_exceptions: bool = True,
+    **kwargs: Any
+) -> List[Union[np.ndarray, BatchItemError]]:
+    """Computes combined time-frequency representations (CTFRs) from multiple sets of input spectrograms, using a pool of threads.
+
+    This function is equivalent to calling :func:`ctfr.ctfr_from_specs` for each set of spectrograms with the same parameters. The included Cython combination methods release the global interpreter lock (GIL) during their main loops, so the sets are combined in parallel by the threads of the pool, without the cost of copying the spectrograms to other processes.
+
+    Parameters
+    ----------
+    specs_batch : Iterable[Iterable[np.ndarray [shape=(K, M)], values >= 0]]
+        sets of input spectrograms, each one with the specifications of the ``specs`` parameter of :func:`ctfr.ctfr_from_specs`. Different sets may have different shapes. Iterators are consumed lazily, so only a bounded number of sets is held in memory by the pool at any time.
+    method : str
+        combination method to use, as specified by their id string. See :ref:`combination methods`.
+    normalize_input, normalize_output : bool, default=True
+        whether to normalize the input spectrograms and the output CTFR of each set. See :func:`ctfr.ctfr_from_specs`.
+    dtype : {np.float32, np.float64}
+        floating point data type of the computation and of the outputs, by default ``np.double``. See :func:`ctfr.ctfr_from_specs`.
+    n_workers : int > 0, optional
+        number of threads in the pool. If not provided, defaults to the number of CPUs in the system. If ``n_workers`` is 1, the sets are processed sequentially in the calling thread.
+    return_exceptions : bool, default=True
+        if `True`, a failure when processing a set does not stop the batch. Instead, a :class:`ctfr.exception.BatchItemError` is placed in the position of the failed set in the returned list, with the original exception chained as its cause. If `False`, the first failure is raised as a :class:`ctfr.exception.BatchItemError` and the remaining sets are not processed.
+    **kwargs
+        additional keyword arguments to pass to the combination method function. These are specified in their respective pages in :ref:`combination methods`.
+
+    Returns
+    -------
+    list of (np.ndarray [shape=(K, M)] or BatchItemError)
+        CTFRs of the sets of input spectrograms, in the same order as ``specs_batch``.
+
+    Raises
+    ------
+    BatchItemError
+        If ``return_exceptions`` is `False` and processing a set of spectrograms fails.
+    :external:class:`ValueError`
+        If ``n_workers`` is invalid.
+
+    Notes
+    -----
+    Methods implemented in pure Python (such as user-defined methods) hold the GIL for most of their computation, except within NumPy and SciPy calls, so they scale less with the number of threads.
+
+    See Also
+    --------
+    ctfr.ctfr_from_specs
+    ctfr.ctfr_batch
+    """
+
+    n_workers = _get_n_workers(n_workers)
+    params = {"method": method, "normalize_input": normalize_input, "normalize_output": normalize_output, "dtype": dtype, **kwargs}
+    return _map_batch(ctfr_from_specs, specs_batch, params, n_workers, ThreadPoolExecutor, return_exceptions)
+
+# =============================================================================
+
+def _map_batch(function, items, kwargs, n_workers, executor_class, return_exceptions):
+    """Calls function(item, **kwargs) for each item, using a pool of n_workers workers, and returns the results in the order of the items."""
+    if n_workers == 1:
+        return [
+            _run_batch_item(index, return_exceptions, function, item, kwargs)[1]
+            for index, item in enumerate(items)
+        ]
+
+    results = {}
+    items = enumerate(items)
+    with executor_class(max_workers=n_workers) as pool:
+        # Keeps a bounded number of items in flight, so iterators are not fully materialized.
+        pending = {
+            pool.submit(_run_batch_item, index, return_exceptions, function, item, kwargs)
+            for index, item in islice(items, 2 * n_workers)
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    index, result = future.result()
+                except BatchItemError:
+                    for future_to_cancel in pending:
+                        future_to_cancel.cancel()
+                    raise
+                results[index] = result
+            for index, item in islice(items, len(done)):
+                pending.add(pool.submit(_run_batch_item, index, return_exceptions, function, item, kwargs))
+
+    return [results[index] for index in range(len(results))]
+
+def _run_batch_item(index, return_exceptions, function, item, kwargs):
+    """Computes the CTFR of a single batch item, wrapping any failure in a BatchItemError."""
+    try:
+        result = function(item, **kwargs)
+    except Exception as e:
+        error = BatchItemError(f"Batch item {index} failed: {type(e).__name__}: {e}", index)
+        error.__cause__ = e
+        if not return_exceptions:
+            raise error
+        result = error
+    return index, result
+
+def _get_executor_class(executor):
+    if executor == "process":
+        return ProcessPoolExecutor
+    if executor == "thread":
+        return ThreadPoolExecutor
+    raise ValueError(f"Invalid value for parameter 'executor': {executor}")
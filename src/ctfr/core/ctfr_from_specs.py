@@ -5,8 +5,12 @@ from .core_utils import (
     _normalize_specs_tensor,
     _get_specs_tensor_energy_array,
     _normalize_spec,
+    _get_specs_dtype,
+    _check_output_buffer,
+    _write_output,
 )
-from ctfr.utils.private import _get_method_function
+from ctfr.utils.private import _apply_method
+from ctfr.utils.profiling import _profile_stage
 
 def ctfr_from_specs(
     specs: Iterable[np.ndarray],
@@ -15,6 +19,8 @@ def ctfr_from_specs(
     normalize_input: bool = True,
     normalize_output: bool = True,
     energy: float = None,
+    dtype: np.dtype = np.double,
+    out: np.ndarray = None,
     **kwargs: Any
 ) -> np.ndarray:
     """Computes a combined time-frequency representation (CTFR) from input spectrograms.
@@ -23,8 +29,8 @@ def ctfr_from_specs(
 
     Parameters
     ----------
-    specs : Iterable[np.ndarray [shape=(K, M)], values >= 0]
-        input spectrograms, assumed to be magnitude-squared time-frequency representations (TFRs) of the same signal and with the same shape and time-frequency alignment.
+    specs : Iterable[np.ndarray [shape=(K, M)], values >= 0] or np.ndarray [shape=(P, K, M)]
+        input spectrograms, assumed to be magnitude-squared time-frequency representations (TFRs) of the same signal and with the same shape and time-frequency alignment. A C-contiguous tensor of data type ``dtype``, including a read-only :class:`numpy.memmap`, is used without copying it. It's never modified: if ``normalize_input`` is `True`, the normalized spectrograms are written to a new tensor.
     method : str
         combination method to use, as specified by their id string. See :ref:`combination methods`. User-defined methods are also supported if they are properly installed (see :ref:`adding methods`). A list of all available methods can also be obtained with :func:`ctfr.show_methods` or :func:`ctfr.get_methods_list`.
     normalize_input : bool, default=True
@@ -33,49 +39,74 @@ def ctfr_from_specs(
         whether to normalize the output CTFR's total energy to match the input energy. This is highly recommended for a quality CTFR, though can be skipped for output testing purposes.
     energy : float, optional
         energy to normalize the input spectrograms to, if ``normalize_input`` is `True`, and the output CTFR to, if ``normalize_output`` is `True`. If not provided, the mean energy of the input spectrograms is used.
+    dtype : {np.float32, np.float64}
+        floating point data type of the spectrograms tensor, of the intermediate arrays of the combination method and of the output, by default ``np.double``. The input spectrograms are converted to this data type. Using ``np.float32`` halves the memory footprint and bandwidth of the computation, at the cost of precision.
+    out : np.ndarray [shape=(K, M)], optional
+        preallocated array to write the CTFR to, such as a writable :class:`numpy.memmap`. If not provided, a new array is returned.
     **kwargs
         additional keyword arguments to pass to the combination method function. These are specified in their respective pages in :ref:`combination methods`.
 
     Returns
     -------
     np.ndarray [shape=(K, M)]
-        matrix of dimensions ``K * M`` containing a squared-magnitude CTFR of the input signal, where ``K`` is the number of frequency bins and ``M`` is the number of time frames.
+        matrix of dimensions ``K * M`` containing a squared-magnitude CTFR of the input signal, where ``K`` is the number of frequency bins and ``M`` is the number of time frames. If ``out`` is provided, it's returned.
 
     Raises
     ------
     InvalidCombinationMethodError
         If the value provided for ``method`` is not the id of an installed combination method.
+    :external:class:`ValueError`
+        If ``dtype`` is not a supported data type, or if the shape of ``out`` doesn't match the input spectrograms.
 
     See Also
     --------
     ctfr.ctfr
     """
 
-    # Stacks the input spectrograms into a contiguous tensor
-    specs_tensor = _stack_specs(specs)
+    # Stacks the input spectrograms into a contiguous tensor, unless they're already provided as one.
+    with _profile_stage("stack") as stage:
+        specs_tensor, is_copy = _stack_specs(specs, _get_specs_dtype(dtype))
+        stage.set_output(specs_tensor)
+        stage.add_info(copied=is_copy)
+    _check_output_buffer(out, specs_tensor.shape[1:])
 
     # If not provided and a normalization is requested, sets the energy to the mean energy of the input spectrograms.
     if (normalize_input or normalize_output) and energy is None:
         energy = np.mean(_get_specs_tensor_energy_array(specs_tensor))
 
-    # Normalizes the input spectrograms to have the same total energy, if requested
+    # Normalizes the input spectrograms to have the same total energy, if requested. The caller's tensor is never modified,
+    # so it's normalized into a new tensor if it wasn't copied when stacking.
     if normalize_input: 
-        _normalize_specs_tensor(specs_tensor, energy)
+        with _profile_stage("normalize_input"):
+            specs_tensor = _normalize_specs_tensor(specs_tensor, energy, copy=not is_copy)
     
     # Computes the combined spectrogram using the specified method.
-    comb_spec = _get_method_function(method)(specs_tensor, **kwargs)
+    with _profile_stage("combination", method=method) as stage:
+        comb_spec = _apply_method(method, specs_tensor, kwargs)
+        stage.set_output(comb_spec)
 
     # Normalizes the output spectrogram to match the input energy, if requested.
     if normalize_output:
-        _normalize_spec(comb_spec, energy)
+        with _profile_stage("normalize_output"):
+            return _normalize_spec(comb_spec, energy, out=out)
 
-    return comb_spec
+    return _write_output(comb_spec, out)
 
 # =============================================================================
 
-def _stack_specs(specs):
-    """Stacks the input spectrograms into a contiguous tensor."""
-    specs_tensor = np.ascontiguousarray(np.stack(specs, axis=0)).astype(np.double)
+def _stack_specs(specs, dtype=np.double):
+    """Stacks the input spectrograms into a contiguous tensor of the given data type.
+
+    A 3D array that is already C-contiguous and of the given data type (such as a read-only np.memmap) is returned as is, without copying, and other arrays are copied only once. Returns the tensor and whether it's a new array, which can be modified in place.
+    """
+    if isinstance(specs, np.ndarray):
+        if specs.ndim != 3:
+            raise InvalidSpecError("Input spectrograms must be 2-dimensional.")
+        if specs.dtype == dtype and specs.flags.c_contiguous:
+            return np.asarray(specs), False
+        return np.array(specs, dtype=dtype, order="C"), True
+
+    specs_tensor = np.ascontiguousarray(np.stack(specs, axis=0), dtype=dtype)
     if specs_tensor.ndim != 3:
         raise InvalidSpecError("Input spectrograms must be 2-dimensional.")
-    return specs_tensor
\ No newline at end of file
+    return specs_tensor, True
\ No newline at end of file
@@ -0,0 +1,113 @@
+import numpy as np
+from typing import Any, Dict, Iterable, Mapping, Union
+from ctfr.utils.cache import SpecsCache
+from ctfr.utils.private import _get_method_entry
+from ctfr.utils.profiling import _profile_stage
+from .core_utils import _normalize_spec
+from .ctfr import (
+    _ctfr_stfts,
+    _get_tfrs_function_and_params,
+    _get_stft_specs,
+    _get_cqt_specs,
+    _combine_specs,
+)
+
+def ctfr_multi(
+    signal: np.ndarray,
+    sr: float,
+    methods: Union[Iterable[str], Mapping[str, Mapping[str, Any]]],
+    *,
+    representation_type: str = "stft",
+    win_lengths: Iterable[int] = None,
+    hop_length: int = None,
+    n_fft: int = None,
+    filter_scales: Iterable[float] = None,
+    bins_per_octave: int = None,
+    fmin: float = None,
+    n_bins: int = None,
+    dtype: np.dtype = np.double,
+    cache: SpecsCache = None
+) -> Dict[str, np.ndarray]:
+    """Computes multiple combined time-frequency representations (CTFRs) of a waveform signal, with different combination methods or parameters.
+
+    This function is equivalent to calling :func:`ctfr.ctfr` once for each method, but the spectrograms are computed and normalized only once. Intermediate results that don't depend on all of a method's parameters are also computed only once and shared between the methods that use them, such as the local suitability (used by FLS with the same window sizes), the local smearing (used by LT with the same window sizes) and the local energy (used by SLS-H and SLS-I with the same energy window sizes).
+
+    Parameters
+    ----------
+    signal : np.ndarray [shape=(n)], real-valued
+        input signal.
+    sr : float
+        sampling rate of the input signal.
+    methods : Iterable[str] or Mapping[str, Mapping[str, Any]]
+        combination methods to use. Can be an iterable of method id strings (see :ref:`combination methods`), in which case the methods are called with their default parameters, or a mapping from method id strings to dictionaries of keyword arguments to pass to each method. To use the same method with different parameters, a key of the mapping can be any label, as long as the method id string is provided in its dictionary under the ``"method"`` key.
+    representation_type, win_lengths, hop_length, n_fft, filter_scales, bins_per_octave, fmin, n_bins, dtype, cache
+        TFRs parameters, data type and spectrograms cache. See :func:`ctfr.ctfr`.
+
+    Returns
+    -------
+    dict[str, np.ndarray [shape=(K, M)]]
+        CTFRs of the input signal, with the same keys (and in the same order) as ``methods``.
+
+    Raises
+    ------
+    InvalidRepresentationTypeError
+        If the value of provided for ``representation_type`` is invalid.
+    InvalidCombinationMethodError
+        If any of the requested methods is not the id of an installed combination method.
+    :external:class:`ValueError`
+        If ``n_fft`` is less than the largest window length, or if ``dtype`` is not a supported data type.
+
+    See Also
+    --------
+    ctfr.ctfr
+
+    Examples
+    --------
+    >>> results = ctfr.ctfr_multi(signal, sr, ["min", "swgm", "fls", "lt"])
+    >>> results = ctfr.ctfr_multi(signal, sr, {
+    ...     "lt_2": {"method": "lt", "eta": 2.0},
+    ...     "lt_8": {"method": "lt", "eta": 8.0}, # Reuses the local smearing computed for "lt_2".
+    ... })
+    """
+
+    requests = _get_method_requests(methods)
+
+    compute_function, params = _get_tfrs_function_and_params(
+        representation_type = representation_type,
+        sr = sr,
+        win_lengths = win_lengths,
+        hop_length = hop_length,
+        n_fft = n_fft,
+        filter_scales = filter_scales,
+        bins_per_octave = bins_per_octave,
+        fmin = fmin,
+        n_bins = n_bins,
+        dtype = dtype
+    )
+    get_specs_function = _get_stft_specs if compute_function is _ctfr_stfts else _get_cqt_specs
+    specs_tensor, input_energy, info = get_specs_function(signal, **params, cache = cache)
+
+    shared = {}
+    results = {}
+    for label, (method, kwargs) in requests.items():
+        comb_spec = _combine_specs(specs_tensor, method, info, kwargs, shared = shared)
+        with _profile_stage("normalize_output"):
+            results[label] = _normalize_spec(comb_spec, input_energy)
+    return results
+
+# =============================================================================
+
+def _get_method_requests(methods):
+    """Converts the methods argument of ctfr_multi to a dictionary mapping labels to (method, kwargs) pairs, validating the methods."""
+    if isinstance(methods, str):
+        methods = [methods]
+    if not isinstance(methods, Mapping):
+        methods = {method: {} for method in methods}
+
+    requests = {}
+    for label, kwargs in methods.items():
+        kwargs = dict(kwargs)
+        method = kwargs.pop("method", label)
+        _get_method_entry(method) # Raises InvalidCombinationMethodError before any computation.
+        requests[label] = (method, kwargs)
+    return requests
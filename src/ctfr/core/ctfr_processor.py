@@ -0,0 +1,129 @@
+import numpy as np
+from typing import Any, Iterable
+from .ctfr import _get_stft_params
+from ctfr.utils.audio import _get_multi_stft_windows
+from .stream_utils import _StftFramer, _FrameCombiner, _get_window_energies
+from ctfr.utils.private import _get_method_time_lobe
+
+class CTFRProcessor:
+    """Computes a combined time-frequency representation (CTFR) of a live signal, frame by frame.
+
+    The processor receives the signal in consecutive blocks of samples of any length (typically one hop at a time) through :meth:`push`, and returns the CTFR frames that can already be computed. Only the samples and spectrogram frames needed for the next frames are kept, so the cost of each call doesn't grow with the length of the signal received so far.
+
+    Parameters
+    ----------
+    sr : float
+        sampling rate of the input signal.
+    method : str
+        combination method to use, as specified by their id string. See :ref:`combination methods`. The method must support streaming: all methods included in this package do, except for SLS-I.
+    win_lengths, hop_length, n_fft
+        STFT parameters. See :func:`ctfr.ctfr`.
+    **kwargs
+        additional keyword arguments to pass to the combination method function. These are specified in their respective pages in :ref:`combination methods`.
+
+    Attributes
+    ----------
+    win_lengths : list of int
+        window lengths of the STFTs.
+    hop_length : int
+        hop length of the STFTs, which is also the time step between output frames.
+    n_fft : int
+        number of FFT points of the STFTs.
+    time_lobe : int
+        number of neighboring frames, on each side, used by the combination method to compute each frame.
+    latency : int
+        latency of the processor in samples. See the notes below.
+
+    Raises
+    ------
+    StreamingNotSupportedError
+        If the combination method does not support streaming.
+
+    Notes
+    -----
+    Frame ``m`` of the output is centered at sample ``m * hop_length`` of the input signal, as in :func:`ctfr.ctfr`. It's returned by the call to :meth:`push` that completes the input up to sample ``m * hop_length + latency``, where ``latency = ceil(n_fft / 2) + time_lobe * hop_length``: the STFT frame needs half of the largest window after its center, and the combination method needs ``time_lobe`` further frames. Measured from the first sample of the frame's largest analysis window, the latency is ``n_fft + time_lobe * hop_length`` samples.
+
+    The samples and the spectrogram frames are kept in preallocated buffers, which are reused from call to call when blocks of the same length are pushed. The local methods included in this package (FLS, LT and SLS-H) keep their local statistics between calls (local energies, and the sorted windowed regions of LT and of SLS-H in fast mode), so each frame is only processed once and the cost per output frame is about the same as when computing the CTFR of the whole signal at once, even with one hop per call (the lowest latency). Methods registered without a stream state are recomputed over the new frames and ``2 * time_lobe`` context frames on each call (see :ref:`adding methods`).
+
+    As the whole signal is never available, the spectrograms are normalized by the energies of their analysis windows, to which the spectrogram energies are proportional, and the output is not normalized. See :func:`ctfr.ctfr_stream` for details.
+
+    See Also
+    --------
+    ctfr.ctfr_stream
+
+    Examples
+    --------
+    >>> processor = ctfr.CTFRProcessor(22050, "fls")
+    >>> for hop in audio_input: # Blocks of samples from an audio interface.
+    ...     frames = processor.push(hop)
+    ...     display(frames)
+    >>> display(processor.flush())
+    """
+
+    def __init__(
+        self,
+        sr: float,
+        method: str,
+        *,
+        win_lengths: Iterable[int] = None,
+        hop_length: int = None,
+        n_fft: int = None,
+        **kwargs: Any
+    ):
+        params = _get_stft_params(
+            sr = sr,
+            win_lengths = win_lengths,
+            hop_length = hop_length,
+            n_fft = n_fft
+        )
+        self.sr = sr
+        self.method = method
+        self.win_lengths = params["win_lengths"]
+        self.hop_length = params["hop_length"]
+        self.n_fft = params["n_fft"]
+        self.time_lobe = _get_method_time_lobe(method, kwargs)
+        self.latency = (self.n_fft - self.n_fft // 2) + self.time_lobe * self.hop_length
+
+        self._windows = _get_multi_stft_windows(self.win_lengths, self.n_fft)
+        energies = _get_window_energies(self._windows)
+        self._scales = np.mean(energies) / energies
+        self._info = {
+            "representation_type": "stft",
+            **params
+        }
+        self._kwargs = kwargs
+        self.reset()
+
+    def push(self, samples: np.ndarray) -> np.ndarray:
+        """Appends samples to the input signal and returns the CTFR frames that can be computed.
+
+        Parameters
+        ----------
+        samples : np.ndarray [shape=(n)], real-valued
+            next samples of the input signal.
+
+        Returns
+        -------
+        np.ndarray [shape=(K, B)]
+            the next ``B`` frames of the CTFR, where ``B`` may be zero.
+        """
+        return self._combiner.push(self._framer.push(samples))
+
+    def flush(self) -> np.ndarray:
+        """Marks the end of the input signal and returns the remaining CTFR frames.
+
+        After this call, the processor is reset and can be used for a new signal.
+
+        Returns
+        -------
+        np.ndarray [shape=(K, B)]
+            the remaining ``B`` frames of the CTFR.
+        """
+        result = np.concatenate((self._combiner.push(self._framer.flush()), self._combiner.flush()), axis=1)
+        self.reset()
+        return result
+
+    def reset(self) -> None:
+        """Discards the received signal, so the processor can be used for a new signal."""
+        self._framer = _StftFramer(self.win_lengths, self.hop_length, self.n_fft, windows=self._windows)
+        self._combiner = _FrameCombiner(self.method, self.time_lobe, self._scales, self._kwargs, info=self._info)
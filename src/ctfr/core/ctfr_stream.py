@@ -0,0 +1,141 @@
+import numpy as np
+from os import PathLike
+from typing import Any, Iterable, Iterator, Union
+from .ctfr import _get_stft_params
+from ctfr.utils.audio import _get_multi_stft_windows
+from .stream_utils import _StftFramer, _FrameCombiner, _get_window_energies
+from ctfr.utils.private import _get_method_time_lobe
+
+def ctfr_stream(
+    source: Union[str, PathLike, np.ndarray, Iterable[np.ndarray]],
+    sr: float,
+    method: str,
+    *,
+    block_length: int = 256,
+    win_lengths: Iterable[int] = None,
+    hop_length: int = None,
+    n_fft: int = None,
+    **kwargs: Any
+) -> Iterator[np.ndarray]:
+    """Computes a combined time-frequency representation (CTFR) of a long signal in blocks of time frames, with bounded memory.
+
+    The signal is read and processed in blocks of about ``block_length`` STFT frames. Each block is combined with the frames in the time lobe of the combination method on each side (e.g. half of ``lm`` for FLS and LT) as context, so the concatenation of the yielded blocks matches the combination of the whole spectrograms. The local methods included in this package keep their local statistics between blocks, so the context frames aren't processed again. The peak memory usage is proportional to the block size, rather than to the length of the signal.
+
+    Parameters
+    ----------
+    source : str, path-like, np.ndarray [shape=(n)] or Iterable[np.ndarray [shape=(n_i)]]
+        input signal. Can be the path of an audio file (read at its native sampling rate and downmixed to mono), a 1D array (such as an :class:`np.memmap`), or an iterable (e.g. a generator) of consecutive 1D blocks of samples of any length.
+    sr : float or None
+        sampling rate of the input signal. When ``source`` is a path, this can be `None`, in which case the native sampling rate of the file is used.
+    method : str
+        combination method to use, as specified by their id string. See :ref:`combination methods`. The method must support streaming: all methods included in this package do, except for SLS-I.
+    block_length : int > 0, default=256
+        approximate number of time frames in each yielded block.
+    win_lengths, hop_length, n_fft
+        STFT parameters. See :func:`ctfr.ctfr`.
+    **kwargs
+        additional keyword arguments to pass to the combination method function. These are specified in their respective pages in :ref:`combination methods`.
+
+    Yields
+    ------
+    np.ndarray [shape=(K, B)]
+        blocks of consecutive time frames of the CTFR, where ``K`` is the number of frequency bins.
+
+    Raises
+    ------
+    StreamingNotSupportedError
+        If the combination method does not support streaming.
+    :external:class:`ValueError`
+        If ``sr`` doesn't match the sampling rate of the audio file, if ``block_length`` is not positive, or if ``n_fft`` is less than the largest window length.
+
+    Notes
+    -----
+    Only STFT spectrograms are supported.
+
+    When ``source`` is a path or an array, the signal is read twice: a first pass computes the total energy of each spectrogram, which is used to normalize the spectrograms exactly as in :func:`ctfr.ctfr`. When ``source`` is an iterable, the signal can only be read once, so the spectrograms are instead normalized by the energies of their analysis windows, to which the spectrogram energies are proportional apart from border effects.
+
+    Unlike :func:`ctfr.ctfr`, the output is not normalized as a whole, as this would require the complete CTFR. The concatenated output is equivalent to ``ctfr.ctfr_from_specs(specs, method, normalize_output=False)``, where ``specs`` are the (normalized) spectrograms of the whole signal.
+
+    See Also
+    --------
+    ctfr.ctfr
+    """
+
+    block_length = int(block_length)
+    if block_length < 1:
+        raise ValueError("The 'block_length' parameter must be a positive integer.")
+
+    if isinstance(source, (str, PathLike)):
+        sr = _check_file_sr(source, sr)
+
+    params = _get_stft_params(
+        sr = sr,
+        win_lengths = win_lengths,
+        hop_length = hop_length,
+        n_fft = n_fft
+    )
+    windows = _get_multi_stft_windows(params["win_lengths"], params["n_fft"])
+    time_lobe = _get_method_time_lobe(method, kwargs)
+    block_samples = block_length * params["hop_length"]
+
+    if isinstance(source, (str, PathLike)):
+        read_blocks = lambda: _read_file_blocks(source, block_samples)
+    elif isinstance(source, np.ndarray):
+        if source.ndim != 1:
+            raise ValueError("The input signal must be 1-dimensional.")
+        read_blocks = lambda: (source[i:i + block_samples] for i in range(0, source.shape[0], block_samples))
+    else:
+        read_blocks = None
+
+    # Normalization scales for each spectrogram.
+    if read_blocks is not None:
+        energies = _get_streamed_specs_energies(read_blocks(), windows, **params)
+        blocks = read_blocks()
+    else:
+        energies = _get_window_energies(windows)
+        blocks = source
+    scales = np.divide(np.mean(energies), energies, out=np.ones_like(energies), where=energies > 0)
+
+    info = {
+        "representation_type": "stft",
+        **params
+    }
+    framer = _StftFramer(windows=windows, **params)
+    combiner = _FrameCombiner(method, time_lobe, scales, kwargs, info=info)
+    return _stream_blocks(blocks, framer, combiner)
+
+# =============================================================================
+
+def _stream_blocks(blocks, framer, combiner):
+    """Feeds blocks of samples through the framer and the combiner, yielding the non-empty combined blocks."""
+    for block in blocks:
+        result = combiner.push(framer.push(block))
+        if result.shape[1] > 0:
+            yield result
+    for result in (combiner.push(framer.flush()), combiner.flush()):
+        if result.shape[1] > 0:
+            yield result
+
+def _check_file_sr(path, sr):
+    """Returns the sampling rate of an audio file, checking that it matches the provided one."""
+    import soundfile
+    file_sr = soundfile.info(path).samplerate
+    if sr is not None and sr != file_sr:
+        raise ValueError(f"The sampling rate of the audio file ({file_sr} Hz) doesn't match 'sr' ({sr} Hz). Resampling is not supported when streaming from a file.")
+    return file_sr
+
+def _read_file_blocks(path, block_samples):
+    """Reads an audio file in blocks of samples, downmixing to mono."""
+    import soundfile
+    with soundfile.SoundFile(path) as f:
+        for block in f.blocks(blocksize=block_samples, dtype="float64", always_2d=True):
+            yield np.mean(block, axis=1)
+
+def _get_streamed_specs_energies(blocks, windows, win_lengths, hop_length, n_fft):
+    """Computes the total energy of each spectrogram of a signal read in blocks."""
+    framer = _StftFramer(win_lengths, hop_length, n_fft, windows=windows)
+    energies = np.zeros(len(win_lengths), dtype=np.double)
+    for block in blocks:
+        energies += np.sum(framer.push(block), axis=(1, 2))
+    energies += np.sum(framer.flush(), axis=(1, 2))
+    return energies
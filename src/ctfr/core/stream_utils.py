@@ -0,0 +1,148 @@
+import numpy as np
+from ctfr.utils.audio import _multi_stft_spec, _get_multi_stft_windows
+from ctfr.utils.private import _apply_method, _request_tfrs_info, _get_method_stream_state
+
+class _StftFramer:
+    """Computes STFT spectrograms of a signal received in consecutive blocks of samples.
+
+    The frames are aligned as in a centered STFT with zero padding (the framing used by :func:`ctfr.ctfr`), so concatenating the frames returned by :meth:`push` and :meth:`flush` gives the same tensor as computing the spectrograms of the whole signal at once.
+    """
+
+    def __init__(self, win_lengths, hop_length, n_fft, windows=None):
+        self.win_lengths = win_lengths
+        self.hop_length = hop_length
+        self.n_fft = n_fft
+        self.windows = windows if windows is not None else _get_multi_stft_windows(win_lengths, n_fft)
+
+        # Samples not yet consumed are kept at the start of a preallocated buffer, which only grows if a block doesn't fit.
+        self._buffer = np.zeros(n_fft + hop_length)
+        self._length = n_fft // 2 # Starts with the left padding of a centered STFT.
+        self._num_samples = 0
+        self._num_frames = 0
+
+    def push(self, samples):
+        """Appends samples to the signal and returns the spectrogram frames that can be fully computed, as a (P, K, B) tensor."""
+        samples = np.asarray(samples, dtype=np.double)
+        if samples.ndim != 1:
+            raise ValueError("Signal blocks must be 1-dimensional.")
+        self._write(samples)
+        self._num_samples += samples.shape[0]
+        if self._length < self.n_fft:
+            return self._empty()
+        return self._frames(1 + (self._length - self.n_fft) // self.hop_length)
+
+    def flush(self):
+        """Marks the end of the signal and returns the remaining spectrogram frames, computed with zero padding on the right."""
+        total_frames = 1 + (self._num_samples + 2 * (self.n_fft // 2) - self.n_fft) // self.hop_length
+        num_frames = total_frames - self._num_frames
+        if num_frames <= 0:
+            return self._empty()
+        required_length = (num_frames - 1) * self.hop_length + self.n_fft
+        if self._length < required_length:
+            self._write(np.zeros(required_length - self._length))
+        return self._frames(num_frames)
+
+    def _write(self, samples):
+        end = self._length + samples.shape[0]
+        if end > self._buffer.shape[0]:
+            buffer = np.empty(end, dtype=np.double)
+            buffer[:self._length] = self._buffer[:self._length]
+            self._buffer = buffer
+        self._buffer[self._length:end] = samples
+        self._length = end
+
+    def _frames(self, num_frames):
+        frames = _multi_stft_spec(self._buffer[:(num_frames - 1) * self.hop_length + self.n_fft], self.windows, self.n_fft, self.hop_length, center=False)
+        consumed = min(num_frames * self.hop_length, self._length)
+        self._buffer[:self._length - consumed] = self._buffer[consumed:self._length]
+        self._length -= consumed
+        self._num_frames += num_frames
+        return frames
+
+    def _empty(self):
+        return np.zeros((len(self.win_lengths), 1 + self.n_fft // 2, 0), dtype=np.double)
+
+
+class _FrameCombiner:
+    """Combines spectrogram frames received in consecutive blocks, keeping only the frames needed as time context.
+
+    A frame is combined once ``context`` frames to its right have been received, and ``context`` frames to its left are kept after it's emitted, so each combination sees the same neighborhood as in a combination of the whole spectrograms. Concatenating the frames returned by :meth:`push` and :meth:`flush` gives the same result as the combination of the concatenated input frames, as long as ``context`` is at least the time lobe of the combination method.
+
+    The kept and the received frames are written in place to a (P, K, W) buffer. After each combination, the frames kept as context are moved to the start of the buffer, so when blocks of the same length are pushed (as one hop at a time), the buffer is reused and no frames tensor is allocated.
+
+    Methods with a stream state (the ``stream_state`` field of their entry, see :ref:`adding methods`) keep their local statistics between calls, so only the new frames are processed and the cost per output frame is about the same as in a combination of the whole spectrograms. The buffer then starts with ``context + 1`` zero frames, and ``context`` zero frames are appended when flushing, which are the zero padding of the whole spectrograms. Other methods are applied to the whole buffer, recomputing their local statistics over ``2 * context + B`` frames for a block of ``B`` frames, which only costs as much as a combination of the new frames for binwise methods (with no context).
+    """
+
+    def __init__(self, method, context, scales, method_kwargs, info=None):
+        self.method = method
+        self.context = context
+        self.scales = np.asarray(scales, dtype=np.double)[:, np.newaxis, np.newaxis]
+        self.method_kwargs = dict(method_kwargs)
+        if _request_tfrs_info(method):
+            self.method_kwargs["_info"] = info
+        self._state = _get_method_stream_state(method, self.method_kwargs)
+
+        self._frames = None # Buffer with the kept frames followed by the pending frames.
+        self._num_kept = context if self._state is None else context + 1 # Emitted frames kept as left context.
+        self._num_left = 0 if self._state is None else self._num_kept # Already emitted frames (or initial zero frames), kept as left context.
+        self._num_pending = 0 # Frames not yet emitted.
+
+    def push(self, frames):
+        """Appends (P, K, B) spectrogram frames and returns the combined frames that are ready, as a (K, B') matrix."""
+        self._append(frames, frames.shape[2])
+        return self._combine(self._num_pending - self.context)
+
+    def flush(self):
+        """Marks the end of the input and returns the remaining combined frames."""
+        if self._frames is None:
+            return np.zeros((0, 0), dtype=np.double)
+        if self._state is None:
+            return self._combine(self._num_pending)
+        # Zero padding on the right, which completes the context of the last frames.
+        num_pending = self._num_pending
+        self._append(None, self.context)
+        return self._combine(num_pending)
+
+    def _append(self, frames, num_frames):
+        """Writes num_frames frames (or zero frames, if frames is None) after the held ones, reallocating the buffer if its width doesn't match."""
+        num_held = self._num_left + self._num_pending
+        width = num_held + num_frames
+        if self._frames is None or (num_frames > 0 and self._frames.shape[2] != width):
+            # On the first call, the held frames are the initial zero frames (if any).
+            buffer = np.zeros((frames.shape[0], frames.shape[1], width), dtype=np.double) if self._frames is None else \
+                np.empty(self._frames.shape[:2] + (width,), dtype=np.double)
+            if self._frames is not None:
+                buffer[:, :, :num_held] = self._frames[:, :, :num_held]
+            self._frames = buffer
+        if frames is None:
+            self._frames[:, :, num_held:width] = 0.0
+        else:
+            np.multiply(frames, self.scales, out=self._frames[:, :, num_held:width])
+        self._num_pending += num_frames
+
+    def _combine(self, num_ready):
+        if num_ready <= 0:
+            return np.zeros((self._frames.shape[1], 0), dtype=np.double)
+        num_held = self._num_left + self._num_pending
+        if self._state is not None:
+            result = self._state.combine(self._frames, self._num_left, self._num_left + num_ready)
+        else:
+            # The buffer only has stale frames at its end when the block lengths change, or when flushing.
+            specs_tensor = self._frames if self._frames.shape[2] == num_held else np.ascontiguousarray(self._frames[:, :, :num_held])
+            comb_spec = _apply_method(self.method, specs_tensor, self.method_kwargs)
+            result = np.ascontiguousarray(comb_spec[:, self._num_left:self._num_left + num_ready])
+
+        num_emitted = self._num_left + num_ready
+        self._num_left = min(self._num_kept, num_emitted)
+        self._num_pending -= num_ready
+        start = num_emitted - self._num_left
+        self._frames[:, :, :num_held - start] = self._frames[:, :, start:num_held]
+        return result
+
+
+def _get_window_energies(windows):
+    """Computes the energy of each analysis window.
+
+    For a fixed ``n_fft`` and ``hop_length``, the total energy of a spectrogram is proportional to the energy of its analysis window (apart from border effects), so these values can be used to normalize spectrograms when the whole signal is not available.
+    """
+    return np.array([np.sum(np.square(window)) for window in windows])
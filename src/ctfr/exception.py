@@ -18,4 +18,17 @@ class CitationNotImplementedError(Exception_):
     pass
 
 class ArgumentRequiredError(Exception_):
-    pass
\ No newline at end of file
+    pass
+
+class StreamingNotSupportedError(Exception_):
+    pass
+
+class BatchItemError(Exception_):
+    """Raised (or returned) when an item of a batch computation fails. The failed item's position in the input is stored in the ``index`` attribute, and the original exception is chained as ``__cause__``."""
+    def __init__(self, message, index):
+        super().__init__(message)
+        self.index = index
+
+    def __reduce__(self):
+        # Keeps the index and the original exception when transferred between processes.
+        return (self.__class__, (self.args[0], self.index), {"__cause__": self.__cause__})
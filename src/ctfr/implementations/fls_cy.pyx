@@ -1,100 +1,310 @@
 import numpy as np
-from scipy.signal import correlate
-from libc.math cimport exp, sqrt
-from ctfr.utils.arguments_check import _enforce_nonnegative, _enforce_odd_positive_integer
+from cython.parallel cimport prange
+from libc.math cimport exp, log, sqrt
+from ctfr.utils.arguments_check import _enforce_nonnegative, _enforce_odd_positive_integer, _enforce_n_jobs
+from ctfr.utils.profiling import _profile_stage
+from .shared import _get_shared_intermediate, _get_window
+from .local_energy import _local_energy, _get_active_bins, _get_active_blocks, _get_skipped_fraction, _StreamingLocalEnergy
 cimport cython
 
-def _fls_wrapper(X, lk = 21, lm = 11, gamma = 20.0):
+def _fls_wrapper(X, lk = 21, lm = 11, gamma = 20.0, n_jobs = 1, energy_criterium_db = None, _shared = None):
 
     lk = _enforce_odd_positive_integer(lk, "lk", 21)
     lm = _enforce_odd_positive_integer(lm, "lm", 11)
     gamma = _enforce_nonnegative(gamma, "gamma", 20.0)
+    n_jobs = _enforce_n_jobs(n_jobs, "n_jobs", 1)
+    energy_criterium_db = None if energy_criterium_db is None else float(energy_criterium_db)
 
-    return _fls_cy(X, lk, lm, gamma)
+    if X.dtype == np.float32:
+        return _fls_cy[float](X, lk, lm, gamma, n_jobs, energy_criterium_db, _shared)
+    return _fls_cy[double](X, lk, lm, gamma, n_jobs, energy_criterium_db, _shared)
 
 @cython.boundscheck(False)
-@cython.wraparound(False) 
+@cython.wraparound(False)
 @cython.nonecheck(False)
 @cython.cdivision(True)
-cdef _fls_cy(double[:,:,::1] X, Py_ssize_t lk, Py_ssize_t lm, double gamma):
+cdef _fls_cy(const cython.floating[:,:,::1] X, Py_ssize_t lk, Py_ssize_t lm, double gamma, Py_ssize_t n_jobs, energy_criterium_db, _shared):
 
     cdef:
         Py_ssize_t P = X.shape[0] # Spectrograms axis.
         Py_ssize_t K = X.shape[1] # Frequency axis.
         Py_ssize_t M = X.shape[2] # Time axis.
+        Py_ssize_t p
 
         double epsilon = 1e-10 # Small value used to avoid 0 in some computations.
-        double window_size_sqrt = sqrt(<double> lk * lm)
+        bint gated = energy_criterium_db is not None
 
     X_ndarray = np.asarray(X)
+    dtype = X_ndarray.dtype
 
-    # Local energy containers.
-    cdef: 
-        double[:,:] local_energy_l1
-        double[:,:] local_energy_l2
-        double[:,:] local_energy_l1_sqrt
-
-    # Local suitability container.
-    suitability_ndarray = np.zeros((P, K, M), dtype=np.double)
-    cdef double[:,:,:] suitability = suitability_ndarray
+    # If an energy criterium is provided, the combination is only computed in the bins where the maximum local energy
+    # reaches it, and the binwise minimum is used elsewhere.
+    cdef const unsigned char[:, ::1] active
+    active_ndarray = None
+    if gated:
+        with _profile_stage("energy_gate") as stage:
+            active_ndarray = _get_active_bins(X_ndarray, lk, lm, energy_criterium_db)
+            stage.add_info(skipped_fraction=_get_skipped_fraction(active_ndarray))
+    active = active_ndarray
 
-    # Containers related to the combination step.
-    cdef double[:, :, :] log_suitability
-    cdef double[:, :] sum_log_suitability
-    combination_weight_ndarray = np.zeros((P, K, M), dtype=np.double)
-    cdef double[:, :, :] combination_weight = combination_weight_ndarray
+    if _shared is not None:
+        # When computing multiple combinations (see ctfr.ctfr_multi), the local suitability logarithm tensor is shared
+        # by all FLS combinations with the same window sizes, which is computed only once at the cost of P x K x M
+        # elements of memory. The combination is the same, so the results are identical. With an energy criterium, the
+        # tensor is only computed in the active bins, so it's only shared by combinations with the same criterium.
+        with _profile_stage("local_suitability"):
+            log_suitability_tensor = _get_shared_intermediate(_shared, ("fls_log_suitability", lk, lm, energy_criterium_db), _fls_log_suitability, X_ndarray, lk, lm, n_jobs, epsilon, active_ndarray)
+        with _profile_stage("combination"):
+            return _fls_combine(X, log_suitability_tensor, gamma, n_jobs, active)
 
-    # Generate the 2D window for local sparsity calculation.
-    hamming_window = np.outer(np.hamming(lk), np.hamming(lm))
+    # The spectrograms are combined one at a time: the weighted arithmetic mean of each bin is accumulated along with
+    # the running maximum of the local suitability logarithm, to which the weights are scaled (see _fls_accumulate).
+    # Apart from the result, only arrays of K x M elements are allocated. The accumulation releases the GIL, so
+    # combinations in other threads (such as in ctfr.ctfr_from_specs_batch) run in parallel.
+    max_log_suitability_ndarray = np.empty((K, M), dtype=np.double)
+    weights_sum_ndarray = np.empty((K, M), dtype=np.double)
+    result_acc_ndarray = np.empty((K, M), dtype=np.double)
+    cdef double[:, ::1] max_log_suitability = max_log_suitability_ndarray
+    cdef double[:, ::1] weights_sum = weights_sum_ndarray
+    cdef double[:, ::1] result_acc = result_acc_ndarray
 
-    ############ Local suitability calculation (using local Hoyer sparsity): {{{
+    log_suitability_ndarray = np.empty((K, M), dtype=dtype)
+    cdef cython.floating[:, ::1] log_suitability = log_suitability_ndarray
+    buffers = _get_log_suitability_buffers(K, M, dtype)
 
     for p in range(P):
-        # Calculate L1 and L2 local energy matrixes and element-wise square root of the L1 matrix.
-        # The clipping guarantees that the inequality ||x||_1 <= sqrt(N) ||x||_2 holds even when numerical errors occur.
-        local_energy_l1_ndarray = np.clip(
-            correlate(X_ndarray[p], hamming_window, mode="same"), 
-            a_min=epsilon*window_size_sqrt, a_max=None
-        )
-        local_energy_l2_ndarray = np.sqrt(
-            np.clip(
-                correlate(X_ndarray[p] * X_ndarray[p], hamming_window * hamming_window, mode="same"), 
-                a_min=local_energy_l1_ndarray / window_size_sqrt + epsilon, 
-                a_max=None
-            )
-        )
-        local_energy_l1_sqrt_ndarray = np.sqrt(local_energy_l1_ndarray)
-
-        # Point Cython memview to the calculated matrixes.
-        local_energy_l1 = local_energy_l1_ndarray
-        local_energy_l2 = local_energy_l2_ndarray
-        local_energy_l1_sqrt = local_energy_l1_sqrt_ndarray
-
-        # Calculate local suitability.
-        for k in range(K):
-            for m in range(M):
-                suitability[p, k, m] = (window_size_sqrt - local_energy_l1[k, m]/local_energy_l2[k, m])/ \
-                                        ((window_size_sqrt - 1) * local_energy_l1_sqrt[k, m]) + epsilon
-
-    ############ }}}
-
-    ############ Spectrograms combination {{{
-
-    # Calculate spectrograms logarithm tensor and its sum along first dimension.
-    log_suitability_ndarray = np.log(suitability_ndarray)
-    sum_log_suitability_ndarray = np.sum(log_suitability_ndarray, axis=0)
-
-    log_suitability = log_suitability_ndarray
-    sum_log_suitability = sum_log_suitability_ndarray
-
-    # Calculate combination weights based on local sparsity.
-    for p in range(P):
-        for k in range(K): 
-            for m in range(M):
-                combination_weight[p, k, m] = exp( (2*log_suitability[p, k, m] - sum_log_suitability[k, m]) * gamma)
+        with _profile_stage("local_suitability"):
+            _fls_spec_log_suitability(X_ndarray[p:p+1], lk, lm, epsilon, n_jobs, log_suitability_ndarray, *buffers, active=active_ndarray)
+        with _profile_stage("combination"), nogil:
+            _fls_accumulate(X, log_suitability, p, gamma, n_jobs, max_log_suitability, weights_sum, result_acc, active, gated)
+
+    return np.divide(result_acc_ndarray, weights_sum_ndarray, out=np.empty((K, M), dtype=dtype), casting="same_kind")
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def _fls_combine(const cython.floating[:, :, ::1] X, const cython.floating[:, :, ::1] log_suitability, double gamma, Py_ssize_t n_jobs, const unsigned char[:, ::1] active = None):
+    """Combines the spectrograms of X by their local suitability logarithm, a tensor with the shape of X. If the K x M mask active is provided, the binwise minimum is computed in the bins where it's zero."""
+    cdef:
+        Py_ssize_t P = X.shape[0]
+        Py_ssize_t K = X.shape[1]
+        Py_ssize_t M = X.shape[2]
+        Py_ssize_t p
+        bint gated = active is not None
+
+    max_log_suitability_ndarray = np.empty((K, M), dtype=np.double)
+    weights_sum_ndarray = np.empty((K, M), dtype=np.double)
+    result_acc_ndarray = np.empty((K, M), dtype=np.double)
+    cdef double[:, ::1] max_log_suitability = max_log_suitability_ndarray
+    cdef double[:, ::1] weights_sum = weights_sum_ndarray
+    cdef double[:, ::1] result_acc = result_acc_ndarray
+
+    with nogil:
+        for p in range(P):
+            _fls_accumulate(X, log_suitability[p], p, gamma, n_jobs, max_log_suitability, weights_sum, result_acc, active, gated)
+
+    return np.divide(result_acc_ndarray, weights_sum_ndarray, out=np.empty((K, M), dtype=np.asarray(X).dtype), casting="same_kind")
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+cdef void _fls_accumulate(
+    const cython.floating[:, :, ::1] X,
+    const cython.floating[:, ::1] log_suitability,
+    Py_ssize_t p,
+    double gamma,
+    Py_ssize_t n_jobs,
+    double[:, ::1] max_log_suitability,
+    double[:, ::1] weights_sum,
+    double[:, ::1] result_acc,
+    const unsigned char[:, ::1] active,
+    bint gated
+) noexcept nogil:
+    """Accumulates the spectrogram p, whose local suitability logarithm is log_suitability, in the weighted arithmetic mean of each bin.
+
+    The combination weights are defined up to a common factor in each bin, so they are scaled for the largest weight so far to be 1, which avoids overflows, especially in single precision. When a spectrogram has a larger weight, the accumulated sums are rescaled. If gated is True, the binwise minimum is accumulated instead in the bins where the K x M mask active is zero.
+    """
+    cdef:
+        Py_ssize_t K = X.shape[1]
+        Py_ssize_t M = X.shape[2]
+        Py_ssize_t k, m
+        double value, scale
+
+    for k in prange(K, schedule="static", num_threads=n_jobs):
+        for m in range(M):
+            if gated and not active[k, m]:
+                if p == 0:
+                    weights_sum[k, m] = 1.0
+                    result_acc[k, m] = X[0, k, m]
+                elif X[p, k, m] < result_acc[k, m]:
+                    result_acc[k, m] = X[p, k, m]
+                continue
+
+            value = log_suitability[k, m]
+            if p == 0:
+                max_log_suitability[k, m] = value
+                weights_sum[k, m] = 1.0
+                result_acc[k, m] = X[0, k, m]
+            elif value > max_log_suitability[k, m]:
+                scale = exp(2 * (max_log_suitability[k, m] - value) * gamma)
+                max_log_suitability[k, m] = value
+                weights_sum[k, m] = weights_sum[k, m] * scale + 1.0
+                result_acc[k, m] = result_acc[k, m] * scale + X[p, k, m]
+            else:
+                scale = exp(2 * (value - max_log_suitability[k, m]) * gamma)
+                weights_sum[k, m] = weights_sum[k, m] + scale
+                result_acc[k, m] = result_acc[k, m] + scale * X[p, k, m]
+
+def _fls_log_suitability(X, lk, lm, n_jobs, epsilon, active=None):
+    """Computes the logarithm of the local suitability (based on the local Hoyer sparsity) of each spectrogram, as a tensor with the shape of X. If the K x M mask active is provided, it's only computed in the bins where the mask is nonzero, and is undefined elsewhere."""
+    X = np.asarray(X)
+    log_suitability = np.empty_like(X)
+    buffers = _get_log_suitability_buffers(X.shape[1], X.shape[2], X.dtype)
+    for p in range(X.shape[0]):
+        _fls_spec_log_suitability(X[p:p+1], lk, lm, epsilon, n_jobs, log_suitability[p], *buffers, active=active)
+    return log_suitability
+
+def _get_log_suitability_buffers(K, M, dtype):
+    """Allocates the intermediate arrays used by _fls_spec_log_suitability."""
+    return tuple(np.empty((1, K, M), dtype=dtype) for _ in range(3))
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+def _fls_spec_log_suitability(
+    const cython.floating[:, :, ::1] X_spec,
+    Py_ssize_t lk,
+    Py_ssize_t lm,
+    double epsilon,
+    Py_ssize_t n_jobs,
+    cython.floating[:, ::1] out,
+    cython.floating[:, :, ::1] local_energy_l1,
+    cython.floating[:, :, ::1] local_energy_l2,
+    cython.floating[:, :, ::1] buffer,
+    const unsigned char[:, ::1] active = None
+):
+    """Computes the logarithm of the local suitability of a single spectrogram X_spec, of shape (1, K, M), writing it to out, of shape (K, M). The local energies are computed in the three buffers, which have the shape and data type of X_spec. If the K x M mask active is provided, the local energies are only computed in the blocks that cover its nonzero bins (see _get_active_blocks), and the logarithm only in those bins."""
+
+    cdef:
+        Py_ssize_t K = X_spec.shape[1] # Frequency axis.
+        Py_ssize_t M = X_spec.shape[2] # Time axis.
+        bint gated = active is not None
+
+    X_ndarray = np.asarray(X_spec)
+    local_energy_l1_ndarray = np.asarray(local_energy_l1)
+    local_energy_l2_ndarray = np.asarray(local_energy_l2)
+    buffer_ndarray = np.asarray(buffer)
+
+    if not gated:
+        _fls_local_energies(X_ndarray, lk, lm, epsilon, local_energy_l1_ndarray, local_energy_l2_ndarray, buffer_ndarray)
+    else:
+        # Each block is computed with a margin of half the window lengths, which holds all the bins that its local
+        # energies depend on, so the results in the block are the same as in the whole spectrogram.
+        for k_start, k_stop, m_start, m_stop in _get_active_blocks(active, lk, lm):
+            k_margin_start, k_margin_stop = max(k_start - lk // 2, 0), min(k_stop + lk // 2, K)
+            m_margin_start, m_margin_stop = max(m_start - lm // 2, 0), min(m_stop + lm // 2, M)
+            X_block = X_ndarray[:, k_margin_start:k_margin_stop, m_margin_start:m_margin_stop]
+            block_buffers = tuple(np.empty_like(X_block) for _ in range(3))
+            _fls_local_energies(X_block, lk, lm, epsilon, *block_buffers)
+
+            inner = (slice(None), slice(k_start - k_margin_start, k_stop - k_margin_start), slice(m_start - m_margin_start, m_stop - m_margin_start))
+            for destination, block_buffer in zip((local_energy_l1_ndarray, local_energy_l2_ndarray, buffer_ndarray), block_buffers):
+                destination[:, k_start:k_stop, m_start:m_stop] = block_buffer[inner]
+
+    _fls_energies_log_suitability(lk, lm, epsilon, n_jobs, local_energy_l1, local_energy_l2, buffer, out, active)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+def _fls_energies_log_suitability(
+    Py_ssize_t lk,
+    Py_ssize_t lm,
+    double epsilon,
+    Py_ssize_t n_jobs,
+    const cython.floating[:, :, ::1] local_energy_l1,
+    const cython.floating[:, :, ::1] local_energy_l2,
+    const cython.floating[:, :, ::1] local_energy_l1_sqrt,
+    cython.floating[:, ::1] out,
+    const unsigned char[:, ::1] active = None
+):
+    """Computes the logarithm of the local suitability of a single spectrogram from its local energies, of shape (1, K, M) (see _fls_finish_local_energies), writing it to out, of shape (K, M). If the K x M mask active is provided, it's only computed in the bins where the mask is nonzero."""
+
+    cdef:
+        Py_ssize_t K = out.shape[0] # Frequency axis.
+        Py_ssize_t M = out.shape[1] # Time axis.
+        Py_ssize_t k, m
+        bint gated = active is not None
+
+        double window_size_sqrt = sqrt(<double> lk * lm)
+
+    # Calculate local suitability logarithm.
+    for k in prange(K, nogil=True, schedule="static", num_threads=n_jobs):
+        for m in range(M):
+            if gated and not active[k, m]:
+                continue
+            out[k, m] = log((window_size_sqrt - local_energy_l1[0, k, m]/local_energy_l2[0, k, m])/ \
+                            ((window_size_sqrt - 1) * local_energy_l1_sqrt[0, k, m]) + epsilon)
+
+def _fls_local_energies(X_spec, lk, lm, epsilon, local_energy_l1, local_energy_l2, buffer):
+    """Computes the L1 local energy, the L2 local energy and the square root of the L1 local energy of X_spec, of shape (1, K, M), writing them to the three arrays, which have the shape and data type of X_spec."""
+    # Hamming windows (frequency and time) of the separable 2D window for local sparsity calculation.
+    hamming_freq = _get_window("hamming", lk)
+    hamming_time = _get_window("hamming", lm)
+
+    # Calculate L1 and L2 local energies and element-wise square root of the L1 local energy.
+    _local_energy(X_spec, hamming_freq, hamming_time, out=local_energy_l1, buffer=buffer)
+    np.square(X_spec, out=local_energy_l2)
+    _local_energy(local_energy_l2, _get_window("hamming_squared", lk), _get_window("hamming_squared", lm), out=local_energy_l2, buffer=buffer)
+    _fls_finish_local_energies(lk, lm, epsilon, local_energy_l1, local_energy_l2, buffer)
+
+def _fls_finish_local_energies(lk, lm, epsilon, local_energy_l1, local_energy_l2, buffer):
+    """Clips the L1 local energy and replaces the L2 local energy (of the squared spectrogram) by its clipped square root, in place, writing the square root of the L1 local energy to buffer."""
+    window_size_sqrt = sqrt(<double> lk * lm)
+
+    # The clipping guarantees that the inequality ||x||_1 <= sqrt(N) ||x||_2 holds even when numerical errors occur.
+    np.maximum(local_energy_l1, epsilon*window_size_sqrt, out=local_energy_l1)
+    np.divide(local_energy_l1, window_size_sqrt, out=buffer)
+    np.add(buffer, epsilon, out=buffer)
+    np.maximum(local_energy_l2, buffer, out=local_energy_l2)
+    np.sqrt(local_energy_l2, out=local_energy_l2)
+
+    np.sqrt(local_energy_l1, out=buffer)
+
+class _FlsStreamState:
+    """Stream state of the FLS method (see ctfr.CTFRProcessor), which computes the local energies of the received frames with _StreamingLocalEnergy, so each frame is processed once."""
+
+    def __init__(self, lk = 21, lm = 11, gamma = 20.0, n_jobs = 1, energy_criterium_db = None):
+        self.lk = _enforce_odd_positive_integer(lk, "lk", 21)
+        self.lm = _enforce_odd_positive_integer(lm, "lm", 11)
+        self.gamma = _enforce_nonnegative(gamma, "gamma", 20.0)
+        self.n_jobs = _enforce_n_jobs(n_jobs, "n_jobs", 1)
+        self.energy_criterium_db = None if energy_criterium_db is None else float(energy_criterium_db)
+        self.epsilon = 1e-10
+
+        self._l1 = _StreamingLocalEnergy(_get_window("hamming", self.lk), _get_window("hamming", self.lm))
+        self._l2 = _StreamingLocalEnergy(_get_window("hamming_squared", self.lk), _get_window("hamming_squared", self.lm), squared=True)
+        # Local energy of the energy criterium (see _get_active_bins).
+        self._gate = None
+        if self.energy_criterium_db is not None:
+            self._gate = _StreamingLocalEnergy(_get_window("hamming_normalized", self.lk), _get_window("hamming_left_normalized", self.lm))
+
+    def combine(self, frames, start, stop):
+        """Returns the combination of the frames in [start, stop) of the (P, K, W) tensor frames, as a (K, stop - start) matrix."""
+        X = np.ascontiguousarray(frames[:, :, start:stop])
+        local_energy_l1 = self._l1.compute(frames, start, stop)
+        local_energy_l2 = self._l2.compute(frames, start, stop)
+        local_energy_l1_sqrt = np.empty_like(local_energy_l1)
+        _fls_finish_local_energies(self.lk, self.lm, self.epsilon, local_energy_l1, local_energy_l2, local_energy_l1_sqrt)
 
-    
-    ############ Spectrograms combination }}}
+        active = None
+        if self._gate is not None:
+            max_energy = np.max(self._gate.compute(frames, start, stop), axis=0)
+            active = (max_energy >= 10.0 ** (self.energy_criterium_db / 10.0)).view(np.uint8)
 
-    # Calculate spectrogram as a binwise weighted arithmetic mean.
-    return np.average(X_ndarray, axis=0, weights=combination_weight_ndarray)
\ No newline at end of file
+        log_suitability = np.empty_like(X)
+        for p in range(X.shape[0]):
+            _fls_energies_log_suitability(self.lk, self.lm, self.epsilon, self.n_jobs, local_energy_l1[p:p+1], local_energy_l2[p:p+1], local_energy_l1_sqrt[p:p+1], log_suitability[p], active)
+        return _fls_combine(X, log_suitability, self.gamma, self.n_jobs, active)
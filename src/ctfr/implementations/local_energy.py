@@ -0,0 +1,134 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.ndimage import correlate1d
+from .shared import _get_window
+
+# Local energy engine shared by the methods that use local windowed sums of the spectrograms (FLS, SLS-H and SLS-I).
+# The analysis windows of these methods are separable (outer products of a frequency window and a time window), so the
+# 2D correlation of each spectrogram with the window is computed as two 1D correlations, one along each axis, for all
+# spectrograms at once.
+
+# Window lengths above which the correlation along an axis is computed with FFTs. Below it, the direct method is
+# faster (the crossover point is roughly the same for typical numbers of frequency bins and time frames).
+_FFT_MIN_WINDOW_LENGTH = 81
+
+def _local_energy(X, freq_window, time_window, out=None, buffer=None, method="auto"):
+    """Correlates each spectrogram of the tensor X with the 2D window np.outer(freq_window, time_window), with zero padding.
+
+    For windows of odd lengths, the result is equal (up to rounding) to scipy.signal.correlate(X[p], np.outer(freq_window, time_window), mode="same") for each spectrogram p. The result is written to out and returned, and buffer is used for the intermediate result. Both have the shape of X and are allocated with the data type of X if not provided. method can be "direct", "fft" or "auto", which chooses between them for each axis by the window length.
+    """
+    if out is None:
+        out = np.empty_like(X)
+    if buffer is None:
+        buffer = np.empty_like(X)
+
+    _correlate_axis(X, freq_window, 1, buffer, method)
+    _correlate_axis(buffer, time_window, 2, out, method)
+    return out
+
+def _correlate_axis(X, window, axis, out, method):
+    """Correlates X with a 1D window along an axis (centered, with zero padding), writing the result to out."""
+    window = np.asarray(window, dtype=np.double)
+    if method == "auto":
+        method = "fft" if window.shape[0] >= _FFT_MIN_WINDOW_LENGTH else "direct"
+
+    if method == "direct":
+        correlate1d(X, window, axis=axis, output=out, mode="constant", cval=0.0)
+    elif method == "fft":
+        # scipy.signal is slow to import, so it's only imported for long windows.
+        from scipy.signal import oaconvolve
+        # The correlation is the convolution with the reversed window.
+        shape = [1] * X.ndim
+        shape[axis] = window.shape[0]
+        np.copyto(out, oaconvolve(X, window[::-1].reshape(shape), mode="same", axes=axis), casting="same_kind")
+    else:
+        raise ValueError(f"Invalid local energy method: {method}")
+    return out
+
+def _sls_local_energy(X, lek, lem, epsilon):
+    """Computes the local energy of each spectrogram used by the SLS methods, with a Hamming window in frequency and a left-sided Hamming window in time."""
+    energy = _local_energy(X, _get_window("hamming_normalized", lek), _get_window("hamming_left_normalized", lem))
+    return np.maximum(energy, epsilon, out=energy)
+
+class _StreamingLocalEnergy:
+    """Computes the local energy (see _local_energy) of spectrogram frames received in consecutive blocks, as in ctfr.CTFRProcessor.
+
+    Each frame is correlated with the frequency window once, when it's first needed, and the correlated frames in the time lobe of the window are kept between calls. The time correlation is then only computed for the requested frames, so the cost per frame is the same as in _local_energy. If squared is True, the local energy of the squared spectrograms is computed instead.
+    """
+
+    def __init__(self, freq_window, time_window, squared=False):
+        self.freq_window = np.asarray(freq_window, dtype=np.double)
+        self.time_window = np.asarray(time_window, dtype=np.double)
+        self.squared = squared
+        self.lobe = self.time_window.shape[0] // 2
+
+        self._columns = None # Frequency-correlated frames, from lobe frames before the requested ones to lobe frames after them.
+        self._num_kept = 0 # Frames at the start of _columns kept from the previous call.
+
+    def compute(self, frames, start, stop):
+        """Returns the local energy of the frames in [start, stop) of the (P, K, W) tensor frames, as a (P, K, stop - start) tensor.
+
+        The lobe frames on each side of the requested ones must be in frames (with zeros beyond the ends of the spectrograms), and consecutive calls must request consecutive frames.
+        """
+        lobe = self.lobe
+        num_frames = stop - start
+        width = num_frames + 2 * lobe
+        if self._columns is None or self._columns.shape[2] != width:
+            columns = np.empty(frames.shape[:2] + (width,), dtype=np.double)
+            if self._columns is not None:
+                columns[:, :, :self._num_kept] = self._columns[:, :, :self._num_kept]
+            self._columns = columns
+
+        new_frames = frames[:, :, start - lobe + self._num_kept:stop + lobe]
+        if self.squared:
+            new_frames = np.square(new_frames)
+        _correlate_axis(new_frames, self.freq_window, 1, self._columns[:, :, self._num_kept:], "auto")
+        energy = sliding_window_view(self._columns, self.time_window.shape[0], axis=2) @ self.time_window
+
+        # The last frames are the first ones of the next call.
+        self._columns[:, :, :2 * lobe] = self._columns[:, :, num_frames:]
+        self._num_kept = 2 * lobe
+        return energy
+
+def _get_active_bins(X, freq_length, time_length, energy_criterium_db):
+    """Returns a K x M mask (of data type np.uint8) of the bins where the maximum local energy of the spectrograms reaches the energy criterium, in decibels.
+
+    The local energy is the one of the SLS methods (see _sls_local_energy), with a freq_length x time_length window, so an energy criterium selects the same regions in every method that has one. It's computed one spectrogram at a time.
+    """
+    X = np.asarray(X)
+    freq_window = _get_window("hamming_normalized", freq_length)
+    time_window = _get_window("hamming_left_normalized", time_length)
+    max_energy = np.zeros((1,) + X.shape[1:], dtype=X.dtype)
+    energy = np.empty_like(max_energy)
+    buffer = np.empty_like(max_energy)
+    for p in range(X.shape[0]):
+        _local_energy(X[p:p+1], freq_window, time_window, out=energy, buffer=buffer)
+        np.maximum(max_energy, energy, out=max_energy)
+    return (max_energy[0] >= 10.0 ** (energy_criterium_db / 10.0)).view(np.uint8)
+
+def _get_skipped_fraction(active):
+    """Returns the fraction of bins that are not active."""
+    return float(1.0 - np.count_nonzero(active) / active.size) if active.size else 0.0
+
+def _get_active_blocks(active, freq_length, time_length):
+    """Returns the rectangular blocks (k_start, k_stop, m_start, m_stop) that cover the nonzero bins of a K x M mask.
+
+    The mask is split into runs of time frames with active bins, and each run into runs of frequency bins with active bins in it. Runs separated by fewer inactive frames (or bins) than time_length (or freq_length) are merged, as computing a local statistic over a block needs a margin of about half the window length on each side.
+    """
+    active = np.asarray(active, dtype=bool)
+    blocks = []
+    for m_start, m_stop in _get_runs(active.any(axis=0), time_length):
+        for k_start, k_stop in _get_runs(active[:, m_start:m_stop].any(axis=1), freq_length):
+            blocks.append((k_start, k_stop, m_start, m_stop))
+    return blocks
+
+def _get_runs(mask, min_gap):
+    """Returns the (start, stop) ranges of the runs of True values of a 1D mask, merging runs separated by fewer than min_gap False values."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+    runs = []
+    for start, stop in zip(edges[::2], edges[1::2]):
+        if runs and start - runs[-1][1] < min_gap:
+            runs[-1] = (runs[-1][0], int(stop))
+        else:
+            runs.append((int(start), int(stop)))
+    return runs
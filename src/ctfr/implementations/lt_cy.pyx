@@ -1,45 +1,217 @@
 import numpy as np
 cimport cython
+from cython.parallel cimport prange
 from libc.math cimport INFINITY, sqrt, pow
-from ctfr.utils.arguments_check import _enforce_nonnegative, _enforce_odd_positive_integer
+from ctfr.utils.arguments_check import _enforce_nonnegative, _enforce_odd_positive_integer, _enforce_n_jobs
+from ctfr.utils.profiling import _profile_stage
+from .shared import _get_shared_intermediate, _get_window
+from .local_energy import _get_active_bins, _get_skipped_fraction, _StreamingLocalEnergy
+
+def _lt_wrapper(X, lk = 21, lm = 11, eta = 8.0, n_jobs = 1, energy_criterium_db = None, _shared = None):
 
-def _lt_wrapper(X, lk = 21, lm = 11, eta = 8.0):
-    
     lk = _enforce_odd_positive_integer(lk, "lk", 21)
     lm = _enforce_odd_positive_integer(lm, "lm", 11)
     eta = _enforce_nonnegative(eta, "eta", 8.0)
+    n_jobs = _enforce_n_jobs(n_jobs, "n_jobs", 1)
+    energy_criterium_db = None if energy_criterium_db is None else float(energy_criterium_db)
+
+    if X.dtype == np.float32:
+        return _lt_cy[float](X, lk, lm, eta, n_jobs, energy_criterium_db, _shared)
+    return _lt_cy[double](X, lk, lm, eta, n_jobs, energy_criterium_db, _shared)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+cdef _lt_cy(const cython.floating[:,:,::1] X_orig, Py_ssize_t lk, Py_ssize_t lm, double eta, Py_ssize_t n_jobs, energy_criterium_db, _shared):
+
+    cdef:
+        Py_ssize_t P = X_orig.shape[0] # Spectrograms axis.
+        Py_ssize_t K = X_orig.shape[1] # Frequency axis.
+        Py_ssize_t M = X_orig.shape[2] # Time axis.
+        double epsilon = 1e-15 # Small value used to avoid 0 in some computations.
+        bint gated = energy_criterium_db is not None
+
+    X_orig_ndarray = np.asarray(X_orig)
+    dtype = X_orig_ndarray.dtype
+
+    # Container that stores the result.
+    result_ndarray = np.zeros((K, M), dtype=dtype)
+    cdef cython.floating[:, ::1] result = result_ndarray
+
+    # If an energy criterium is provided, the local smearing is only computed in the bins where the maximum local energy
+    # reaches it, and the binwise minimum is used elsewhere.
+    cdef const unsigned char[:, ::1] active
+    active_ndarray = None
+    if gated:
+        with _profile_stage("energy_gate") as stage:
+            active_ndarray = _get_active_bins(X_orig_ndarray, lk, lm, energy_criterium_db)
+            stage.add_info(skipped_fraction=_get_skipped_fraction(active_ndarray))
+    active = active_ndarray
+
+    # Container that stores the local smearing. The number of jobs doesn't change the result, so it's not part of the key.
+    cdef cython.floating[:,:,::1] smearing
+    with _profile_stage("smearing"):
+        smearing_ndarray = _get_shared_intermediate(_shared, ("lt_smearing", lk, lm, energy_criterium_db), _lt_smearing, X_orig_ndarray, lk, lm, n_jobs, epsilon, active_ndarray)
+    smearing = smearing_ndarray
+
+    ############ Spectrograms weighted combination {{{
+
+    with _profile_stage("combination"), nogil:
+        _lt_combine(X_orig, smearing, eta, n_jobs, epsilon, result, active, gated)
+
+    ############ }}}
+
+    return result_ndarray
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+cdef void _lt_combine(
+    const cython.floating[:, :, ::1] X,
+    const cython.floating[:, :, ::1] smearing,
+    double eta,
+    Py_ssize_t n_jobs,
+    double epsilon,
+    cython.floating[:, ::1] result,
+    const unsigned char[:, ::1] active,
+    bint gated
+) noexcept nogil:
+    """Combines the spectrograms of X by their local smearing, writing the result to the K x M matrix result. If gated is True, the binwise minimum is computed in the bins where the K x M mask active is zero."""
+    cdef:
+        Py_ssize_t P = X.shape[0]
+        Py_ssize_t K = X.shape[1]
+        Py_ssize_t M = X.shape[2]
+        Py_ssize_t p, k, m
+        double weight, weights_sum, result_acc
+
+    for k in prange(K, schedule="static", num_threads=n_jobs):
+        for m in range(M):
+            if gated and not active[k, m]:
+                result[k, m] = X[0, k, m]
+                for p in range(1, P):
+                    if X[p, k, m] < result[k, m]:
+                        result[k, m] = X[p, k, m]
+                continue
 
-    return _lt_cy(X, lk, lm, eta)
+            weights_sum = 0.0
+            result_acc = 0.0
+            for p in range(P):
+                weight = 1./(pow(smearing[p, k, m], eta) + epsilon)
+                result_acc = result_acc + weight * X[p, k, m]
+                weights_sum = weights_sum + weight
+            result[k, m] = result_acc / weights_sum
 
 @cython.boundscheck(False)
-@cython.wraparound(False) 
+@cython.wraparound(False)
 @cython.nonecheck(False)
 @cython.cdivision(True)
-cdef _lt_cy(double[:,:,::1] X_orig, Py_ssize_t lk, Py_ssize_t lm, double eta):
+def _lt_smearing(const cython.floating[:,:,::1] X_orig, Py_ssize_t lk, Py_ssize_t lm, Py_ssize_t n_jobs, double epsilon, const unsigned char[:, ::1] active = None):
+    """Computes the local smearing of each spectrogram. If the K x M mask active is provided, the smearing is only computed in the bins where it's nonzero, and is zero elsewhere."""
 
     cdef:
         Py_ssize_t P = X_orig.shape[0] # Spectrograms axis.
         Py_ssize_t K = X_orig.shape[1] # Frequency axis.
         Py_ssize_t M = X_orig.shape[2] # Time axis.
-        
+
         Py_ssize_t lk_lobe = (lk-1)//2
         Py_ssize_t lm_lobe = (lm-1)//2
-        Py_ssize_t p, m, k, i_sort, j_sort, i, j
-        double key
+        Py_ssize_t p, u, segment
+        bint gated = active is not None
 
-        double epsilon = 1e-15 # Small value used to avoid 0 in some computations.
+    dtype = np.asarray(X_orig).dtype
 
-    # Zero-pad spectrograms for windowing.
-    X_ndarray = np.pad(X_orig, ((0, 0), (lk_lobe, lk_lobe), (lm_lobe, lm_lobe)))
-    cdef double[:, :, :] X = X_ndarray
+    # Zero-pad spectrograms for windowing. The padding in frequency is kept in the sorted vectors (see _lt_smearing_segment).
+    X_ndarray = np.pad(X_orig, ((0, 0), (0, 0), (lm_lobe, lm_lobe)))
+    cdef cython.floating[:, :, ::1] X = X_ndarray
 
-    # Container that stores an horizontal segment of a spectrogram, with all frequency bins. Used to calculate smearing. 
-    calc_region_ndarray = np.zeros((K + 2*lk_lobe, lm), dtype = np.double)
-    cdef double[:, :] calc_region = calc_region_ndarray 
+    # Container that stores the local smearing.
+    smearing_ndarray = np.zeros((P, K, M), dtype=dtype)
+    cdef cython.floating[:,:,::1] smearing = smearing_ndarray
+
+    # The smearing computation is split into work units, each covering a segment of time frames of one spectrogram.
+    # With a single job, each spectrogram is a single segment. With multiple jobs, time frames are also split so all jobs
+    # get work even when there are fewer spectrograms than jobs. Each segment starts by sorting its leftmost vectors from
+    # scratch, which yields the same sorted vectors (and thus bit-identical results) as the serial sliding computation.
+    cdef Py_ssize_t num_segments = 1
+    if n_jobs > 1:
+        num_segments = max(1, min((n_jobs + P - 1) // P, M // lm))
+    cdef Py_ssize_t num_units = P * num_segments
+
+    # Work-unit-local containers. {
+
+    # Stores an horizontal segment of a spectrogram, with all frequency bins. Used to calculate smearing.
+    calc_region_ndarray = np.zeros((num_units, K + 2*lk_lobe, lm), dtype = dtype)
+    cdef cython.floating[:, :, ::1] calc_region = calc_region_ndarray
+    # Heap that stores the smallest "nonconsumed" element of each vector in the merging.
+    heap_elements_ndarray = np.zeros((num_units, lk), dtype=dtype)
+    cdef cython.floating[:, ::1] heap_elements = heap_elements_ndarray
+    # Stores the vector of origin for each corresponding element in the heap.
+    heap_origins_ndarray = np.zeros((num_units, lk), dtype=np.intp)
+    cdef Py_ssize_t[:, ::1] heap_origins = heap_origins_ndarray
+    # Stores current index for each vector.
+    array_indices_ndarray = np.zeros((num_units, lk), dtype=np.intp)
+    cdef Py_ssize_t[:, ::1] array_indices = array_indices_ndarray
+    # Stores the combined vectors, alternating between even and odd iterations.
+    combined_ndarray = np.zeros((num_units, 2, lk*lm), dtype=dtype)
+    cdef cython.floating[:, :, ::1] combined = combined_ndarray
 
-    # Container that stores the result.
-    result_ndarray = np.zeros((K, M), dtype=np.double)
-    cdef double[:, :] result = result_ndarray
+    # }
+
+    ############ Local smearing calculation {{{
+
+    for u in prange(num_units, nogil=True, schedule="static", num_threads=n_jobs):
+        p = u // num_segments
+        segment = u % num_segments
+        _lt_smearing_segment(
+            X, smearing, p,
+            segment * M // num_segments, (segment + 1) * M // num_segments,
+            K, lk, lm, epsilon,
+            &calc_region[u, 0, 0], &heap_elements[u, 0], &heap_origins[u, 0], &array_indices[u, 0],
+            &combined[u, 0, 0], &combined[u, 1, 0],
+            active, gated, False
+        )
+
+    ############ }}}
+
+    return smearing_ndarray
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+cdef void _lt_smearing_segment(
+    cython.floating[:, :, ::1] X,
+    cython.floating[:, :, ::1] smearing,
+    Py_ssize_t p,
+    Py_ssize_t m_start,
+    Py_ssize_t m_end,
+    Py_ssize_t K,
+    Py_ssize_t lk,
+    Py_ssize_t lm,
+    double epsilon,
+    cython.floating* calc_region,
+    cython.floating* heap_elements,
+    Py_ssize_t* heap_origins,
+    Py_ssize_t* array_indices,
+    cython.floating* combined_even,
+    cython.floating* combined_odd,
+    const unsigned char[:, ::1] active,
+    bint gated,
+    bint resume
+) noexcept nogil:
+    """Computes the local smearing of spectrogram p for the (unpadded) time frames in [m_start, m_end).
+
+    X is the spectrograms tensor, zero-padded in time. If gated is True, the smearing is only computed in the (unpadded) bins where the K x M mask active is nonzero. calc_region is a (K + 2*lk_lobe) x lm row-major buffer, with the sorted horizontal vectors of the window (zero-padded in frequency), heap_elements, heap_origins and array_indices have lk elements and combined_even and combined_odd have lk*lm elements. If resume is True, calc_region holds the sorted vectors of frame m_start - 1, from a previous call, which are slid instead of sorted from scratch.
+    """
+
+    cdef:
+        Py_ssize_t lk_lobe = (lk-1)//2
+        Py_ssize_t lm_lobe = (lm-1)//2
+        Py_ssize_t m, k, i_sort, j_sort, i, j
+        cython.floating key
+        bint reinitialize
 
     # Variables related to creating and merging calculation vectors.
     cdef:
@@ -48,155 +220,132 @@ cdef _lt_cy(double[:,:,::1] X_orig, Py_ssize_t lk, Py_ssize_t lm, double eta):
         Py_ssize_t combined_size = lk*lm
         Py_ssize_t j_parent, j_left_child, j_right_child, j_smaller_child, o
         Py_ssize_t element_origin, origin_index
-        double inclusion_scalar, exclusion_scalar
+        cython.floating inclusion_scalar, exclusion_scalar
         Py_ssize_t combined_index, previous_comb_index
         Py_ssize_t inclusion_index, exclusion_index
 
-    # Containers related to the "merging" of sorted vectors using a heap. {
-
-    # Heap that stores the smallest "nonconsumed" element of each vector in the merging.
-    heap_elements_ndarray = np.zeros(num_vectors, dtype=np.double)
-    cdef double[:] heap_elements = heap_elements_ndarray 
-    # Stores the vector of origin for each corresponding element in the heap.
-    heap_origins_ndarray = np.zeros(num_vectors, dtype=np.intp)
-    cdef Py_ssize_t[:] heap_origins = heap_origins_ndarray 
-    # Stores current index for each vector.
-    array_indices_ndarray = np.zeros(num_vectors, dtype=np.intp)
-    cdef Py_ssize_t[:] array_indices = array_indices_ndarray 
-    # Stores the combined vector on even iterations.
-    combined_even_ndarray = np.zeros(combined_size, dtype=np.double)  
-    cdef double[:] combined_even = combined_even_ndarray
-    # Stores the combined vector on odd iterations.
-    combined_odd_ndarray = np.zeros(combined_size, dtype=np.double)  
-    cdef double[:] combined_odd = combined_odd_ndarray 
-
-    # Memviews that point to either combined_even or combined_odd, alternating every iteration.
-    cdef double[:] combined
-    cdef double[:] previous_combined
-
-    # }
-
-    # Container that stores the local smearing.
-    smearing_ndarray = np.zeros((P, K, M), dtype=np.double)
-    cdef double[:,:,:] smearing = smearing_ndarray
+    # Pointers to either combined_even or combined_odd, alternating every iteration.
+    cdef cython.floating* combined
+    cdef cython.floating* previous_combined
+    cdef cython.floating* swap
 
     # Variables related to smearing calculation.
     cdef double smearing_numerator, smearing_denominator
 
-    # Variables related to spectrogram combination.
-    cdef double weight, weights_sum, result_acc
-
-    ############ Local smearing calculation {{{
-
-    for p in range(P):
-        # Copies the initial horizontal segment to the container "calc_region".
+    # Copies the initial horizontal segment to the container "calc_region". The rows corresponding to frequency padding are kept at zero.
+    if not resume:
+        for k in range(lk_lobe):
+            for i in range(lm):
+                calc_region[k*lm + i] = 0.0
+                calc_region[(K + lk_lobe + k)*lm + i] = 0.0
         for k in range(lk_lobe, K + lk_lobe):
             for i in range(lm):
-                calc_region[k, i] = X[p, k, i]
-        # Iterates through the segments.
-        for m in range(lm_lobe, M + lm_lobe):
-            if m == lm_lobe:
-
-                 ##### Sorts the horizontal vectors from scratch (only done once per spectrogram, for the leftmost segment vectors.) {{
-                for k in range(lk_lobe, K + lk_lobe):
-                    # Sort the horizontal vector. For usual values of lm, it's faster to sort with this insertion sort code than using NumPy.
-                    for i_sort in range(1, lm):
-                        key = calc_region[k, i_sort]
-                        j_sort = i_sort - 1
-                        while j_sort >= 0 and key < calc_region[k, j_sort]:
-                            calc_region[k, j_sort + 1] = calc_region[k, j_sort]
-                            j_sort = j_sort - 1
-                        calc_region[k, j_sort + 1] = key
-                    # NumPy alternative:
-                    #calc_region_ndarray.sort()
-                ##### }}
+                calc_region[k*lm + i] = X[p, k - lk_lobe, m_start + i]
+
+    # Iterates through the segments.
+    for m in range(m_start + lm_lobe, m_end + lm_lobe):
+        if m == m_start + lm_lobe and not resume:
+
+            ##### Sorts the horizontal vectors from scratch (only done once per segment, for the leftmost segment vectors.) {{
+            for k in range(lk_lobe, K + lk_lobe):
+                # Sort the horizontal vector. For usual values of lm, it's faster to sort with this insertion sort code than using NumPy.
+                for i_sort in range(1, lm):
+                    key = calc_region[k*lm + i_sort]
+                    j_sort = i_sort - 1
+                    while j_sort >= 0 and key < calc_region[k*lm + j_sort]:
+                        calc_region[k*lm + j_sort + 1] = calc_region[k*lm + j_sort]
+                        j_sort = j_sort - 1
+                    calc_region[k*lm + j_sort + 1] = key
+            ##### }}
 
-            else:
+        else:
 
-                #### Obtains the next horizontal vectors, including the element at m + lm_lobe and excluding the one at m - lm_lobe - 1 {{
-                for k in range(lk_lobe, K + lk_lobe):
-                    inclusion_scalar = X[p, k, m + lm_lobe] #
-                    exclusion_scalar = X[p, k, m - lm_lobe - 1]
-                    i_sort = lm - 1
-                    while calc_region[k, i_sort] != exclusion_scalar:
-                        if inclusion_scalar > calc_region[k, i_sort]:
-                            calc_region[k, i_sort], inclusion_scalar = inclusion_scalar, calc_region[k, i_sort]
+            #### Obtains the next horizontal vectors, including the element at m + lm_lobe and excluding the one at m - lm_lobe - 1 {{
+            for k in range(lk_lobe, K + lk_lobe):
+                inclusion_scalar = X[p, k - lk_lobe, m + lm_lobe]
+                exclusion_scalar = X[p, k - lk_lobe, m - lm_lobe - 1]
+                i_sort = lm - 1
+                while calc_region[k*lm + i_sort] != exclusion_scalar:
+                    if inclusion_scalar > calc_region[k*lm + i_sort]:
+                        calc_region[k*lm + i_sort], inclusion_scalar = inclusion_scalar, calc_region[k*lm + i_sort]
 
-                        i_sort = i_sort - 1
                     i_sort = i_sort - 1
-                    while inclusion_scalar < calc_region[k, i_sort] and i_sort >= 0:
-                        calc_region[k, i_sort + 1] = calc_region[k, i_sort]
-                        i_sort = i_sort - 1
-                    calc_region[k, i_sort + 1] = inclusion_scalar 
-                ##### }}
+                i_sort = i_sort - 1
+                while i_sort >= 0 and inclusion_scalar < calc_region[k*lm + i_sort]:
+                    calc_region[k*lm + i_sort + 1] = calc_region[k*lm + i_sort]
+                    i_sort = i_sort - 1
+                calc_region[k*lm + i_sort + 1] = inclusion_scalar
+            ##### }}
 
-            ##### Performs the first merge of sorted vectors, using a heap. {{
-            combined = combined_odd
-            previous_combined = combined_even
-                
-            for i in range(num_vectors):
-                ### Initializes the heap with the first (i.e. the smallest) element of each vector {
-                heap_elements[i] = calc_region[i, 0]
-                heap_origins[i] = i
-                array_indices[i] = 0
-                ### }
-
-                ### Heapify up. {
-                j = i
-                j_parent = (j - 1) // 2
-                while j_parent >= 0 and heap_elements[j_parent] > heap_elements[j]:
-                    heap_elements[j_parent], heap_elements[j] = heap_elements[j], heap_elements[j_parent]
-                    heap_origins[j_parent], heap_origins[j] = i, heap_origins[j_parent]
-
-                    j = j_parent
+        combined = combined_odd
+        previous_combined = combined_even
+        reinitialize = True
+
+        # Iterates through frequency slices.
+        for k in range(lk_lobe, K + lk_lobe):
+            if gated and not active[k - lk_lobe, m - lm_lobe]:
+                # Skips the bin. The merged vector is rebuilt at the next computed bin.
+                reinitialize = True
+                continue
+
+            if reinitialize:
+                ##### Merges the sorted vectors of the window from scratch, using a heap. {{
+                reinitialize = False
+                for i in range(num_vectors):
+                    ### Initializes the heap with the first (i.e. the smallest) element of each vector {
+                    heap_elements[i] = calc_region[(k - lk_lobe + i)*lm]
+                    heap_origins[i] = i
+                    array_indices[i] = 0
+                    ### }
+
+                    ### Heapify up. {
+                    j = i
                     j_parent = (j - 1) // 2
-                ### }
-            for o in range(combined_size):
-                ### Pops the first element from the heap {
-                combined[o] = heap_elements[0]
-                element_origin = heap_origins[0]
-                array_indices[element_origin] += 1
-                origin_index = array_indices[element_origin]
-                if origin_index >= len_vectors:
-                    heap_elements[0] = INFINITY
-                else:
-                    heap_elements[0] = calc_region[element_origin, origin_index]
-                ### }
-
-                ### Heapify down {           
-                j = 0
-                j_left_child = 2*j + 1
-                while j_left_child < num_vectors:
-                    j_smaller_child = j_left_child
-                    j_right_child = j_left_child + 1
-                    if j_right_child < num_vectors and heap_elements[j_right_child] < heap_elements[j_left_child]:
-                        j_smaller_child = j_right_child
-
-                    if heap_elements[j] <= heap_elements[j_smaller_child]:
-                        break
-                    
-                    heap_elements[j], heap_elements[j_smaller_child] = heap_elements[j_smaller_child], heap_elements[j]
-                    heap_origins[j], heap_origins[j_smaller_child] = heap_origins[j_smaller_child], heap_origins[j]
-
-                    j = j_smaller_child
+                    while j_parent >= 0 and heap_elements[j_parent] > heap_elements[j]:
+                        heap_elements[j_parent], heap_elements[j] = heap_elements[j], heap_elements[j_parent]
+                        heap_origins[j_parent], heap_origins[j] = i, heap_origins[j_parent]
+
+                        j = j_parent
+                        j_parent = (j - 1) // 2
+                    ### }
+                for o in range(combined_size):
+                    ### Pops the first element from the heap {
+                    combined[o] = heap_elements[0]
+                    element_origin = heap_origins[0]
+                    array_indices[element_origin] += 1
+                    origin_index = array_indices[element_origin]
+                    if origin_index >= len_vectors:
+                        heap_elements[0] = INFINITY
+                    else:
+                        heap_elements[0] = calc_region[(k - lk_lobe + element_origin)*lm + origin_index]
+                    ### }
+
+                    ### Heapify down {
+                    j = 0
                     j_left_child = 2*j + 1
-                ### }
+                    while j_left_child < num_vectors:
+                        j_smaller_child = j_left_child
+                        j_right_child = j_left_child + 1
+                        if j_right_child < num_vectors and heap_elements[j_right_child] < heap_elements[j_left_child]:
+                            j_smaller_child = j_right_child
 
-            ##### }}
+                        if heap_elements[j] <= heap_elements[j_smaller_child]:
+                            break
 
-            ### Calculates the local smearing function. {{
-            smearing_denominator = 0.0
-            smearing_numerator = 0.0
-            for o in range(combined_size):
-                smearing_denominator = smearing_denominator + combined[o]
-                smearing_numerator = smearing_numerator + (combined_size - o)*combined[o]
-            smearing[p, 0, m - lm_lobe] = smearing_numerator/(sqrt(smearing_denominator) + epsilon)
-            ### }}
+                        heap_elements[j], heap_elements[j_smaller_child] = heap_elements[j_smaller_child], heap_elements[j]
+                        heap_origins[j], heap_origins[j_smaller_child] = heap_origins[j_smaller_child], heap_origins[j]
+
+                        j = j_smaller_child
+                        j_left_child = 2*j + 1
+                    ### }
 
-            # Iterates through frequency slices, except the first.
-            for k in range(lk_lobe + 1, K + lk_lobe):
+                ##### }}
+
+            else:
                 ### Merge with exclusion. It's the most computationally intensive part of the algorithm. {{
-                combined, previous_combined = previous_combined, combined
+                swap = combined
+                combined = previous_combined
+                previous_combined = swap
 
                 previous_comb_index = 0
                 combined_index = 0
@@ -206,50 +355,108 @@ cdef _lt_cy(double[:,:,::1] X_orig, Py_ssize_t lk, Py_ssize_t lm, double eta):
                 for o in range(combined_size + len_vectors):
                     if previous_comb_index >= combined_size:
                         # If the elements of "previous_combined" have already been exhausted, pop an element from "inclusion".
-                        combined[combined_index] = calc_region[k + lk_lobe, inclusion_index]
+                        combined[combined_index] = calc_region[(k + lk_lobe)*lm + inclusion_index]
                         combined_index = combined_index + 1
                         inclusion_index = inclusion_index + 1
-                    elif exclusion_index < len_vectors and previous_combined[previous_comb_index] == calc_region[k - lk_lobe - 1, exclusion_index]:
-                        # # Skip the element from previous_combined that belongs to "exclusion".
+                    elif exclusion_index < len_vectors and previous_combined[previous_comb_index] == calc_region[(k - lk_lobe - 1)*lm + exclusion_index]:
+                        # Skip the element from previous_combined that belongs to "exclusion".
                         previous_comb_index = previous_comb_index + 1
                         exclusion_index = exclusion_index + 1
-                    elif inclusion_index >= len_vectors or previous_combined[previous_comb_index] <= calc_region[k + lk_lobe, inclusion_index]:
-                         # If the elements of "inclusion" have already been exhausted, or if the current element of "previous_combined" is smaller than that of "inclusion", pop an element from "previous_combined".
+                    elif inclusion_index >= len_vectors or previous_combined[previous_comb_index] <= calc_region[(k + lk_lobe)*lm + inclusion_index]:
+                        # If the elements of "inclusion" have already been exhausted, or if the current element of "previous_combined" is smaller than that of "inclusion", pop an element from "previous_combined".
                         combined[combined_index] = previous_combined[previous_comb_index]
                         combined_index = combined_index + 1
                         previous_comb_index = previous_comb_index + 1
                     else:
                         # Lastly, if the current element of "inclusion" is smaller than that of "previous_combined", pop an element from "inclusion".
-                        combined[combined_index] = calc_region[k + lk_lobe, inclusion_index]
+                        combined[combined_index] = calc_region[(k + lk_lobe)*lm + inclusion_index]
                         combined_index = combined_index + 1
                         inclusion_index = inclusion_index + 1
 
                 ### }}
 
-                ### Calculate smearing function {{
-                smearing_denominator = 0.0
-                smearing_numerator = 0.0
-                for o in range(combined_size):
-                    smearing_denominator = smearing_denominator + combined[o]
-                    smearing_numerator = smearing_numerator + (combined_size-o)*combined[o]
-                smearing[p, k - lk_lobe, m - lm_lobe] = smearing_numerator/(sqrt(smearing_denominator) + epsilon)
-                
-                ### }}
-    
-    ############ }}}
-
-    ############ Spectrograms weighted combination {{{
-
-    for k in range(K):
-        for m in range(M):
-            weights_sum = 0.0
-            result_acc = 0.0
-            for p in range(P):
-                weight = 1./(pow(smearing[p, k, m], eta) + epsilon)
-                result_acc = result_acc + weight * X_orig[p, k, m]
-                weights_sum = weights_sum + weight
-            result[k, m] = result_acc / weights_sum
-
-    ############ }}}
+            ### Calculate smearing function {{
+            smearing_denominator = 0.0
+            smearing_numerator = 0.0
+            for o in range(combined_size):
+                smearing_denominator = smearing_denominator + combined[o]
+                smearing_numerator = smearing_numerator + (combined_size-o)*combined[o]
+            smearing[p, k - lk_lobe, m - lm_lobe] = smearing_numerator/(sqrt(smearing_denominator) + epsilon)
+            ### }}
 
-    return result_ndarray
\ No newline at end of file
+class _LtStreamState:
+    """Stream state of the LT method (see ctfr.CTFRProcessor). The sorted horizontal vectors of each spectrogram (see _lt_smearing_segment) are kept between calls and slid along the received frames, so they're only sorted once and the cost per frame is the same as in _lt_smearing."""
+
+    def __init__(self, lk = 21, lm = 11, eta = 8.0, n_jobs = 1, energy_criterium_db = None):
+        self.lk = _enforce_odd_positive_integer(lk, "lk", 21)
+        self.lm = _enforce_odd_positive_integer(lm, "lm", 11)
+        self.eta = _enforce_nonnegative(eta, "eta", 8.0)
+        self.n_jobs = _enforce_n_jobs(n_jobs, "n_jobs", 1)
+        self.energy_criterium_db = None if energy_criterium_db is None else float(energy_criterium_db)
+        self.epsilon = 1e-15
+
+        # Local energy of the energy criterium (see _get_active_bins).
+        self._gate = None
+        if self.energy_criterium_db is not None:
+            self._gate = _StreamingLocalEnergy(_get_window("hamming_normalized", self.lk), _get_window("hamming_left_normalized", self.lm))
+        self._calc_region = None # Containers of _lt_smearing_segment, one per spectrogram, allocated on the first call.
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def combine(self, frames, start, stop):
+        """Returns the combination of the frames in [start, stop) of the (P, K, W) tensor frames, as a (K, stop - start) matrix. The frame before the lm // 2 frames to the left of start must also be in frames."""
+        cdef:
+            double[:, :, ::1] X = frames
+            Py_ssize_t P = X.shape[0]
+            Py_ssize_t K = X.shape[1]
+            Py_ssize_t lk = self.lk
+            Py_ssize_t lm = self.lm
+            Py_ssize_t n_jobs = self.n_jobs
+            double epsilon = self.epsilon
+            double eta = self.eta
+            bint gated = self._gate is not None
+            bint resume = self._calc_region is not None
+            Py_ssize_t p
+            # Frame j of frames is the (unpadded) time frame j - lm // 2 of _lt_smearing_segment, as frames is zero-padded
+            # in time by the frames before the first one.
+            Py_ssize_t m_start = start - lm // 2
+            Py_ssize_t m_end = stop - lm // 2
+
+        if not resume:
+            self._calc_region = np.zeros((P, K + 2*(lk // 2), lm), dtype=np.double)
+            self._heap_elements = np.zeros((P, lk), dtype=np.double)
+            self._heap_origins = np.zeros((P, lk), dtype=np.intp)
+            self._array_indices = np.zeros((P, lk), dtype=np.intp)
+            self._combined = np.zeros((P, 2, lk*lm), dtype=np.double)
+        cdef double[:, :, ::1] calc_region = self._calc_region
+        cdef double[:, ::1] heap_elements = self._heap_elements
+        cdef Py_ssize_t[:, ::1] heap_origins = self._heap_origins
+        cdef Py_ssize_t[:, ::1] array_indices = self._array_indices
+        cdef double[:, :, ::1] combined = self._combined
+
+        cdef const unsigned char[:, ::1] active
+        active_ndarray = None
+        if gated:
+            active_ndarray = np.zeros((K, m_end), dtype=np.uint8)
+            active_ndarray[:, m_start:] = np.max(self._gate.compute(frames, start, stop), axis=0) >= 10.0 ** (self.energy_criterium_db / 10.0)
+        active = active_ndarray
+
+        smearing_ndarray = np.empty((P, K, m_end), dtype=np.double)
+        cdef double[:, :, ::1] smearing = smearing_ndarray
+        for p in prange(P, nogil=True, schedule="static", num_threads=n_jobs):
+            _lt_smearing_segment(
+                X, smearing, p, m_start, m_end, K, lk, lm, epsilon,
+                &calc_region[p, 0, 0], &heap_elements[p, 0], &heap_origins[p, 0], &array_indices[p, 0],
+                &combined[p, 0, 0], &combined[p, 1, 0],
+                active, gated, resume
+            )
+
+        # The combination only reads the requested frames.
+        cdef const double[:, :, ::1] X_ready = np.ascontiguousarray(frames[:, :, start:stop])
+        cdef const double[:, :, ::1] smearing_ready = np.ascontiguousarray(smearing_ndarray[:, :, m_start:])
+        cdef const unsigned char[:, ::1] active_ready = np.ascontiguousarray(active_ndarray[:, m_start:]) if gated else None
+        result_ndarray = np.empty((K, stop - start), dtype=np.double)
+        cdef double[:, ::1] result = result_ndarray
+        with nogil:
+            _lt_combine(X_ready, smearing_ready, eta, n_jobs, epsilon, result, active_ready, gated)
+        return result_ndarray
@@ -0,0 +1,51 @@
+import numpy as np
+from ctfr.utils.cache import plan_cache
+
+# Intermediate results that can be shared by combination methods when computing multiple combinations of the same
+# spectrograms tensor (see ctfr.ctfr_multi). Methods that support this receive a dictionary as the "_shared" argument,
+# which is None otherwise. Shared intermediates must not be modified by the methods that use them.
+
+def _get_shared_intermediate(shared, key, function, *args):
+    """Returns the intermediate result stored in the shared dictionary under key, computing it as function(*args) and storing it if it's not present. If shared is None, the result is computed and not stored."""
+    if shared is None:
+        return function(*args)
+    try:
+        return shared[key]
+    except KeyError:
+        result = shared[key] = function(*args)
+        return result
+
+# Local analysis windows of the combination methods, which are taken from the process-wide plan cache (see
+# ctfr.plan_cache), so they are not rebuilt for each combination. Cached windows are read-only.
+
+def _get_window(kind, length):
+    """Returns a 1D window of the given kind and length from the plan cache. See _WINDOW_BUILDERS for the available kinds."""
+    length = int(length)
+    return plan_cache._get(("method_window", kind, length), _WINDOW_BUILDERS[kind], length)
+
+def _hamming_left_normalized(length):
+    """Left-sided Hamming window (zero after its center), normalized to unit sum."""
+    window = np.hamming(length)
+    window[(length - 1)//2 + 1:] = 0
+    return window / np.sum(window)
+
+_WINDOW_BUILDERS = {
+    "hamming": np.hamming,
+    "hamming_squared": lambda length: np.square(np.hamming(length)),
+    "hamming_normalized": lambda length: np.hamming(length) / np.sum(np.hamming(length)),
+    "hamming_left_normalized": _hamming_left_normalized,
+    "ones": np.ones,
+}
+
+# Per-thread buffers of the combination methods are written in parallel, so each thread's row is aligned to a cache line
+# and padded to a whole number of cache lines, avoiding false sharing between threads.
+
+_CACHE_LINE_BYTES = 64
+
+def _empty_thread_rows(num_threads, row_length, dtype=np.double):
+    """Allocates a (num_threads, row_length') array, with row_length' >= row_length, whose rows start at cache line boundaries and don't share cache lines."""
+    itemsize = np.dtype(dtype).itemsize
+    stride = -(-row_length * itemsize // _CACHE_LINE_BYTES) * _CACHE_LINE_BYTES // itemsize
+    storage = np.empty(num_threads * stride + _CACHE_LINE_BYTES // itemsize, dtype=dtype)
+    offset = (-storage.ctypes.data % _CACHE_LINE_BYTES) // itemsize
+    return storage[offset:offset + num_threads * stride].reshape(num_threads, stride)
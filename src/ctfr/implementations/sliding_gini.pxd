@@ -0,0 +1,15 @@
+# Sorted window of values used to compute the Gini index of the local sparsity methods (SLS-H and SLS-I). See
+# sliding_gini.pyx for details.
+
+cdef struct _SortedWindow:
+    double* values     # Window values, sorted in ascending order after _window_sort or _window_slide.
+    double* buffer     # Merge destination, swapped with values after each slide.
+    double* inclusion  # Values entering the window in the next slide.
+    double* exclusion  # Values leaving the window in the next slide.
+    Py_ssize_t size
+
+cdef void _window_init(_SortedWindow* window, double[:, ::1] storage) noexcept nogil
+cdef void _window_sort(_SortedWindow* window) noexcept nogil
+cdef void _window_slide(_SortedWindow* window, Py_ssize_t num_changes) noexcept nogil
+cdef double _window_gini(_SortedWindow* window, double epsilon) noexcept nogil
+cdef void _sort(double* values, Py_ssize_t n) noexcept nogil
@@ -0,0 +1,131 @@
+cimport cython
+
+# Sorted window of values used to compute the Gini index of the local sparsity methods (SLS-H and SLS-I).
+#
+# The Gini index of a window is computed from its values in ascending order. A window can be sorted from scratch with
+# _window_sort, after its values are written to window.values. When the window slides and only some of its values
+# change, the values leaving the window are written to window.exclusion and the values entering the window to
+# window.inclusion, and _window_slide updates the sorted values in O(size) operations by merging the previous sorted
+# values with the sorted inclusion values, skipping the sorted exclusion values (as in the local smearing computation of
+# the LT method). The excluded values must be exactly equal to values of the window, which holds as long as they are
+# computed in the same way as the values that entered the window. The SLS wrappers reject spectrograms with NaN, which is
+# never equal to itself.
+#
+# All functions release the GIL and don't allocate memory: the buffers are provided by the caller, as a (4, size)
+# C-contiguous array passed to _window_init.
+
+cdef void _window_init(_SortedWindow* window, double[:, ::1] storage) noexcept nogil:
+    window.size = storage.shape[1]
+    window.values = &storage[0, 0]
+    window.buffer = &storage[1, 0]
+    window.inclusion = &storage[2, 0]
+    window.exclusion = &storage[3, 0]
+
+cdef void _window_sort(_SortedWindow* window) noexcept nogil:
+    _sort(window.values, window.size)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _window_slide(_SortedWindow* window, Py_ssize_t num_changes) noexcept nogil:
+    cdef:
+        double* previous = window.values
+        double* combined = window.buffer
+        double* inclusion = window.inclusion
+        double* exclusion = window.exclusion
+        Py_ssize_t size = window.size
+        Py_ssize_t i = 0, j = 0, e = 0, o = 0
+
+    _sort(inclusion, num_changes)
+    _sort(exclusion, num_changes)
+
+    # The output index is also bounded by the window size, so excluded values that don't match any value of the window
+    # (which is only possible for NaN) can't cause writes past the end of the buffer.
+    while i < size and o < size:
+        if e < num_changes and previous[i] == exclusion[e]:
+            i += 1
+            e += 1
+        elif j < num_changes and inclusion[j] < previous[i]:
+            combined[o] = inclusion[j]
+            j += 1
+            o += 1
+        else:
+            combined[o] = previous[i]
+            i += 1
+            o += 1
+    while j < num_changes and o < size:
+        combined[o] = inclusion[j]
+        j += 1
+        o += 1
+
+    window.values, window.buffer = combined, previous
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef double _window_gini(_SortedWindow* window, double epsilon) noexcept nogil:
+    cdef:
+        double* values = window.values
+        Py_ssize_t size = window.size
+        Py_ssize_t i
+        double arr_norm = 0.0
+        double gini = 0.0
+
+    for i in range(size):
+        arr_norm = arr_norm + values[i]
+        gini = gini - 2*values[i] * (size - i - 0.5)/ (<double> size)
+    return 1 + gini/(arr_norm + epsilon)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _sort(double* values, Py_ssize_t n) noexcept nogil:
+    """Sorts values in ascending order (quicksort with median-of-three pivots, insertion sort for short partitions)."""
+    cdef:
+        Py_ssize_t i, j, mid
+        double pivot, tmp
+
+    while n > 16: # Shorter partitions are sorted by insertion.
+        # Median of three, placed at values[0], with values[n - 1] >= pivot as a sentinel.
+        mid = n // 2
+        if values[mid] < values[0]:
+            values[0], values[mid] = values[mid], values[0]
+        if values[n - 1] < values[0]:
+            values[0], values[n - 1] = values[n - 1], values[0]
+        if values[n - 1] < values[mid]:
+            values[mid], values[n - 1] = values[n - 1], values[mid]
+        values[0], values[mid] = values[mid], values[0]
+        pivot = values[0]
+
+        # Hoare partition.
+        i = 0
+        j = n
+        while True:
+            i += 1
+            while values[i] < pivot:
+                i += 1
+            j -= 1
+            while pivot < values[j]:
+                j -= 1
+            if i >= j:
+                break
+            tmp = values[i]
+            values[i] = values[j]
+            values[j] = tmp
+        values[0] = values[j]
+        values[j] = pivot
+
+        # Recurses into the shorter partition and iterates on the longer one, bounding the stack depth.
+        if j < n - j - 1:
+            _sort(values, j)
+            values = values + j + 1
+            n = n - j - 1
+        else:
+            _sort(values + j + 1, n - j - 1)
+            n = j
+
+    for i in range(1, n):
+        tmp = values[i]
+        j = i - 1
+        while j >= 0 and values[j] > tmp:
+            values[j + 1] = values[j]
+            j -= 1
+        values[j + 1] = tmp
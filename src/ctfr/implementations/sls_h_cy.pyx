@@ -1,8 +1,12 @@
 import numpy as np
-from scipy.signal import correlate
 cimport cython
-from libc.math cimport INFINITY, exp
-from ctfr.utils.arguments_check import _enforce_nonnegative, _enforce_odd_positive_integer
+from libc.math cimport INFINITY, exp, log
+from libc.stdlib cimport malloc, free
+from ctfr.utils.arguments_check import _enforce_nonnegative, _enforce_odd_positive_integer, _enforce_choice, _enforce_finite_specs
+from ctfr.utils.profiling import _profile_stage
+from .shared import _get_shared_intermediate, _get_window
+from .local_energy import _sls_local_energy, _StreamingLocalEnergy
+from .sliding_gini cimport _SortedWindow, _window_init, _window_sort, _window_slide, _window_gini
 
 def _sls_h_wrapper(X, 
         lek = 11, 
@@ -10,7 +14,9 @@ def _sls_h_wrapper(X,
         lem = 11, 
         lsm = 11, 
         beta = 80, 
-        energy_criterium_db = -40
+        energy_criterium_db = -40,
+        gini_mode = "exact",
+        _shared = None
     ):
 
     lek = _enforce_odd_positive_integer(lek, "lek", 11)
@@ -19,14 +25,19 @@ def _sls_h_wrapper(X,
     lsm = _enforce_odd_positive_integer(lsm, "lsm", 11)
     beta = _enforce_nonnegative(beta, "beta", 80.0)
     energy_criterium_db = float(energy_criterium_db)
+    fast_gini = _enforce_choice(gini_mode, "gini_mode", ("exact", "fast")) == "fast"
+    # The sorted windows remove values by exact comparison, which doesn't hold for NaN.
+    _enforce_finite_specs(X)
 
-    return _sls_h_cy(X, lek, lsk, lem, lsm, beta, energy_criterium_db)
+    if X.dtype == np.float32:
+        return _sls_h_cy[float](X, lek, lsk, lem, lsm, beta, energy_criterium_db, fast_gini, _shared)
+    return _sls_h_cy[double](X, lek, lsk, lem, lsm, beta, energy_criterium_db, fast_gini, _shared)
 
 @cython.boundscheck(False)
 @cython.wraparound(False) 
 @cython.nonecheck(False)
 @cython.cdivision(True)
-cdef _sls_h_cy(double[:,:,::1] X_orig, Py_ssize_t lek, Py_ssize_t lsk, Py_ssize_t lem, Py_ssize_t lsm, double beta, double energy_criterium_db):
+cdef _sls_h_cy(const cython.floating[:,:,::1] X_orig, Py_ssize_t lek, Py_ssize_t lsk, Py_ssize_t lem, Py_ssize_t lsm, double beta, double energy_criterium_db, bint fast_gini, _shared):
 
     cdef:
         Py_ssize_t P = X_orig.shape[0] # Spectrograms axis
@@ -37,63 +48,57 @@ cdef _sls_h_cy(double[:,:,::1] X_orig, Py_ssize_t lek, Py_ssize_t lsk, Py_ssize_
         Py_ssize_t lsk_lobe = (lsk-1)//2
         Py_ssize_t lsm_lobe = (lsm-1)//2
         Py_ssize_t lem_lobe = (lem-1)//2
-        Py_ssize_t p, m, k, i, j
+        Py_ssize_t p, m, k, i, j, red_k, red_m, shift
 
         double epsilon = 1e-10
         Py_ssize_t combined_size_sparsity = lsm * lsk
     
     X_orig_ndarray = np.asarray(X_orig)
+    dtype = X_orig_ndarray.dtype
     # Zero-pad spectrograms for windowing.
     X_ndarray = np.pad(X_orig, ((0, 0), (lsk_lobe, lsk_lobe), (lsm_lobe, lsm_lobe)))
-    cdef double[:, :, :] X = X_ndarray
-
-    # Containers for the hamming window (local sparsity) and the asymmetric hamming window (local energy)
-    hamming_freq_energy_ndarray = np.hamming(lek)
-    hamming_freq_sparsity_ndarray = np.hamming(lsk)
-    hamming_time_ndarray = np.hamming(lsm)
-    hamming_asym_time_ndarray = np.hamming(lem)
-    hamming_asym_time_ndarray[lem_lobe+1:] = 0
-
-    hamming_energy = np.outer(hamming_freq_energy_ndarray, hamming_asym_time_ndarray)
-    cdef double[:] hamming_freq_sparsity = hamming_freq_sparsity_ndarray
-    cdef double[:] hamming_time = hamming_time_ndarray
-    
+    cdef cython.floating[:, :, :] X = X_ndarray
+
+    # Containers for the hamming windows (local sparsity). In fast mode, the time window is rectangular, so only the
+    # first and last columns of the windowed region change when it slides along time.
+    hamming_freq_sparsity_ndarray = _get_window("hamming", lsk)
+    hamming_time_ndarray = _get_window("ones" if fast_gini else "hamming", lsm)
+    cdef const double[:] hamming_freq_sparsity = hamming_freq_sparsity_ndarray
+    cdef const double[:] hamming_time = hamming_time_ndarray
     
-    # Container that stores a spectrogram windowed region flattened to a vector.
-    calc_vector_ndarray = np.zeros(combined_size_sparsity, dtype = np.double)
-    cdef double[:] calc_vector = calc_vector_ndarray 
+    # Sorted windowed regions of each spectrogram, flattened to vectors (see sliding_gini.pyx).
+    window_storage_ndarray = np.zeros((P, 4, combined_size_sparsity), dtype=np.double)
+    cdef double[:, :, ::1] window_storage = window_storage_ndarray
+    cdef _SortedWindow* windows
+    cdef Py_ssize_t window_m # Time frame of the windowed regions currently stored, used in fast mode.
 
     # Container that stores the result.
-    result_ndarray = np.zeros((K, M), dtype=np.double)
-    cdef double[:, :] result = result_ndarray
+    result_ndarray = np.zeros((K, M), dtype=dtype)
+    cdef cython.floating[:, :] result = result_ndarray
 
     # Containers and variables related to local sparsity calculation.
     sparsity_ndarray = np.zeros(P, dtype=np.double) # Note that only one bin of sparsity information is stored each time.
     cdef double[:] sparsity = sparsity_ndarray
-    cdef double arr_norm, gini
 
     # Container for the local energy.
-    energy_ndarray = np.zeros((P, K, M), dtype=np.double)
-    cdef double[:,:,:] energy = energy_ndarray
+    cdef cython.floating[:,:,:] energy
+    cdef cython.floating[:,:] max_local_energy
 
 
     # Variables related to the last step (spectrograms combination).
-    cdef double[:] log_sparsity
-    cdef double sum_log_sparsity
+    log_sparsity_ndarray = np.zeros(P, dtype=np.double)
+    cdef double[:] log_sparsity = log_sparsity_ndarray
+    cdef double max_log_sparsity
     combination_weight_ndarray = np.zeros(P, dtype=np.double)
     cdef double[:] combination_weight = combination_weight_ndarray
     cdef double min_local_energy
     cdef double weights_sum
 
-    # Variable related to energy criterium.
-    cdef double max_local_energy_db
-
     ############ Calculate local energy and maximum local energy along dimension p {{{ 
 
-    for p in range(P):
-        energy_ndarray[p] = np.clip(correlate(X_orig_ndarray[p], hamming_energy, mode="same")/np.sum(hamming_energy, axis=None), a_min=epsilon, a_max=None)
-
-    max_local_energy_ndarray = np.max(energy_ndarray, axis=0)
+    with _profile_stage("local_energy"):
+        energy_ndarray = _get_shared_intermediate(_shared, ("sls_local_energy", lek, lem), _sls_local_energy, X_orig_ndarray, lek, lem, epsilon)
+        max_local_energy_ndarray = np.max(energy_ndarray, axis=0)
 
     energy = energy_ndarray
     max_local_energy = max_local_energy_ndarray
@@ -103,60 +108,235 @@ cdef _sls_h_cy(double[:,:,::1] X_orig, Py_ssize_t lek, Py_ssize_t lsk, Py_ssize_
     # Energy criterium in regular units.
     cdef double energy_criterium = 10.0 ** (energy_criterium_db/10.0)
 
+    windows = <_SortedWindow*> malloc(P * sizeof(_SortedWindow))
+    if windows == NULL:
+        raise MemoryError()
+    for p in range(P):
+        _window_init(&windows[p], window_storage[p])
+
     ############ Hybrid combination {{{
 
-    # Iterates through bins.
-    for k in range(lsk_lobe, K + lsk_lobe):
-        for m in range(lsm_lobe, M + lsm_lobe):
-            red_k, red_m = k - lsk_lobe, m - lsm_lobe
-            
-            # If this energy is below threshold, use binwise minimax.
-            if max_local_energy[red_k, red_m] < energy_criterium:
-                result[red_k, red_m] = INFINITY
-                for p in range(P):
-                    if X[p, k, m] < result[red_k, red_m]:
-                        result[red_k, red_m] = X[p, k, m]
-
-            # Otherwise, calculate SLS combination.
-            else:
-                for p in range(P):
-                    # Copy the windowed region to the calculation vector, multiplying by the Hamming windows (horizontal and vertical).
-                    for i in range(lsk):
-                        for j in range(lsm):
-                            calc_vector[i*lsm + j] = X[p, k - lsk_lobe + i, m - lsm_lobe + j] * \
-                                    hamming_freq_sparsity[i] * hamming_time[j]        
-
-                    # Calculate the local sparsity (Gini index).
-                    calc_vector_ndarray.sort()
-                    arr_norm = 0.0
-                    gini = 0.0
-                    
-                    for i in range(combined_size_sparsity):
-                        arr_norm = arr_norm + calc_vector[i]
-                        gini = gini - 2*calc_vector[i] * (combined_size_sparsity - i - 0.5)/ (<double> combined_size_sparsity)
-                    gini = 1 + gini/(arr_norm + epsilon)
-
-                    sparsity[p] = epsilon + gini
-
-                # Combination by smoothed local sparsity:
-                log_sparsity_ndarray = np.log(sparsity_ndarray)
-                sum_log_sparsity = np.sum(log_sparsity_ndarray)
-
-                log_sparsity = log_sparsity_ndarray
-
-                min_local_energy = INFINITY
-                weights_sum = 0.0
-                for p in range(P):
-                    combination_weight[p] = exp( (2*log_sparsity[p] - sum_log_sparsity) * beta)
-                    weights_sum += combination_weight[p]
-                    if energy[p, red_k, red_m] < min_local_energy:
-                        min_local_energy = energy[p, red_k, red_m]
-
-                result[red_k, red_m] = 0.0
-                for p in range(P):
-                    result[red_k, red_m] = result[red_k, red_m] + X_orig[p, red_k, red_m] * combination_weight[p] * min_local_energy / energy[p, red_k, red_m]
-                result[red_k, red_m] = result[red_k, red_m] / weights_sum
+    # The local sparsity is computed for each bin along with its combination.
+    try:
+        with _profile_stage("hybrid_combination"):
+            with nogil:
+                # Iterates through bins.
+                for k in range(lsk_lobe, K + lsk_lobe):
+                    window_m = lsm_lobe - lsm
+                    for m in range(lsm_lobe, M + lsm_lobe):
+                        red_k, red_m = k - lsk_lobe, m - lsm_lobe
+                
+                        # If this energy is below threshold, use binwise minimax.
+                        if max_local_energy[red_k, red_m] < energy_criterium:
+                            result[red_k, red_m] = INFINITY
+                            for p in range(P):
+                                if X[p, k, m] < result[red_k, red_m]:
+                                    result[red_k, red_m] = X[p, k, m]
+
+                        # Otherwise, calculate SLS combination.
+                        else:
+                            shift = m - window_m
+                            for p in range(P):
+                                if fast_gini and shift < lsm:
+                                    # Slide the windowed region by shift time frames, replacing its first columns by new last columns.
+                                    for i in range(lsk):
+                                        for j in range(shift):
+                                            windows[p].exclusion[i*shift + j] = X[p, k - lsk_lobe + i, window_m - lsm_lobe + j] * hamming_freq_sparsity[i]
+                                            windows[p].inclusion[i*shift + j] = X[p, k - lsk_lobe + i, window_m + lsm_lobe + 1 + j] * hamming_freq_sparsity[i]
+                                    _window_slide(&windows[p], lsk * shift)
+                                else:
+                                    # Copy the windowed region to the calculation vector, multiplying by the Hamming windows (horizontal and vertical).
+                                    for i in range(lsk):
+                                        for j in range(lsm):
+                                            windows[p].values[i*lsm + j] = X[p, k - lsk_lobe + i, m - lsm_lobe + j] * \
+                                                    hamming_freq_sparsity[i] * hamming_time[j]
+                                    _window_sort(&windows[p])
+
+                                # Calculate the local sparsity (Gini index).
+                                sparsity[p] = epsilon + _window_gini(&windows[p], epsilon)
+                            window_m = m
+
+                            # Combination by smoothed local sparsity. The weights are scaled for the largest one to be 1, which avoids overflows.
+                            max_log_sparsity = -INFINITY
+                            for p in range(P):
+                                log_sparsity[p] = log(sparsity[p])
+                                if log_sparsity[p] > max_log_sparsity:
+                                    max_log_sparsity = log_sparsity[p]
+
+                            min_local_energy = INFINITY
+                            weights_sum = 0.0
+                            for p in range(P):
+                                combination_weight[p] = exp(2 * (log_sparsity[p] - max_log_sparsity) * beta)
+                                weights_sum += combination_weight[p]
+                                if energy[p, red_k, red_m] < min_local_energy:
+                                    min_local_energy = energy[p, red_k, red_m]
+
+                            result[red_k, red_m] = 0.0
+                            for p in range(P):
+                                result[red_k, red_m] = result[red_k, red_m] + X_orig[p, red_k, red_m] * combination_weight[p] * min_local_energy / energy[p, red_k, red_m]
+                            result[red_k, red_m] = result[red_k, red_m] / weights_sum
+    finally:
+        free(windows)
 
     ############ }}}
 
-    return result_ndarray
\ No newline at end of file
+    return result_ndarray
+
+cdef class _SlsHStreamState:
+    """Stream state of the SLS-H method (see ctfr.CTFRProcessor), which computes the local energy of the received frames with _StreamingLocalEnergy, so each frame is processed once.
+
+    In fast mode, the sorted windowed region of each bin of each spectrogram is kept between calls and slid along the received frames, as in _sls_h_cy, which takes P x K x 4 x lsk x lsm elements of memory. In exact mode, the windowed regions are sorted from scratch for every bin anyway.
+    """
+
+    cdef:
+        Py_ssize_t lek, lsk, lem, lsm
+        double beta, energy_criterium, epsilon
+        bint fast_gini
+        object _energy
+        object _window_storage
+        object _window_m
+        _SortedWindow* _windows
+        Py_ssize_t _num_windows
+        Py_ssize_t _num_frames
+
+    def __cinit__(self):
+        self._windows = NULL
+
+    def __init__(self, lek = 11, lsk = 21, lem = 11, lsm = 11, beta = 80, energy_criterium_db = -40, gini_mode = "exact"):
+        self.lek = _enforce_odd_positive_integer(lek, "lek", 11)
+        self.lsk = _enforce_odd_positive_integer(lsk, "lsk", 21)
+        self.lem = _enforce_odd_positive_integer(lem, "lem", 11)
+        self.lsm = _enforce_odd_positive_integer(lsm, "lsm", 11)
+        self.beta = _enforce_nonnegative(beta, "beta", 80.0)
+        self.energy_criterium = 10.0 ** (float(energy_criterium_db)/10.0)
+        self.fast_gini = _enforce_choice(gini_mode, "gini_mode", ("exact", "fast")) == "fast"
+        self.epsilon = 1e-10
+
+        self._energy = _StreamingLocalEnergy(_get_window("hamming_normalized", self.lek), _get_window("hamming_left_normalized", self.lem))
+        self._num_frames = 0 # Frames combined so far.
+
+    def __dealloc__(self):
+        free(self._windows)
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    @cython.nonecheck(False)
+    @cython.cdivision(True)
+    def combine(self, frames, Py_ssize_t start, Py_ssize_t stop):
+        """Returns the combination of the frames in [start, stop) of the (P, K, W) tensor frames, as a (K, stop - start) matrix."""
+        # The sorted windows remove values by exact comparison, which doesn't hold for NaN.
+        _enforce_finite_specs(frames[:, :, start:stop])
+
+        cdef:
+            const double[:, :, ::1] X = frames
+            Py_ssize_t P = X.shape[0] # Spectrograms axis
+            Py_ssize_t K = X.shape[1] # Frequency axis
+            Py_ssize_t lsk = self.lsk
+            Py_ssize_t lsm = self.lsm
+            Py_ssize_t lsk_lobe = (lsk-1)//2
+            Py_ssize_t lsm_lobe = (lsm-1)//2
+            # Index in the whole spectrograms of the first frame of frames.
+            Py_ssize_t offset = self._num_frames - start
+            Py_ssize_t p, k, m, b, i, j, row, window_column, shift
+            bint fast_gini = self.fast_gini, slide
+            double beta = self.beta, epsilon = self.epsilon, energy_criterium = self.energy_criterium
+            double value, max_log_sparsity, min_local_energy, weights_sum
+            _SortedWindow* window
+
+        energy_ndarray = np.maximum(self._energy.compute(frames, start, stop), epsilon)
+        cdef const double[:, :, ::1] energy = energy_ndarray
+        cdef const double[:, ::1] max_local_energy = np.max(energy_ndarray, axis=0)
+
+        hamming_freq_sparsity_ndarray = _get_window("hamming", lsk)
+        hamming_time_ndarray = _get_window("ones" if fast_gini else "hamming", lsm)
+        cdef const double[:] hamming_freq_sparsity = hamming_freq_sparsity_ndarray
+        cdef const double[:] hamming_time = hamming_time_ndarray
+
+        # One sorted window per bin of each spectrogram in fast mode, and per spectrogram in exact mode.
+        if self._windows == NULL:
+            self._num_windows = P * K if fast_gini else P
+            self._window_storage = np.zeros((self._num_windows, 4, lsk * lsm), dtype=np.double)
+            # Time frame (in the whole spectrograms) of the windowed regions stored for each frequency bin.
+            self._window_m = np.full(K, -lsm - 1, dtype=np.intp)
+            self._windows = <_SortedWindow*> malloc(self._num_windows * sizeof(_SortedWindow))
+            if self._windows == NULL:
+                raise MemoryError()
+            for i in range(self._num_windows):
+                _window_init(&self._windows[i], self._window_storage[i])
+        cdef Py_ssize_t[::1] window_m = self._window_m
+
+        sparsity_ndarray = np.zeros(P, dtype=np.double)
+        log_sparsity_ndarray = np.zeros(P, dtype=np.double)
+        combination_weight_ndarray = np.zeros(P, dtype=np.double)
+        cdef double[::1] sparsity = sparsity_ndarray
+        cdef double[::1] log_sparsity = log_sparsity_ndarray
+        cdef double[::1] combination_weight = combination_weight_ndarray
+
+        result_ndarray = np.zeros((K, stop - start), dtype=np.double)
+        cdef double[:, ::1] result = result_ndarray
+
+        with nogil:
+            for b in range(stop - start):
+                m = start + b
+                for k in range(K):
+
+                    # If this energy is below threshold, use binwise minimax.
+                    if max_local_energy[k, b] < energy_criterium:
+                        result[k, b] = INFINITY
+                        for p in range(P):
+                            if X[p, k, m] < result[k, b]:
+                                result[k, b] = X[p, k, m]
+                        continue
+
+                    # Otherwise, calculate SLS combination. The stored windowed regions slide if the frames leaving them
+                    # are still in frames.
+                    window_column = window_m[k] - offset
+                    shift = m - window_column
+                    slide = fast_gini and shift < lsm and window_column - lsm_lobe >= 0
+                    for p in range(P):
+                        window = &self._windows[p * K + k] if fast_gini else &self._windows[p]
+                        if slide:
+                            for i in range(lsk):
+                                row = k - lsk_lobe + i
+                                for j in range(shift):
+                                    if 0 <= row < K:
+                                        window.exclusion[i*shift + j] = X[p, row, window_column - lsm_lobe + j] * hamming_freq_sparsity[i]
+                                        window.inclusion[i*shift + j] = X[p, row, window_column + lsm_lobe + 1 + j] * hamming_freq_sparsity[i]
+                                    else:
+                                        window.exclusion[i*shift + j] = 0.0
+                                        window.inclusion[i*shift + j] = 0.0
+                            _window_slide(window, lsk * shift)
+                        else:
+                            for i in range(lsk):
+                                row = k - lsk_lobe + i
+                                for j in range(lsm):
+                                    if 0 <= row < K:
+                                        window.values[i*lsm + j] = X[p, row, m - lsm_lobe + j] * hamming_freq_sparsity[i] * hamming_time[j]
+                                    else:
+                                        window.values[i*lsm + j] = 0.0
+                            _window_sort(window)
+                        sparsity[p] = epsilon + _window_gini(window, epsilon)
+                    window_m[k] = offset + m
+
+                    # Combination by smoothed local sparsity, as in _sls_h_cy.
+                    max_log_sparsity = -INFINITY
+                    for p in range(P):
+                        log_sparsity[p] = log(sparsity[p])
+                        if log_sparsity[p] > max_log_sparsity:
+                            max_log_sparsity = log_sparsity[p]
+
+                    min_local_energy = INFINITY
+                    weights_sum = 0.0
+                    for p in range(P):
+                        combination_weight[p] = exp(2 * (log_sparsity[p] - max_log_sparsity) * beta)
+                        weights_sum += combination_weight[p]
+                        if energy[p, k, b] < min_local_energy:
+                            min_local_energy = energy[p, k, b]
+
+                    value = 0.0
+                    for p in range(P):
+                        value = value + X[p, k, m] * combination_weight[p] * min_local_energy / energy[p, k, b]
+                    result[k, b] = value / weights_sum
+
+        self._num_frames += stop - start
+        return result_ndarray
@@ -1,10 +1,13 @@
 import numpy as np
-from scipy.signal import correlate
 from itertools import chain
 cimport cython
-from libc.math cimport exp
-from ctfr.utils.arguments_check import _enforce_nonnegative, _enforce_odd_positive_integer
+from libc.math cimport INFINITY, exp
+from ctfr.utils.arguments_check import _enforce_nonnegative, _enforce_odd_positive_integer, _enforce_choice, _enforce_finite_specs
 from ctfr.exception import ArgumentRequiredError
+from ctfr.utils.profiling import _profile_stage
+from .shared import _get_shared_intermediate, _get_window
+from .local_energy import _sls_local_energy
+from .sliding_gini cimport _SortedWindow, _window_init, _window_sort, _window_slide, _window_gini
 
 def _sls_i_wrapper(
         X, 
@@ -14,7 +17,12 @@ def _sls_i_wrapper(
         lsm = 11, 
         beta = 80,
         interp_steps = None,
-        _info = None
+        gini_mode = "exact",
+        adaptive = False,
+        energy_criterium_db = -40,
+        sparsity_tolerance = 0.2,
+        _info = None,
+        _shared = None
 ):
 
     lek = _enforce_odd_positive_integer(lek, "lek", 11)
@@ -22,12 +30,25 @@ def _sls_i_wrapper(
     lem = _enforce_odd_positive_integer(lem, "lem", 11)
     lsm = _enforce_odd_positive_integer(lsm, "lsm", 11)
     beta = _enforce_nonnegative(beta, "beta", 80.0)
+    fast_gini = _enforce_choice(gini_mode, "gini_mode", ("exact", "fast")) == "fast"
+    adaptive = bool(adaptive)
+    energy_criterium_db = float(energy_criterium_db)
+    sparsity_tolerance = _enforce_nonnegative(sparsity_tolerance, "sparsity_tolerance", 0.2)
 
-    interp_steps = _get_interp_steps(X.shape[0], _info, interp_steps)
+    interp_steps = _get_interp_steps(X.shape[0], _info, interp_steps, adaptive)
+    # The sorted windows remove values by exact comparison, which doesn't hold for NaN.
+    _enforce_finite_specs(X)
 
-    return _sls_i_cy(X, lek, lsk, lem, lsm, beta, interp_steps)
+    if X.dtype == np.float32:
+        return _sls_i_cy[float](X, lek, lsk, lem, lsm, beta, interp_steps, fast_gini, adaptive, energy_criterium_db, sparsity_tolerance, _shared)
+    return _sls_i_cy[double](X, lek, lsk, lem, lsm, beta, interp_steps, fast_gini, adaptive, energy_criterium_db, sparsity_tolerance, _shared)
 
-def _get_interp_steps(num_specs, _info, user_interp_steps):
+# Factor by which the default interpolation steps are multiplied in adaptive mode. The refinement computes the local
+# sparsity in every bin of the cells where it's needed, so the grid only has to be fine enough for the low-energy,
+# smooth regions.
+_ADAPTIVE_STEPS_FACTOR = 4
+
+def _get_interp_steps(num_specs, _info, user_interp_steps, adaptive=False):
 
     if user_interp_steps is not None:
         interp_steps = np.ascontiguousarray(user_interp_steps, dtype=np.long)
@@ -40,163 +61,298 @@ def _get_interp_steps(num_specs, _info, user_interp_steps):
     if _info is not None:
         if _info["representation_type"] == "stft":
             n_fft, hop_length = _info["n_fft"], _info["hop_length"]
-            return np.clip(
+            interp_steps = np.clip(
                 np.array(
                     [[n_fft//l, l//(2*hop_length)] for l in _info["win_lengths"]], 
                     dtype=np.long
                 ), 
             a_min=1, a_max=None)
         else: # "cqt"
-            # This might change in the future.
-            raise ArgumentRequiredError("When performing SLS-I with CQT spectrograms, specifying 'interp_steps' is required. Note that SLS-I is not recommended for combining CQT spectrograms and you should probably use another combination method.")
-            
+            # The bandwidth of a CQT filter spans about 1 / filter_scale frequency bins. The time support of the filters
+            # depends on their frequency, and is the shortest for the highest frequency bins, so no time step is used.
+            interp_steps = np.array(
+                [[max(1, round(1 / filter_scale)), 1] for filter_scale in _info["filter_scales"]],
+                dtype=np.long
+            )
+        return interp_steps * _ADAPTIVE_STEPS_FACTOR if adaptive else interp_steps
+
     raise ArgumentRequiredError("When calling SLS-I directly from spectrograms, specifying 'interp_steps' is required.")
 
 @cython.boundscheck(False)
 @cython.wraparound(False) 
 @cython.nonecheck(False)
 @cython.cdivision(True)
-cdef _sls_i_cy(double[:,:,::1] X_orig, Py_ssize_t lek, Py_ssize_t lsk, Py_ssize_t lem, Py_ssize_t lsm, double beta, long[:,::1] interp_steps):
+cdef _sls_i_cy(const cython.floating[:,:,::1] X_orig, Py_ssize_t lek, Py_ssize_t lsk, Py_ssize_t lem, Py_ssize_t lsm, double beta, long[:,::1] interp_steps, bint fast_gini, bint adaptive, double energy_criterium_db, double sparsity_tolerance, _shared):
 
     cdef:
         Py_ssize_t P = X_orig.shape[0] # Spectrograms axis
         Py_ssize_t K = X_orig.shape[1] # Frequency axis
         Py_ssize_t M = X_orig.shape[2] # Time axis
-        
-        Py_ssize_t lek_lobe = (lek-1)//2
-        Py_ssize_t lsk_lobe = (lsk-1)//2
-        Py_ssize_t lsm_lobe = (lsm-1)//2
-        Py_ssize_t lem_lobe = (lem-1)//2
-        Py_ssize_t p, m, k, i, j, red_k, red_m
+        Py_ssize_t p, m, k
 
         double epsilon = 1e-10
-        Py_ssize_t combined_size_sparsity = lsm * lsk
-    
-    X_orig_ndarray = np.asarray(X_orig)
-    # Zero-pad spectrograms for windowing.
-    X_ndarray = np.pad(X_orig, ((0, 0), (lsk_lobe, lsk_lobe), (lsm_lobe, lsm_lobe)))
-    cdef double[:, :, :] X = X_ndarray
-
-    # Containers for the hamming window (local sparsity) and the asymmetric hamming window (local energy)
-    hamming_freq_energy_ndarray = np.hamming(lek)
-    hamming_freq_sparsity_ndarray = np.hamming(lsk)
-    hamming_time_ndarray = np.hamming(lsm)
-    hamming_asym_time_ndarray = np.hamming(lem)
-    hamming_asym_time_ndarray[lem_lobe+1:] = 0
-
-    hamming_energy = np.outer(hamming_freq_energy_ndarray, hamming_asym_time_ndarray)
-    cdef double[:] hamming_freq_sparsity = hamming_freq_sparsity_ndarray
-    cdef double[:] hamming_time = hamming_time_ndarray
-    
-    
-    # Container that stores a spectrogram windowed region flattened to a vector.
-    calc_vector_ndarray = np.zeros(combined_size_sparsity, dtype = np.double)
-    cdef double[:] calc_vector = calc_vector_ndarray 
-
-    # Container that stores the result.
-    result_ndarray = np.zeros((K, M), dtype=np.double)
+        double max_log_sparsity, min_energy, weight, weights_sum, result_acc
 
-    # Containers and variables related to local sparsity calculation.
-    sparsity_ndarray = np.zeros((P, K, M), dtype=np.double)
-    cdef double[:,:,:] sparsity = sparsity_ndarray
-    cdef double arr_norm, gini
-
-    # Container for the local energy.
-    energy_ndarray = np.zeros((P, K, M), dtype=np.double)
-    cdef double[:,:,:] energy = energy_ndarray
-
-    # Stores the interpolation steps in each direction. i_steps[i, j] ->  step for p = i. j = 0: in frequency; j = 1: in time
-    cdef long[:,:] i_steps = interp_steps
+    X_orig_ndarray = np.asarray(X_orig)
+    dtype = X_orig_ndarray.dtype
 
     # Variables related to the last step (spectrograms combination).
-    cdef double[:, :, :] log_sparsity
-    cdef double[:, :] sum_log_sparsity
-    combination_weight_ndarray = np.zeros((P, K, M), dtype=np.double)
-    cdef double[:, :, :] combination_weight = combination_weight_ndarray
+    cdef cython.floating[:, :, ::1] log_sparsity
+    cdef cython.floating[:, :, ::1] energy
+    result_ndarray = np.empty((K, M), dtype=dtype)
+    cdef cython.floating[:, ::1] result = result_ndarray
 
     ############ Calculate local energy {{{ 
 
-    for p in range(P):
-        energy_ndarray[p] = np.clip(correlate(X_orig_ndarray[p], hamming_energy, mode="same")/np.sum(hamming_energy, axis=None), a_min=epsilon, a_max=None)
-
-    energy = energy_ndarray
+    with _profile_stage("local_energy"):
+        energy_ndarray = _get_shared_intermediate(_shared, ("sls_local_energy", lek, lem), _sls_local_energy, X_orig_ndarray, lek, lem, epsilon)
 
     ############ }}}
 
     ############ Compute local sparsity {{{
 
-    for p in range(P):
-    
-        # Iterates through the segments, taking into account the interpolation steps.
-        for red_k in chain(
-                range(0, K, i_steps[p, 0]),
-                range( (K - 1) // i_steps[p, 0] * i_steps[p, 0] + 1, K)
-        ):
-            for red_m in chain(
-                    range(0, M, i_steps[p, 1]),
-                    range( (M - 1) // i_steps[p, 1] * i_steps[p, 1] + 1, M)
-            ):      
-                k, m = red_k + lsk_lobe, red_m + lsm_lobe
-
-                # Copy the windowed region to the calculation vector, multiplying by the Hamming windows (horizontal and vertical).
-                for i in range(lsk):
-                    for j in range(lsm):
-                        calc_vector[i*lsm + j] = X[p, k - lsk_lobe + i, m - lsm_lobe + j] * \
-                                hamming_freq_sparsity[i] * hamming_time[j]        
-                
-                # Calculate the local sparsity (Gini index)
-                calc_vector_ndarray.sort()
-                arr_norm = 0.0
-                gini = 0.0
-                
-                for i in range(combined_size_sparsity):
-                    arr_norm = arr_norm + calc_vector[i]
-                    gini = gini - 2*calc_vector[i] * (combined_size_sparsity - i - 0.5)/ (<double> combined_size_sparsity)
-                gini = 1 + gini/(arr_norm + epsilon)
-                sparsity[p, red_k, red_m] = epsilon + gini
-
-        # First interpolation (along k axis).
-        red_k = i_steps[p, 0]
-        while red_k < K: # Loop equivalent to "for red_k in range(i_steps[p, 0], K, i_steps[p, 0])". The current variant produces a faster code in Cython.
-            for red_m in chain(
-                    range(0, M, i_steps[p, 1]),
-                    range( (M - 1) // i_steps[p, 1] * i_steps[p, 1] + 1, M)
-            ):
-                sparsity_step = (sparsity[p, red_k, red_m] - sparsity[p, red_k - i_steps[p, 0], red_m]) / i_steps[p, 0]
-                for i in range(1, i_steps[p, 0]):
-                    sparsity[p, red_k - i, red_m] = sparsity[p, red_k - i + 1, red_m] - sparsity_step
-            
-            red_k = red_k + i_steps[p, 0]
-
-        # Second interpolation (along m axis).
-        red_m = i_steps[p, 1]
-        while red_m < M: # Loop equivalent to "for red_m in range(i_steps[p, 1], M, i_steps[p, 1])". The current variant produces a faster code in Cython.
-            for red_k in range(K):
-                sparsity_step = (sparsity[p, red_k, red_m] - sparsity[p, red_k, red_m - i_steps[p, 1]]) / i_steps[p, 1]
-                for j in range(1, i_steps[p, 1]):
-                    sparsity[p, red_k, red_m - j] = sparsity[p, red_k, red_m - j + 1] - sparsity_step  
-
-            red_m = red_m + i_steps[p, 1]
-
+    # In adaptive mode, the local sparsity is also computed in the interpolation grid cells that contain bins where the
+    # local energy reaches the energy criterium, so it depends on the local energy parameters too.
+    if adaptive:
+        high_energy_ndarray = (energy_ndarray >= 10.0 ** (energy_criterium_db / 10.0)).view(np.uint8)
+        adaptive_key = (lek, lem, energy_criterium_db, sparsity_tolerance)
+    else:
+        high_energy_ndarray = None
+        adaptive_key = None
+
+    with _profile_stage("local_sparsity") as stage:
+        log_sparsity_ndarray = _get_shared_intermediate(
+            _shared, ("sls_i_log_sparsity", lsk, lsm, tuple(map(tuple, np.asarray(interp_steps).tolist())), fast_gini, adaptive_key),
+            _sls_i_log_sparsity, X_orig_ndarray, lsk, lsm, np.asarray(interp_steps), fast_gini, epsilon, high_energy_ndarray, sparsity_tolerance, stage
+        )
 
     ############ }}}
 
     ############ Smoothed local sparsity combination {{
      
+    log_sparsity = log_sparsity_ndarray
+    energy = energy_ndarray
 
-    log_sparsity_ndarray = np.log(sparsity_ndarray)
-    sum_log_sparsity_ndarray = np.sum(log_sparsity_ndarray, axis=0)
+    with _profile_stage("combination"):
+        with nogil:
+            for k in range(K):
+                for m in range(M):
+                    # The weights are scaled for the largest weight in each bin to be 1, which avoids overflows.
+                    max_log_sparsity = log_sparsity[0, k, m]
+                    min_energy = energy[0, k, m]
+                    for p in range(1, P):
+                        if log_sparsity[p, k, m] > max_log_sparsity:
+                            max_log_sparsity = log_sparsity[p, k, m]
+                        if energy[p, k, m] < min_energy:
+                            min_energy = energy[p, k, m]
+
+                    weights_sum = 0.0
+                    result_acc = 0.0
+                    for p in range(P):
+                        weight = exp(2 * (log_sparsity[p, k, m] - max_log_sparsity) * beta)
+                        weights_sum = weights_sum + weight
+                        result_acc = result_acc + weight * X_orig[p, k, m] * min_energy / energy[p, k, m]
+                    result[k, m] = result_acc / weights_sum
 
-    log_sparsity = log_sparsity_ndarray
-    sum_log_sparsity = sum_log_sparsity_ndarray
+    ############ }} Smoothed local sparsity combination
 
-    for p in range(P):
-        for k in range(K): 
-            for m in range(M):
-                combination_weight[p, k, m] = exp( (2*log_sparsity[p, k, m] - sum_log_sparsity[k, m]) * beta)
+    return result_ndarray
+
+@cython.boundscheck(False)
+@cython.wraparound(False) 
+@cython.nonecheck(False)
+@cython.cdivision(True)
+def _sls_i_log_sparsity(
+    const cython.floating[:,:,::1] X_orig,
+    Py_ssize_t lsk,
+    Py_ssize_t lsm,
+    long[:,::1] interp_steps,
+    bint fast_gini,
+    double epsilon,
+    const unsigned char[:,:,::1] high_energy = None,
+    double sparsity_tolerance = INFINITY,
+    stage = None
+):
+    """Computes the logarithm of the local sparsity (Gini index) of each spectrogram, interpolated between the bins given by the interpolation steps.
 
-    result_ndarray = np.average(X_orig_ndarray * np.min(energy_ndarray, axis=0)/energy_ndarray, axis=0, weights=combination_weight_ndarray)
+    If the high_energy mask (with the shape of X_orig) is provided, the interpolation is adaptive: the local sparsity is also computed in every bin of a cell of the interpolation grid that contains a bin of the mask, or whose corners have local sparsities differing by more than sparsity_tolerance. If a profiling stage is provided, the fraction of bins where the local sparsity was computed is added to its information as evaluated_fraction.
+    """
 
-    ############ }} Smoothed local sparsity combination
+    cdef:
+        Py_ssize_t P = X_orig.shape[0] # Spectrograms axis
+        Py_ssize_t K = X_orig.shape[1] # Frequency axis
+        Py_ssize_t M = X_orig.shape[2] # Time axis
+        
+        Py_ssize_t lsk_lobe = (lsk-1)//2
+        Py_ssize_t lsm_lobe = (lsm-1)//2
+        Py_ssize_t p, i, j, red_k, red_m, a, b, k_start, k_end, m_start, m_end
+        Py_ssize_t num_evaluated = 0
 
-    return result_ndarray
\ No newline at end of file
+        Py_ssize_t combined_size_sparsity = lsm * lsk
+        double sparsity_step, min_corner, max_corner
+        bint adaptive = high_energy is not None
+        bint refine
+
+    dtype = np.asarray(X_orig).dtype
+    # Zero-pad spectrograms for windowing.
+    X_ndarray = np.pad(X_orig, ((0, 0), (lsk_lobe, lsk_lobe), (lsm_lobe, lsm_lobe)))
+    cdef const cython.floating[:, :, ::1] X = X_ndarray
+
+    # Containers for the hamming windows (local sparsity). In fast mode, the time window is rectangular, so only the
+    # first and last columns of the windowed region change when it slides along time.
+    hamming_freq_sparsity_ndarray = _get_window("hamming", lsk)
+    hamming_time_ndarray = _get_window("ones" if fast_gini else "hamming", lsm)
+    cdef const double[:] hamming_freq_sparsity = hamming_freq_sparsity_ndarray
+    cdef const double[:] hamming_time = hamming_time_ndarray
+    
+    # Sorted windowed region of a spectrogram, flattened to a vector (see sliding_gini.pyx).
+    window_storage_ndarray = np.zeros((4, combined_size_sparsity), dtype=np.double)
+    cdef _SortedWindow window
+    _window_init(&window, window_storage_ndarray)
+    cdef Py_ssize_t window_k = -1, window_m = -1 # Bin of the windowed region currently stored (-1 if none), used in fast mode.
+
+    # Containers and variables related to local sparsity calculation.
+    sparsity_ndarray = np.zeros((P, K, M), dtype=dtype)
+    cdef cython.floating[:,:,:] sparsity = sparsity_ndarray
+
+    # Marks the bins where the local sparsity was computed, used in adaptive mode.
+    computed_ndarray = np.zeros((K, M), dtype=np.uint8)
+    cdef unsigned char[:, ::1] computed = computed_ndarray
+
+    # Stores the interpolation steps in each direction. i_steps[i, j] ->  step for p = i. j = 0: in frequency; j = 1: in time
+    cdef long[:,:] i_steps = interp_steps
+
+    # Indices of the bins where the local sparsity is computed, taking into account the interpolation steps.
+    cdef Py_ssize_t[::1] k_indices, m_indices
+
+    for p in range(P):
+        k_indices = _get_step_indices(K, i_steps[p, 0])
+        m_indices = _get_step_indices(M, i_steps[p, 1])
+
+        with nogil:
+            window_k = window_m = -1
+            for a in range(k_indices.shape[0]):
+                red_k = k_indices[a]
+                for b in range(m_indices.shape[0]):
+                    red_m = m_indices[b]
+                    sparsity[p, red_k, red_m] = _local_sparsity(&window, X, hamming_freq_sparsity, hamming_time, p, red_k, red_m, fast_gini, &window_k, &window_m, epsilon)
+
+            # First interpolation (along k axis).
+            red_k = i_steps[p, 0]
+            while red_k < K: # Loop equivalent to "for red_k in range(i_steps[p, 0], K, i_steps[p, 0])". The current variant produces a faster code in Cython.
+                for b in range(m_indices.shape[0]):
+                    red_m = m_indices[b]
+                    sparsity_step = (sparsity[p, red_k, red_m] - sparsity[p, red_k - i_steps[p, 0], red_m]) / i_steps[p, 0]
+                    for i in range(1, i_steps[p, 0]):
+                        sparsity[p, red_k - i, red_m] = sparsity[p, red_k - i + 1, red_m] - sparsity_step
+                
+                red_k = red_k + i_steps[p, 0]
+
+            # Second interpolation (along m axis).
+            red_m = i_steps[p, 1]
+            while red_m < M: # Loop equivalent to "for red_m in range(i_steps[p, 1], M, i_steps[p, 1])". The current variant produces a faster code in Cython.
+                for red_k in range(K):
+                    sparsity_step = (sparsity[p, red_k, red_m] - sparsity[p, red_k, red_m - i_steps[p, 1]]) / i_steps[p, 1]
+                    for j in range(1, i_steps[p, 1]):
+                        sparsity[p, red_k, red_m - j] = sparsity[p, red_k, red_m - j + 1] - sparsity_step  
+
+                red_m = red_m + i_steps[p, 1]
+
+            if not adaptive:
+                num_evaluated += k_indices.shape[0] * m_indices.shape[0]
+                continue
+
+            # Adaptive refinement: computes the local sparsity in every bin of the grid cells with high local energy or
+            # with disagreeing corners, replacing the interpolated values. The decisions only depend on the grid bins
+            # and on the mask, so they don't depend on the order of the cells.
+            computed[:, :] = 0
+            for a in range(k_indices.shape[0]):
+                for b in range(m_indices.shape[0]):
+                    computed[k_indices[a], m_indices[b]] = 1
+
+            for a in range(k_indices.shape[0] - 1):
+                k_start, k_end = k_indices[a], k_indices[a + 1]
+                for b in range(m_indices.shape[0] - 1):
+                    m_start, m_end = m_indices[b], m_indices[b + 1]
+                    if k_end - k_start == 1 and m_end - m_start == 1:
+                        continue # No interpolated bins in the cell.
+
+                    min_corner = min(sparsity[p, k_start, m_start], sparsity[p, k_start, m_end], sparsity[p, k_end, m_start], sparsity[p, k_end, m_end])
+                    max_corner = max(sparsity[p, k_start, m_start], sparsity[p, k_start, m_end], sparsity[p, k_end, m_start], sparsity[p, k_end, m_end])
+                    refine = max_corner - min_corner > sparsity_tolerance
+
+                    red_k = k_start
+                    while not refine and red_k <= k_end:
+                        for red_m in range(m_start, m_end + 1):
+                            if high_energy[p, red_k, red_m]:
+                                refine = True
+                                break
+                        red_k = red_k + 1
+
+                    if not refine:
+                        continue
+                    for red_k in range(k_start, k_end + 1):
+                        for red_m in range(m_start, m_end + 1):
+                            if not computed[red_k, red_m]:
+                                sparsity[p, red_k, red_m] = _local_sparsity(&window, X, hamming_freq_sparsity, hamming_time, p, red_k, red_m, fast_gini, &window_k, &window_m, epsilon)
+                                computed[red_k, red_m] = 1
+
+        if adaptive:
+            num_evaluated += np.count_nonzero(computed_ndarray)
+
+    if stage is not None:
+        stage.add_info(evaluated_fraction=<double> num_evaluated / (P * K * M))
+    return np.log(sparsity_ndarray)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+cdef inline double _local_sparsity(
+    _SortedWindow* window,
+    const cython.floating[:, :, ::1] X,
+    const double[:] hamming_freq,
+    const double[:] hamming_time,
+    Py_ssize_t p,
+    Py_ssize_t red_k,
+    Py_ssize_t red_m,
+    bint fast_gini,
+    Py_ssize_t* window_k,
+    Py_ssize_t* window_m,
+    double epsilon
+) noexcept nogil:
+    """Computes the local sparsity (Gini index) of spectrogram p around the bin (red_k, red_m), where X is the zero-padded spectrograms tensor. window_k and window_m hold the bin of the windowed region stored in window, which in fast mode is slid along time instead of refilled when possible."""
+    cdef:
+        Py_ssize_t lsk = hamming_freq.shape[0]
+        Py_ssize_t lsm = hamming_time.shape[0]
+        Py_ssize_t lsm_lobe = (lsm - 1)//2
+        Py_ssize_t shift = 0
+        Py_ssize_t i, j
+
+    # The stored windowed region is only valid if it's in the same frequency bin.
+    if fast_gini and window_k[0] >= 0 and red_k == window_k[0]:
+        shift = red_m - window_m[0]
+    if 0 < shift < lsm:
+        # Slide the windowed region by shift time frames, replacing its first columns by new last columns.
+        for i in range(lsk):
+            for j in range(shift):
+                window.exclusion[i*shift + j] = X[p, red_k + i, window_m[0] + j] * hamming_freq[i]
+                window.inclusion[i*shift + j] = X[p, red_k + i, window_m[0] + lsm + j] * hamming_freq[i]
+        _window_slide(window, lsk * shift)
+    else:
+        # Copy the windowed region to the calculation vector, multiplying by the Hamming windows (horizontal and vertical).
+        for i in range(lsk):
+            for j in range(lsm):
+                window.values[i*lsm + j] = X[p, red_k + i, red_m + j] * hamming_freq[i] * hamming_time[j]
+        _window_sort(window)
+
+    window_k[0] = red_k
+    window_m[0] = red_m
+    return epsilon + _window_gini(window, epsilon)
+
+def _get_step_indices(length, step):
+    """Returns the indices of an axis where the local sparsity is computed for an interpolation step: every step-th index, and the indices after the last one of them."""
+    return np.fromiter(
+        chain(range(0, length, step), range((length - 1) // step * step + 1, length)),
+        dtype=np.intp
+    )
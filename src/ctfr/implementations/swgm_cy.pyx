@@ -1,49 +1,81 @@
 import numpy as np
-from scipy.stats import gmean
 cimport cython
-from libc.math cimport exp
-from ctfr.utils.arguments_check import _enforce_nonnegative, _enforce_greater_or_equal
+from cython.parallel cimport prange, threadid
+from libc.math cimport exp, log
+from ctfr.utils.arguments_check import _enforce_nonnegative, _enforce_greater_or_equal, _enforce_n_jobs
+from ctfr.utils.profiling import _profile_stage
+from .shared import _empty_thread_rows
 
-def _swgm_wrapper(X, beta = 0.3, max_gamma = 20.0):
+def _swgm_wrapper(X, beta = 0.3, max_gamma = 20.0, n_jobs = 1):
 
     beta = _enforce_nonnegative(beta, "beta", default=0.3)
     max_gamma = _enforce_greater_or_equal(max_gamma, "max_gamma", target=1.0, default=20.0)
+    n_jobs = _enforce_n_jobs(n_jobs, "n_jobs", 1)
 
-    return _swgm_cy(X, beta, max_gamma)
+    if X.dtype == np.float32:
+        return _swgm_cy[float](X, beta, max_gamma, n_jobs)
+    return _swgm_cy[double](X, beta, max_gamma, n_jobs)
 
 @cython.boundscheck(False)
 @cython.wraparound(False) 
 @cython.nonecheck(False)
 @cython.cdivision(True)
-cdef _swgm_cy(double[:,:,::1] X, double beta, double max_gamma):
+cdef _swgm_cy(const cython.floating[:,:,::1] X, double beta, double max_gamma, Py_ssize_t n_jobs):
     cdef:
         Py_ssize_t P = X.shape[0] # Spectrograms axis.
         Py_ssize_t K = X.shape[1] # Frequency axis.
         Py_ssize_t M = X.shape[2] # Time axis.
 
-        Py_ssize_t p, k, m
+        Py_ssize_t p, k, m, thread
         double epsilon = 1e-15
 
-    # Calculate spectrograms logarithm tensor.
-    log_X_ndarray = np.log(np.asarray(X) + epsilon, dtype=np.double)
-    cdef double[:, :, :] log_X = log_X_ndarray
-    
-    # Calculate spectrograms logarithm tensor sum along first dimension.
-    sum_log_X_ndarray = np.sum(log_X_ndarray, axis=0) / (P - 1)
-    cdef double[:, :] sum_log_X = sum_log_X_ndarray
-
-    # Calculate weights tensor.
-    gammas_ndarray = np.zeros((P, K, M), dtype=np.double)
-    cdef double[:,:,:] gammas = gammas_ndarray
-    
-    # Calculate combination weights.
-    for k in range(K):
-        for m in range(M):
-            for p in range(P):
-                gammas[p, k, m] = sum_log_X[k, m] - log_X[p, k, m] * P / (P - 1)
-                gammas[p, k, m] = exp(gammas[p, k, m] * beta)
-                if gammas[p, k, m] > max_gamma:
-                    gammas[p, k, m] = max_gamma
-
-    # Calculate combined spectrogram as a binwise weighted geometric mean.
-    return gmean(X, axis=0, weights=gammas_ndarray)
\ No newline at end of file
+        double sum_log_X, gamma, gammas_sum, weighted_log_sum, value, log_value
+        # Above this value, log(x + epsilon) is computed as log(x) + epsilon / x, whose error ((epsilon / x)^2 / 2) is
+        # below the rounding error of the logarithm.
+        double log_threshold = epsilon * 1e8
+
+    X_ndarray = np.asarray(X)
+    dtype = X_ndarray.dtype
+
+    # Container that stores the result.
+    result_ndarray = np.zeros((K, M), dtype=dtype)
+    cdef cython.floating[:, ::1] result = result_ndarray
+
+    # The logarithms of the spectrograms are computed bin by bin and kept in a buffer for each thread, so no intermediate
+    # tensor is allocated: log(X) in the first P elements of a row, used for the combination, and log(X + epsilon) in
+    # the next P elements, used for the weights. For values above log_threshold, log(X + epsilon) is approximated from
+    # log(X) to first order, so only one logarithm is computed; smaller values take a second logarithm. The rows are
+    # aligned to cache lines, so threads don't write to the same line.
+    log_X_buffer_ndarray = _empty_thread_rows(n_jobs, 2 * P)
+    cdef double[:, ::1] log_X_buffer = log_X_buffer_ndarray
+
+    with _profile_stage("combination"):
+        for k in prange(K, nogil=True, schedule="static", num_threads=n_jobs):
+            thread = threadid()
+            for m in range(M):
+                # Calculate spectrograms logarithm sum along first dimension.
+                sum_log_X = 0.0
+                for p in range(P):
+                    value = X[p, k, m]
+                    log_value = log(value)
+                    log_X_buffer[thread, p] = log_value
+                    if value > log_threshold:
+                        log_value = log_value + epsilon / value
+                    else:
+                        log_value = log(value + epsilon)
+                    log_X_buffer[thread, P + p] = log_value
+                    sum_log_X = sum_log_X + log_value
+                sum_log_X = sum_log_X / (P - 1)
+
+                # Calculate combination weights and the combined bin as a weighted geometric mean.
+                gammas_sum = 0.0
+                weighted_log_sum = 0.0
+                for p in range(P):
+                    gamma = exp((sum_log_X - log_X_buffer[thread, P + p] * P / (P - 1)) * beta)
+                    if gamma > max_gamma:
+                        gamma = max_gamma
+                    gammas_sum = gammas_sum + gamma
+                    weighted_log_sum = weighted_log_sum + gamma * log_X_buffer[thread, p]
+                result[k, m] = exp(weighted_log_sum / gammas_sum)
+
+    return result_ndarray
@@ -1 +1,60 @@
-# This module is populated by ctfr/__init__.py
\ No newline at end of file
+"""Aliases of :func:`ctfr.ctfr` and :func:`ctfr.ctfr_from_specs` for each installed combination method, such as ``ctfr.methods.swgm`` and ``ctfr.methods.swgm_from_specs``.
+
+The aliases are built on first access, so the combination methods are only loaded when used.
+"""
+
+from warnings import warn as _warn
+from ctfr.warning import FunctionNotBuiltWarning as _FunctionNotBuiltWarning
+
+_FROM_SPECS_SUFFIX = "_from_specs"
+
+def __getattr__(name):
+    if _is_method(name):
+        function = _from_audio_function(name)
+    elif name.endswith(_FROM_SPECS_SUFFIX) and _is_method(name[:-len(_FROM_SPECS_SUFFIX)]):
+        function = _from_specs_function(name[:-len(_FROM_SPECS_SUFFIX)])
+    else:
+        raise AttributeError(f"module 'ctfr.methods' has no attribute '{name}'")
+    if not _validate_function_name(name):
+        _warn(f"Function name already exists in module ctfr.methods and thus was not built: {name}.", _FunctionNotBuiltWarning)
+    globals()[name] = function
+    return function
+
+def __dir__():
+    from ctfr.utils.private import _get_methods_dict
+    methods_dict = _get_methods_dict()
+    return sorted(set(globals()) | set(methods_dict) | {key + _FROM_SPECS_SUFFIX for key in methods_dict})
+
+def _is_method(key):
+    """Checks whether a key is a registered method, discovering the methods advertised through entry points if needed."""
+    from ctfr.exception import InvalidCombinationMethodError
+    from ctfr.utils.private import _get_method_entry
+    if key.startswith("_"):
+        return False
+    try:
+        _get_method_entry(key)
+    except InvalidCombinationMethodError:
+        return False
+    return True
+
+def _from_audio_function(key):
+    """Builds a method function that takes an audio signal as input."""
+    def _func(signal, sr, **kwargs):
+        from ctfr import ctfr
+        return ctfr(signal, sr = sr, method = key, **kwargs)
+    _func.__name__ = _func.__qualname__ = key
+    _func.__doc__ = f"Alias for ``ctfr.ctfr(signal, method={key}, sr=sr, **kwargs)``."
+    return _func
+
+def _from_specs_function(key):
+    """Builds a method function that takes an iterable of spectrograms as input."""
+    def _func(specs_tensor, **kwargs):
+        from ctfr import ctfr_from_specs
+        return ctfr_from_specs(specs_tensor, method = key, **kwargs)
+    _func.__name__ = _func.__qualname__ = key + _FROM_SPECS_SUFFIX
+    _func.__doc__ = f"Alias for ``ctfr.ctfr_from_specs(specs_tensor, method={key}, **kwargs)``."
+    return _func
+
+def _validate_function_name(function_name):
+    import ctfr
+    return function_name not in dir(ctfr)
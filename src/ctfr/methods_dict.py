@@ -1,26 +1,28 @@
-from ctfr.implementations.swgm_cy import _swgm_wrapper
-from ctfr.implementations.fls_cy import _fls_wrapper
-from ctfr.implementations.lt_cy import _lt_wrapper
-from ctfr.implementations.sls_h_cy import _sls_h_wrapper
-from ctfr.implementations.sls_i_cy import _sls_i_wrapper
-from ctfr.implementations.binwise_simple import _mean_wrapper, _hmean_wrapper, _gmean_wrapper, _min_wrapper
-
+# Combination functions are specified by import path ("module:function") and imported on first use (see
+# ctfr.utils.private._get_method_function), so importing ctfr doesn't load the compiled extensions. Methods can also be
+# added with ctfr.register_method, or by other packages through the "ctfr.methods" entry points group.
 _methods_dict = {
     "mean": {
         "name": "Binwise mean",
-        "function": _mean_wrapper,
+        "function": "ctfr.implementations.binwise_simple:_mean_wrapper",
+        "memory": "KM",
+        "time_lobe": lambda **kwargs: 0,
         "citations": ['C. Detka, P. Loughlin, and A. El-Jaroudi, “On combining evolutionary spectral estimates,” in IEEE Seventh SP Workshop on Statistical Signal and Array Processing, Jun. 1994, pp. 243–246.'],
         "parameters": {}
     },
     "hmean": {
         "name": "Binwise harmonic mean",
-        "function": _hmean_wrapper,
+        "function": "ctfr.implementations.binwise_simple:_hmean_wrapper",
+        "memory": "PKM",
+        "time_lobe": lambda **kwargs: 0,
         "citations": ['C. Detka, P. Loughlin, and A. El-Jaroudi, “On combining evolutionary spectral estimates,” in IEEE Seventh SP Workshop on Statistical Signal and Array Processing, Jun. 1994, pp. 243–246.'],
         "parameters": {}
     },
     "gmean": {
         "name": "Binwise geometric mean",
-        "function": _gmean_wrapper,
+        "function": "ctfr.implementations.binwise_simple:_gmean_wrapper",
+        "memory": "PKM",
+        "time_lobe": lambda **kwargs: 0,
         "citations": [
             'C. Detka, P. Loughlin, and A. El-Jaroudi, “On combining evolutionary spectral estimates,” in IEEE Seventh SP Workshop on Statistical Signal and Array Processing, Jun. 1994, pp. 243–246.', 
             'P. Loughlin, J. Pitton, and B. Hannaford, “Approximating time-frequency density functions via optimal combinations of spectrograms,” IEEE Signal Processing Letters, vol. 1, no. 12, pp. 199–202, Dec. 1994.'],
@@ -28,7 +30,9 @@ _methods_dict = {
     },
     "min": {
         "name": "Binwise minimum",
-        "function": _min_wrapper,
+        "function": "ctfr.implementations.binwise_simple:_min_wrapper",
+        "memory": "KM",
+        "time_lobe": lambda **kwargs: 0,
         "citations": [
             'C. Detka, P. Loughlin, and A. El-Jaroudi, “On combining evolutionary spectral estimates,” in IEEE Seventh SP Workshop on Statistical Signal and Array Processing, Jun. 1994, pp. 243–246.', 
             'P. Loughlin, J. Pitton, and B. Hannaford, “Approximating time-frequency density functions via optimal combinations of spectrograms,” IEEE Signal Processing Letters, vol. 1, no. 12, pp. 199–202, Dec. 1994.'],
@@ -36,7 +40,9 @@ _methods_dict = {
     },
     "swgm": {
         "name": "Sample-weighted geometric mean (SWGM)",
-        "function": _swgm_wrapper,
+        "function": "ctfr.implementations.swgm_cy:_swgm_wrapper",
+        "memory": "KM",
+        "time_lobe": lambda **kwargs: 0,
         "citations": ['M. do V. M. da Costa and L. W. P. Biscainho, “Combining time-frequency representations for music information retrieval,” in 15th AES-Brasil Engineering Congress. Florianópolis, Brazil: Audio Engineering Society, Oct. 2017, pp. 12–18.'],
         "parameters": {
             "beta": {
@@ -46,12 +52,20 @@ _methods_dict = {
             "max_gamma": {
                 "type_and_info": r"float >= 1",
                 "description": r"Maximum weight for the geometric mean. This parameter is used to avoid numerical instability when the weights are too large. Defaults to 20."
+            },
+            "n_jobs": {
+                "type_and_info": r"int > 0 or -1",
+                "description": r"Number of threads used in the computation. If -1, all CPUs are used. Results are identical regardless of the number of threads. Defaults to 1."
             }
         }
     },
     "fls": {
         "name": "Fast local sparsity (FLS)",
-        "function": _fls_wrapper,
+        "function": "ctfr.implementations.fls_cy:_fls_wrapper",
+        "stream_state": "ctfr.implementations.fls_cy:_FlsStreamState",
+        "memory": "KM",
+        "request_shared_intermediates": True,
+        "time_lobe": lambda lm = 11, **kwargs: int(lm) // 2,
         "citations": ['M. do V. M. da Costa and L. W. P. Biscainho, “The fast local sparsity method: A low-cost combination of time-frequency representations based on the hoyer sparsity,” Journal of the Audio Engineering Society, vol. 70, no. 9, pp. 698–707, Sep. 2022.'],
         "parameters": {
             "lk": {
@@ -65,12 +79,24 @@ _methods_dict = {
             "gamma": {
                 "type_and_info": r"float >= 0",
                 "description": r"Factor used in the computation of combination weights. Defaults to 20."
+            },
+            "n_jobs": {
+                "type_and_info": r"int > 0 or -1",
+                "description": r"Number of threads used in the computation. If -1, all CPUs are used. Results are identical regardless of the number of threads. Defaults to 1."
+            },
+            "energy_criterium_db": {
+                "type_and_info": r"float or None",
+                "description": r"Local energy criterium (in decibels) that distinguishes high-energy regions (where the local sparsity is computed) from low-energy regions (where the binwise minimum is computed). The local energy of a bin is the largest local energy of the spectrograms around it, computed as in SLS-H with an ``lk`` x ``lm`` window (a Hamming window in frequency and a left-sided Hamming window in time), so the same criterium selects the same regions in both methods. If ``None``, the local sparsity is computed in every bin. The fraction of bins skipped is not returned, but is reported as ``skipped_fraction`` in the ``info`` of the ``energy_gate`` stage when profiling with :func:`ctfr.profile`. Defaults to ``None``."
             }
         }
     },
     "lt": {
         "name": "Lukin-Todd (LT)",
-        "function": _lt_wrapper,
+        "function": "ctfr.implementations.lt_cy:_lt_wrapper",
+        "stream_state": "ctfr.implementations.lt_cy:_LtStreamState",
+        "memory": "PKM",
+        "request_shared_intermediates": True,
+        "time_lobe": lambda lm = 11, **kwargs: int(lm) // 2,
         "citations": ['A. Lukin and J. G. Todd, “Adaptive time-frequency resolution for analysis and processing of audio,” in 120th Audio Engineering Society Convention. Paris, France: Audio Engineering Society, May 2006.'],
         "parameters": {
             "lk": {
@@ -84,12 +110,24 @@ _methods_dict = {
             "eta": {
                 "type_and_info": r"float >= 0",
                 "description": r"Factor used in the computation of combination weights. Defaults to 8."
+            },
+            "n_jobs": {
+                "type_and_info": r"int > 0 or -1",
+                "description": r"Number of threads used in the computation. If -1, all CPUs are used. Results are identical regardless of the number of threads. Defaults to 1."
+            },
+            "energy_criterium_db": {
+                "type_and_info": r"float or None",
+                "description": r"Local energy criterium (in decibels) that distinguishes high-energy regions (where the local energy smearing is computed) from low-energy regions (where the binwise minimum is computed). The local energy of a bin is the largest local energy of the spectrograms around it, computed as in SLS-H with an ``lk`` x ``lm`` window (a Hamming window in frequency and a left-sided Hamming window in time), so the same criterium selects the same regions in both methods. If ``None``, the local energy smearing is computed in every bin. The fraction of bins skipped is not returned, but is reported as ``skipped_fraction`` in the ``info`` of the ``energy_gate`` stage when profiling with :func:`ctfr.profile`. Defaults to ``None``."
             }
         }
     },
     "sls_h": {
         "name": "Hybrid smoothed local sparsity (SLS-H)",
-        "function": _sls_h_wrapper,
+        "function": "ctfr.implementations.sls_h_cy:_sls_h_wrapper",
+        "stream_state": "ctfr.implementations.sls_h_cy:_SlsHStreamState",
+        "memory": "PKM",
+        "request_shared_intermediates": True,
+        "time_lobe": lambda lem = 11, lsm = 11, **kwargs: max(int(lem), int(lsm)) // 2,
         "citations": [
             'M. do V. M. da Costa and L. W. P. Biscainho, “Combining time-frequency representations via local sparsity criterion,” in 2nd AES Latin American Congress of Audio Engineering, Montevideo, Uruguay, Sep. 2018, pp. 78–85.',
             'M. do V. M. da Costa, I. Apolinário, and L. W. P. Biscainho, “Sparse time-frequency representations for polyphonic audio based on combined efficient fan-chirp transforms,” Journal of the Audio Engineering Society, vol. 67, no. 11, pp. 894–905, Nov. 2019.'
@@ -117,13 +155,19 @@ _methods_dict = {
             },
             "energy_criterium_db": {
                 "type_and_info": r"float",
-                "description": r"Local energy criterium (in decibels) that distinguishes high-energy regions (where LS is computed) from low-energy regions (where binwise minimum is computed). Defaults to -40."
+                "description": r"Local energy criterium (in decibels) that distinguishes high-energy regions (where the local sparsity is computed and the spectrograms are combined by their weights) from low-energy regions (where the binwise minimum is computed). Defaults to -40."
+            },
+            "gini_mode": {
+                "type_and_info": r"{'exact', 'fast'}",
+                "description": r"How the local sparsity (Gini index) of each windowed region is computed. If ``'exact'``, the region is weighted by Hamming windows in frequency and time and sorted for every bin. If ``'fast'``, the time window is rectangular, so the sorted region is updated incrementally as it slides along time, which is considerably faster but gives a different sparsity measure and thus different results. Defaults to ``'exact'``."
             }
         }
     },
     "sls_i": {
         "name": "Smoothed local sparsity with interpolation (SLS-I)",
-        "function": _sls_i_wrapper,
+        "function": "ctfr.implementations.sls_i_cy:_sls_i_wrapper",
+        "memory": "PKM",
+        "request_shared_intermediates": True,
         "request_tfrs_info": True,
         "citations": [
             'M. do V. M. da Costa and L. W. P. Biscainho, “Combining time-frequency representations via local sparsity criterion,” in 2nd AES Latin American Congress of Audio Engineering, Montevideo, Uruguay, Sep. 2018, pp. 78–85.',
@@ -152,7 +196,23 @@ _methods_dict = {
             },
             "interp_steps": {
                 "type_and_info": r"ndarray of int, shape P x 2",
-                "description": r"Interpolation steps to use when computing the local sparsity. interp_steps[p, i] refers to the interpolation step of axis i (frequency is 0, time is 1) for spectrogram p. When calling :func:`ctfr.ctfr` (or :func:`ctfr.methods.sls_i`), ``interp_steps[p]`` defaults to ``[n_fft // l, l // (2 * hop_length)]``. When calling :func:`ctfr.ctfr_from_specs` (or :func:`ctfr.methods.sls_i_from_specs`), this argument must the provided by the user."
+                "description": r"Interpolation steps to use when computing the local sparsity. interp_steps[p, i] refers to the interpolation step of axis i (frequency is 0, time is 1) for spectrogram p. When calling :func:`ctfr.ctfr` (or :func:`ctfr.methods.sls_i`), ``interp_steps[p]`` defaults to ``[n_fft // l, l // (2 * hop_length)]`` for STFT spectrograms with window length ``l``, and to ``[round(1 / s), 1]`` for CQT spectrograms with filter scale ``s``. If ``adaptive`` is ``True``, these default steps are multiplied by 4, as the grid is refined where needed. When calling :func:`ctfr.ctfr_from_specs` (or :func:`ctfr.methods.sls_i_from_specs`), this argument must the provided by the user."
+            },
+            "gini_mode": {
+                "type_and_info": r"{'exact', 'fast'}",
+                "description": r"How the local sparsity (Gini index) of each windowed region is computed. If ``'exact'``, the region is weighted by Hamming windows in frequency and time and sorted for every bin. If ``'fast'``, the time window is rectangular, so the sorted region is updated incrementally as it slides along time, which is considerably faster but gives a different sparsity measure and thus different results. Defaults to ``'exact'``."
+            },
+            "adaptive": {
+                "type_and_info": r"bool",
+                "description": r"Whether to refine the interpolation adaptively. If ``True``, the local sparsity is first computed in the grid given by ``interp_steps``, and then also in every bin of the grid cells that contain bins with local energy above ``energy_criterium_db``, or whose corners have local sparsities differing by more than ``sparsity_tolerance``. The interpolated local sparsity is kept in the remaining cells, so the local sparsity computations are concentrated in high-energy and high-variation regions. This saves computations when most of the time-frequency plane is low-energy, and is more accurate than the fixed interpolation in high-energy regions; in dense material, where most cells are refined, it can compute the local sparsity in more bins than the fixed interpolation with the default steps. The fraction of bins where the local sparsity was computed is reported as ``evaluated_fraction`` in the ``info`` of the ``local_sparsity`` stage when profiling with :func:`ctfr.profile`. Defaults to ``False``."
+            },
+            "energy_criterium_db": {
+                "type_and_info": r"float",
+                "description": r"Local energy criterium (in decibels) above which grid cells are refined when ``adaptive`` is ``True``, that is, the local sparsity is computed in every bin of the cells that contain a bin with higher local energy. It doesn't affect the combination, which uses the local sparsity in every bin, and has no effect when ``adaptive`` is ``False``. Defaults to -40."
+            },
+            "sparsity_tolerance": {
+                "type_and_info": r"float >= 0",
+                "description": r"Maximum difference between the local sparsities (Gini indices, between 0 and 1) at the corners of a grid cell for it not to be refined when ``adaptive`` is ``True``. Defaults to 0.2."
             }
         }
     }
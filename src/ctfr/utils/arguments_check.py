@@ -1,4 +1,7 @@
+import numpy as np
 from warnings import warn
+from os import cpu_count
+from ctfr.exception import InvalidSpecError
 from ctfr.warning import ArgumentChangeWarning
 
 def _enforce_nonnegative(value, name, default):
@@ -32,3 +35,21 @@ def _enforce_odd_positive_integer(value, name, default):
         return value + 1
     return value
 
+def _enforce_n_jobs(value, name, default):
+    value = int(value)
+    if value == -1:
+        return cpu_count() or 1
+    if value < 1:
+        warn(f"The '{name}' parameter should be a positive integer or -1. Setting {name} = {default}.", ArgumentChangeWarning)
+        return default
+    return value
+
+def _enforce_choice(value, name, choices):
+    if value not in choices:
+        raise ValueError(f"The '{name}' parameter must be one of {', '.join(repr(choice) for choice in choices)}. Got {value!r}.")
+    return value
+
+def _enforce_finite_specs(X):
+    if not np.isfinite(X).all():
+        raise InvalidSpecError("Input spectrograms must not contain NaN or infinite values.")
+    return X
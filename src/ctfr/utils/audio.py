@@ -1,18 +1,15 @@
-import librosa
-try:
-    from librosa.display import specshow as specshow_librosa
-except ImportError:
-    _has_display = False
-else:
-    _has_display = True
-
 import numpy as np
+from collections import namedtuple
+from ctfr.utils.cache import plan_cache
+
+# librosa (and SciPy's FFT module) are imported by the functions that use them, so they are not loaded by import ctfr.
 
 def load(path, *, sr=None, mono=True, offset=0.0, duration=None, dtype=np.double, res_type="soxr_hq"):
     """Loads an audio file as a floating point time series.
 
     This function is a wrapper for :external:func:`librosa.load`. The default values for ``sr`` and ``dtype`` are changed.
     """
+    import librosa
     return librosa.load(path, sr=sr, mono=mono, offset=offset, duration=duration, dtype=dtype, res_type=res_type)
 
 def stft(signal, *, n_fft=2048, hop_length=None, win_length=None, window="hann", center=True, dtype=None, pad_mode="constant", out=None):
@@ -24,6 +21,7 @@ def stft(signal, *, n_fft=2048, hop_length=None, win_length=None, window="hann",
     --------
     ctfr.stft_spec
     """
+    import librosa
     return librosa.stft(signal, n_fft=n_fft, hop_length=hop_length, win_length=win_length, window=window, center=center, dtype=dtype, pad_mode=pad_mode, out=out)
 
 def cqt(signal, *, sr=22050, hop_length=512, fmin=None, n_bins=288, bins_per_octave=36, tuning=0.0, filter_scale=1, norm=1, sparsity=0.01, window="hann", scale=True, pad_mode="constant", res_type="soxr_hq", dtype=None):
@@ -35,6 +33,7 @@ def cqt(signal, *, sr=22050, hop_length=512, fmin=None, n_bins=288, bins_per_oct
     --------
     ctfr.cqt_spec
     """
+    import librosa
     return librosa.cqt(signal, sr=sr, hop_length=hop_length, fmin=fmin, n_bins=n_bins, bins_per_octave=bins_per_octave, tuning=tuning, filter_scale=filter_scale, norm=norm, sparsity=sparsity, window=window, scale=scale, pad_mode=pad_mode, res_type=res_type, dtype=dtype)
 
 def stft_spec(signal, *, n_fft=2048, hop_length=None, win_length=None, window="hann", center=True, pad_mode="constant", dtype=np.double, stft_dtype=None):
@@ -56,6 +55,298 @@ def stft_spec(signal, *, n_fft=2048, hop_length=None, win_length=None, window="h
     """
     return np.square(np.abs(stft(signal, n_fft=n_fft, hop_length=hop_length, win_length=win_length, window=window, center=center, dtype=stft_dtype, pad_mode=pad_mode, out=None), dtype=dtype))
 
+def multi_stft_spec(signal, *, win_lengths, n_fft=None, hop_length=None, window="hann", center=True, pad_mode="constant", dtype=np.double, out=None):
+    """Computes the squared magnitudes of the short-time Fourier transforms (STFTs) of a signal with multiple window lengths.
+
+    This function is equivalent to:
+
+    >>> np.array([ctfr.stft_spec(signal, win_length=win_length, ...) for win_length in win_lengths])
+
+    but the signal is padded and framed only once, all windows are applied to each frame in a single batched operation and the squared magnitudes are written directly to a contiguous output tensor, without intermediate arrays of the size of the output. The output is the spectrograms tensor layout used by the combination methods.
+
+    Parameters
+    ----------
+    signal : np.ndarray [shape=(n)], real-valued
+        input signal.
+    win_lengths : Iterable[int]
+        window lengths in samples, one for each STFT.
+    n_fft : int > 0, optional
+        number of FFT points, shared by all STFTs. If not provided, defaults to the largest window length.
+    hop_length : int > 0, optional
+        hop length in samples, shared by all STFTs. If not provided, defaults to ``n_fft // 4``.
+    window : str, tuple or callable
+        window specification, as in :func:`stft`. By default, a Hann window.
+    center : bool
+        if `True`, the signal is padded so that frame ``m`` is centered at sample ``m * hop_length``.
+    pad_mode : str
+        padding mode used when ``center`` is `True`, as in :external:func:`numpy.pad`.
+    dtype : np.dtype
+        data type of the output tensor, by default ``np.double``.
+    out : np.ndarray [shape=(P, K, M)], optional
+        preallocated C-contiguous output tensor with data type ``dtype``. If not provided, a new tensor is allocated.
+
+    Returns
+    -------
+    np.ndarray [shape=(P, K, M)]
+        tensor containing the squared-magnitude STFTs, where ``P`` is the number of window lengths, ``K = 1 + n_fft // 2`` is the number of frequency bins and ``M`` is the number of time frames.
+
+    See Also
+    --------
+    ctfr.stft_spec
+    """
+    win_lengths = list(win_lengths)
+    if n_fft is None:
+        n_fft = max(win_lengths)
+    if hop_length is None:
+        hop_length = n_fft // 4
+    windows = _get_multi_stft_windows(win_lengths, n_fft, window=window)
+    return _multi_stft_spec(signal, windows, n_fft, hop_length, center=center, pad_mode=pad_mode, dtype=dtype, out=out)
+
+def _get_multi_stft_windows(win_lengths, n_fft, window="hann"):
+    """Returns the analysis windows for each window length, zero-padded (centered) to n_fft samples, as a (P, n_fft) matrix. Windows specified by name (or tuple) are taken from the plan cache."""
+    win_lengths = tuple(int(win_length) for win_length in win_lengths)
+    if isinstance(window, (str, tuple)):
+        return plan_cache._get(("stft_windows", win_lengths, int(n_fft), window), _build_multi_stft_windows, win_lengths, n_fft, window)
+    return _build_multi_stft_windows(win_lengths, n_fft, window)
+
+def _build_multi_stft_windows(win_lengths, n_fft, window):
+    import librosa
+    return np.array(
+        [librosa.util.pad_center(librosa.filters.get_window(window, win_length, fftbins=True), size=n_fft) for win_length in win_lengths]
+    )
+
+# Maximum number of elements of the windowed frames processed at once by _multi_stft_spec.
+_MULTI_STFT_CHUNK_ELEMENTS = 1 << 18
+
+def _multi_stft_spec(signal, windows, n_fft, hop_length, center=True, pad_mode="constant", dtype=np.double, out=None):
+    """Computes the squared-magnitude STFTs of a signal for each (n_fft-padded) window in the rows of ``windows``."""
+    from scipy.fft import rfft
+    signal = np.asarray(signal)
+    if signal.ndim != 1:
+        raise ValueError("The input signal must be 1-dimensional.")
+    if center:
+        signal = np.pad(signal, n_fft // 2, mode=pad_mode)
+    if signal.shape[0] < n_fft:
+        raise ValueError(f"n_fft={n_fft} is too large for input signal of length={signal.shape[0]}.")
+
+    # Frames are views of the (padded) signal.
+    frames = np.lib.stride_tricks.sliding_window_view(signal, n_fft)[::hop_length]
+    P, K, M = windows.shape[0], 1 + n_fft // 2, frames.shape[0]
+
+    if out is None:
+        out = np.empty((P, K, M), dtype=dtype)
+    elif out.shape != (P, K, M) or out.dtype != dtype or not out.flags.c_contiguous:
+        raise ValueError(f"The 'out' tensor must be C-contiguous, with shape {(P, K, M)} and data type {np.dtype(dtype)}.")
+
+    # Frames are processed in chunks, bounding the size of the windowed frames and their FFTs.
+    windows = windows.astype(dtype, copy=False)[:, np.newaxis, :]
+    chunk_length = max(1, _MULTI_STFT_CHUNK_ELEMENTS // (P * n_fft))
+    for m in range(0, M, chunk_length):
+        spectrum = rfft(frames[m:m + chunk_length].astype(dtype, copy=False) * windows, axis=-1)
+        power = np.square(spectrum.real)
+        power += np.square(spectrum.imag)
+        out[:, :, m:m + chunk_length] = power.transpose(0, 2, 1)
+    return out
+
+def multi_cqt_spec(signal, *, filter_scales, sr=22050, hop_length=512, fmin=None, n_bins=288, bins_per_octave=36, dtype=np.double, cqt_dtype=None, out=None):
+    """Computes the squared magnitudes of the constant-Q transforms (CQTs) of a signal with multiple filter scales.
+
+    This function is equivalent to:
+
+    >>> np.array([ctfr.cqt_spec(signal, filter_scale=filter_scale, ...) for filter_scale in filter_scales])
+
+    but the multirate decimation of the signal, and the STFTs of the decimated signals with the same FFT length, are computed only once for all filter scales. The filter banks are cached for subsequent calls with the same parameters, and the squared magnitudes are written directly to a contiguous output tensor, octave by octave, without intermediate arrays of the size of the output. The output is the spectrograms tensor layout used by the combination methods.
+
+    Parameters
+    ----------
+    signal : np.ndarray [shape=(n)], real-valued
+        input signal.
+    filter_scales : Iterable[float], values in range: (0, 1]
+        filter scales, one for each CQT.
+    sr : float
+        sampling rate of the input signal, by default 22050 Hz.
+    hop_length : int > 0
+        hop length in samples, shared by all CQTs.
+    fmin : float > 0, optional
+        minimum frequency. If not provided, defaults to C1 (about 32.7 Hz).
+    n_bins : int > 0
+        number of frequency bins.
+    bins_per_octave : int > 0
+        number of bins per octave.
+    dtype : np.dtype
+        data type of the output tensor, by default ``np.double``.
+    cqt_dtype : np.dtype, optional
+        complex data type of the filter banks and of the CQTs before the squared magnitudes are computed. If not provided, it's the complex counterpart of the signal data type.
+    out : np.ndarray [shape=(P, K, M)], optional
+        preallocated C-contiguous output tensor with data type ``dtype``. If not provided, a new tensor is allocated.
+
+    Returns
+    -------
+    np.ndarray [shape=(P, K, M)]
+        tensor containing the squared-magnitude CQTs, where ``P`` is the number of filter scales, ``K = n_bins`` is the number of frequency bins and ``M`` is the number of time frames.
+
+    Raises
+    ------
+    :external:class:`ValueError`
+        If the highest filter would exceed the Nyquist frequency, if the signal is too short, or if ``out`` is invalid.
+
+    Notes
+    -----
+    The CQTs are computed with the remaining parameters of :func:`cqt_spec` fixed to their default values.
+
+    See Also
+    --------
+    ctfr.cqt_spec
+    """
+    return _multi_cqt_spec(signal, sr, list(filter_scales), hop_length, fmin, n_bins, bins_per_octave, dtype=dtype, cqt_dtype=cqt_dtype, out=out)
+
+# Parameters of the CQTs computed by _multi_cqt_spec, which match the defaults of cqt_spec.
+_CQT_NORM = 1
+_CQT_SPARSITY = 0.01
+_CQT_WINDOW = "hann"
+_CQT_PAD_MODE = "constant"
+_CQT_RES_TYPE = "soxr_hq"
+
+# Frequency-domain filter banks of each octave of a CQT, along with the early downsampling count (see librosa.vqt) and
+# the square roots of the filter lengths, by which the CQT is scaled.
+_CQTFilterBank = namedtuple("_CQTFilterBank", ["early_downsample_count", "octave_bases", "sqrt_lengths"])
+
+def _multi_cqt_spec(signal, sr, filter_scales, hop_length, fmin, n_bins, bins_per_octave, dtype=np.double, cqt_dtype=None, out=None):
+    """Computes the squared-magnitude CQTs of a signal for each filter scale, reproducing librosa.cqt with the default parameters of cqt_spec.
+
+    The signal is decimated by each octave as in librosa.vqt. Filter scales with the same early downsampling count share all decimated signals, and the STFTs of the same decimated signal with the same FFT length are shared within each octave.
+    """
+    import librosa
+    signal = np.asarray(signal)
+    if signal.ndim != 1:
+        raise ValueError("The input signal must be 1-dimensional.")
+    if cqt_dtype is None:
+        cqt_dtype = librosa.util.dtype_r2c(signal.dtype)
+    if fmin is None:
+        fmin = librosa.note_to_hz("C1")
+    n_octaves = int(np.ceil(n_bins / bins_per_octave))
+    filter_banks = [_get_cqt_filter_bank(sr, fmin, n_bins, bins_per_octave, filter_scale, hop_length, cqt_dtype) for filter_scale in filter_scales]
+
+    # Decimated signals and hop lengths of each octave of each CQT. The decimated signals are keyed by the early
+    # downsampling count and by the number of subsequent halvings, so they are computed once for all CQTs.
+    decimated = {}
+    octave_inputs = [
+        [_get_decimated_signal(decimated, signal, filter_bank.early_downsample_count, hop_length, i) for i in range(n_octaves)]
+        for filter_bank in filter_banks
+    ]
+
+    # Number of frames of the centered STFTs with even FFT lengths, trimmed to the shortest octave (see librosa.vqt).
+    P, K, M = len(filter_scales), n_bins, min(1 + len(decimated[key]) // octave_hop for inputs in octave_inputs for key, octave_hop in inputs)
+
+    if out is None:
+        out = np.empty((P, K, M), dtype=dtype)
+    elif out.shape != (P, K, M) or out.dtype != dtype or not out.flags.c_contiguous:
+        raise ValueError(f"The 'out' tensor must be C-contiguous, with shape {(P, K, M)} and data type {np.dtype(dtype)}.")
+
+    n_filters = min(bins_per_octave, n_bins)
+    for i in range(n_octaves):
+        bins = slice(max(0, n_bins - n_filters * (i + 1)), n_bins - n_filters * i)
+        stfts = {}
+        for p, filter_bank in enumerate(filter_banks):
+            fft_basis, n_fft = filter_bank.octave_bases[i]
+            key, octave_hop = octave_inputs[p][i]
+            if (key, n_fft) not in stfts:
+                stfts[key, n_fft] = librosa.stft(decimated[key], n_fft=n_fft, hop_length=octave_hop, window="ones", pad_mode=_CQT_PAD_MODE, dtype=cqt_dtype)
+            response = fft_basis.dot(stfts[key, n_fft])[:, :M]
+            response /= filter_bank.sqrt_lengths[bins, np.newaxis]
+            np.square(np.abs(response), out=out[p, bins], dtype=dtype)
+    return out
+
+def _get_decimated_signal(decimated, signal, early_downsample_count, hop_length, octave):
+    """Returns the key in decimated of the signal analyzed in an octave of a CQT, computing it and the signals it's decimated from if needed, along with the hop length of the octave.
+
+    As in librosa.vqt, the signal is first downsampled by 2 ** early_downsample_count at once, and then halved for each octave while the hop length is even.
+    """
+    import librosa
+    hop_length //= 2 ** early_downsample_count
+    halvings = 0
+    while halvings < octave and hop_length % 2 == 0:
+        hop_length //= 2
+        halvings += 1
+
+    # A single early downsampling by 2 is the same as halving the original signal.
+    if early_downsample_count == 1:
+        early_downsample_count, halvings = 0, halvings + 1
+    for h in range(halvings + 1):
+        key = (early_downsample_count, h)
+        if key in decimated:
+            continue
+        if h > 0:
+            decimated[key] = librosa.resample(decimated[early_downsample_count, h - 1], orig_sr=2, target_sr=1, res_type=_CQT_RES_TYPE, scale=True)
+        elif early_downsample_count == 0:
+            decimated[key] = signal
+        else:
+            downsample_factor = 2 ** early_downsample_count
+            if signal.shape[-1] < downsample_factor:
+                raise ValueError(f"Input signal length={signal.shape[-1]} is too short for the CQT.")
+            decimated[key] = librosa.resample(signal, orig_sr=downsample_factor, target_sr=1, res_type=_CQT_RES_TYPE, scale=True)
+    return key, hop_length
+
+def _get_cqt_filter_bank(sr, fmin, n_bins, bins_per_octave, filter_scale, hop_length, cqt_dtype):
+    """Returns the filter bank of a CQT from the plan cache, building it if needed."""
+    params = (float(sr), float(fmin), int(n_bins), int(bins_per_octave), float(filter_scale), int(hop_length), np.dtype(cqt_dtype).str)
+    return plan_cache._get(("cqt_filter_bank",) + params, _build_cqt_filter_bank, *params)
+
+def _build_cqt_filter_bank(sr, fmin, n_bins, bins_per_octave, filter_scale, hop_length, cqt_dtype):
+    """Builds the filter bank of a CQT, following librosa.vqt with the default parameters of cqt_spec."""
+    import librosa
+    n_octaves = int(np.ceil(n_bins / bins_per_octave))
+    n_filters = min(bins_per_octave, n_bins)
+    freqs = librosa.interval_frequencies(n_bins=n_bins, fmin=fmin, intervals="equal", bins_per_octave=bins_per_octave, sort=True)
+    alpha = _get_relative_bandwidths(freqs, bins_per_octave)
+    _, filter_cutoff = librosa.filters.wavelet_lengths(freqs=freqs, sr=sr, window=_CQT_WINDOW, filter_scale=filter_scale, gamma=0, alpha=alpha)
+
+    nyquist = sr / 2.0
+    if filter_cutoff > nyquist:
+        raise ValueError(f"Wavelet basis with max frequency={np.max(freqs[-bins_per_octave:])} would exceed the Nyquist frequency={nyquist}. Try reducing the number of frequency bins.")
+
+    # Early downsampling of the signal, when all filters are far below the Nyquist frequency (see librosa.vqt).
+    twos = 0
+    while hop_length > 0 and hop_length % (2 ** (twos + 1)) == 0:
+        twos += 1
+    early_downsample_count = min(max(0, int(np.ceil(np.log2(nyquist / filter_cutoff)) - 1) - 1), max(0, twos - n_octaves + 1))
+    sr /= 2 ** early_downsample_count
+    hop_length //= 2 ** early_downsample_count
+
+    octave_bases = []
+    octave_sr, octave_hop = sr, hop_length
+    for i in range(n_octaves):
+        bins = slice(max(0, n_bins - n_filters * (i + 1)), n_bins - n_filters * i)
+        basis, lengths = librosa.filters.wavelet(freqs=freqs[bins], sr=octave_sr, filter_scale=filter_scale, norm=_CQT_NORM, pad_fft=True, window=_CQT_WINDOW, gamma=0, alpha=alpha[bins])
+
+        # Filters are zero-padded to a power of 2 and normalized with respect to the FFT length. Only the nonnegative
+        # frequencies are kept, and the filters are rescaled to compensate for the downsampling.
+        n_fft = basis.shape[1]
+        basis *= lengths[:, np.newaxis] / float(n_fft)
+        fft_basis = librosa.get_fftlib().fft(basis, n=n_fft, axis=1)[:, :(n_fft // 2) + 1]
+        fft_basis = librosa.util.sparsify_rows(fft_basis, quantile=_CQT_SPARSITY, dtype=cqt_dtype)
+        fft_basis.data *= np.sqrt(sr / octave_sr)
+        octave_bases.append((fft_basis, n_fft))
+
+        if octave_hop % 2 == 0:
+            octave_hop //= 2
+            octave_sr /= 2.0
+
+    lengths, _ = librosa.filters.wavelet_lengths(freqs=freqs, sr=sr, window=_CQT_WINDOW, filter_scale=filter_scale, gamma=0, alpha=alpha)
+    return _CQTFilterBank(early_downsample_count, octave_bases, np.sqrt(lengths))
+
+def _get_relative_bandwidths(freqs, bins_per_octave):
+    """Computes the relative bandwidth of each filter, from the spacing between the frequencies in octaves (see librosa.vqt)."""
+    if len(freqs) == 1:
+        r = 2 ** (1 / bins_per_octave)
+        return np.atleast_1d((r**2 - 1) / (r**2 + 1))
+    bpo = np.empty_like(freqs)
+    logf = np.log2(freqs)
+    bpo[0] = 1 / (logf[1] - logf[0])
+    bpo[-1] = 1 / (logf[-1] - logf[-2])
+    bpo[1:-1] = 2 / (logf[2:] - logf[:-2])
+    return (2.0 ** (2 / bpo) - 1) / (2.0 ** (2 / bpo) + 1)
+
 def cqt_spec(signal, *, sr=22050, hop_length=512, fmin=None, n_bins=288, bins_per_octave=36, tuning=0.0, filter_scale=1, norm=1, sparsity=0.01, window="hann", scale=True, pad_mode="constant", res_type="soxr_hq", dtype=np.double, cqt_dtype=None):
     """Computes the squared magnitude of the constant-Q transform (CQT) of a signal.
 
@@ -82,8 +373,10 @@ def specshow(data, *, x_coords=None, y_coords=None, x_axis=None, y_axis=None, sr
     -----
     This function is not installed with `ctfr` by default. To use it, you must install ``ctfr`` with the ``[display]`` extra. See :doc:`/getting_started/installation` for more information.
     """
-    if not _has_display:
-        raise ImportError("Matplotlib is not available. Please reinstall ctfr with the 'display' extra by running:\n\npip install ctfr[display]")
+    try:
+        from librosa.display import specshow as specshow_librosa
+    except ImportError:
+        raise ImportError("Matplotlib is not available. Please reinstall ctfr with the 'display' extra by running:\n\npip install ctfr[display]") from None
     return specshow_librosa(data, x_coords=x_coords, y_coords=y_coords, x_axis=x_axis, y_axis=y_axis, sr=sr, hop_length=hop_length, n_fft=n_fft, win_length=win_length, fmin=fmin, fmax=fmax, tempo_min=tempo_min, tempo_max=tempo_max, tuning=tuning, bins_per_octave=bins_per_octave, key=key, Sa=Sa, mela=mela, thaat=thaat, auto_aspect=auto_aspect, htk=htk, unicode=unicode, intervals=intervals, unison=unison, ax=ax, **kwargs)
 
 def power_to_db(S, ref=1.0, amin=1e-10, top_db=80.0):
@@ -91,6 +384,7 @@ def power_to_db(S, ref=1.0, amin=1e-10, top_db=80.0):
     
     This function is a wrapper for :external:func:`librosa.power_to_db`.
     """
+    import librosa
     return librosa.power_to_db(S, ref=ref, amin=amin, top_db=top_db)
 
     
\ No newline at end of file
@@ -0,0 +1,297 @@
+import json
+import os
+import numpy as np
+from collections import OrderedDict, namedtuple
+from hashlib import blake2b
+from threading import Lock
+from typing import Union
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "disk_hits", "misses", "entries", "nbytes", "max_bytes"])
+PlanCacheInfo = namedtuple("PlanCacheInfo", ["hits", "misses", "entries", "nbytes", "max_bytes"])
+
+class SpecsCache:
+    """Cache of normalized spectrogram tensors, used to avoid recomputing the spectrograms when computing multiple CTFRs of the same signal.
+
+    A cache is passed to :func:`ctfr.ctfr` (or :func:`ctfr.ctfr_batch`) through the ``cache`` parameter. Tensors are keyed on a hash of the signal content and on the resolved TFRs parameters (including the data type), so a signal is only recomputed when its spectrograms would differ. This is useful, for example, to compare combination methods or method parameters on the same signals.
+
+    Parameters
+    ----------
+    max_bytes : int >= 0, default=2**30
+        maximum total size in bytes of the tensors kept in memory. When exceeded, the least recently used tensors are evicted. Tensors larger than ``max_bytes`` are not kept in memory. If 0, no tensors are kept in memory.
+    directory : str or path-like, optional
+        directory in which tensors are also stored as ``.npy`` files. On a memory miss, stored tensors are memory-mapped, so they are read from disk only as they are used. Files in the directory are kept across sessions and can be shared by multiple processes. If not provided, tensors are only kept in memory.
+
+    Raises
+    ------
+    :external:class:`ValueError`
+        If ``max_bytes`` is negative.
+
+    Notes
+    -----
+    Cached tensors are shared between the calls that use them, so combination methods must not modify their input tensor. None of the methods included in this package do.
+
+    When the cache is used by a process pool, as in ``ctfr.ctfr_batch(..., executor="process", cache=cache)``, each worker process receives an empty copy of the in-memory cache, so only the on-disk storage is shared between workers.
+
+    Examples
+    --------
+    >>> cache = ctfr.SpecsCache(max_bytes=2**28)
+    >>> for eta in [2.0, 4.0, 8.0]:
+    ...     results[eta] = ctfr.ctfr(signal, sr, "lt", eta=eta, cache=cache)
+    >>> cache.info()
+    CacheInfo(hits=2, disk_hits=0, misses=1, entries=1, nbytes=..., max_bytes=268435456)
+    """
+
+    def __init__(self, max_bytes: int = 2**30, directory: Union[str, os.PathLike] = None):
+        self.max_bytes = _check_max_bytes(max_bytes)
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self._init_state()
+
+    def info(self) -> CacheInfo:
+        """Returns the cache statistics.
+
+        Returns
+        -------
+        CacheInfo
+            named tuple with the number of memory ``hits``, of ``disk_hits`` and of ``misses``, the number of ``entries`` and their total size ``nbytes`` in memory, and ``max_bytes``.
+        """
+        with self._lock:
+            return CacheInfo(self._hits, self._disk_hits, self._misses, len(self._memory), self._memory.nbytes, self.max_bytes)
+
+    def clear(self) -> None:
+        """Removes all cached tensors, including the ones stored on disk, and resets the statistics."""
+        with self._lock:
+            self._memory.clear()
+            self._hits = self._disk_hits = self._misses = 0
+            if self.directory is not None:
+                for filename in os.listdir(self.directory):
+                    if filename.startswith(_DISK_PREFIX) and filename.endswith((".npy", ".json")):
+                        os.remove(os.path.join(self.directory, filename))
+
+    def _get_key(self, signal, representation_type, params):
+        """Computes the key of a signal and resolved TFRs parameters."""
+        signal = np.ascontiguousarray(signal)
+        h = blake2b(digest_size=20)
+        h.update(repr((representation_type, signal.dtype.str, signal.shape, sorted((k, repr(v)) for k, v in params.items()))).encode())
+        h.update(memoryview(signal).cast("B"))
+        return h.hexdigest()
+
+    def _get(self, key):
+        """Returns the cached (specs_tensor, energy) entry for a key, or None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._hits += 1
+                return entry
+        entry = self._load(key)
+        with self._lock:
+            if entry is not None:
+                self._disk_hits += 1
+            else:
+                self._misses += 1
+        return entry
+
+    def _put(self, key, specs_tensor, energy):
+        """Caches the (specs_tensor, energy) entry for a key."""
+        with self._lock:
+            self._memory.put(key, (specs_tensor, energy), specs_tensor.nbytes)
+        if self.directory is not None:
+            self._store(key, specs_tensor, energy)
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, f"{_DISK_PREFIX}{key}{extension}")
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key, ".json")) as f:
+                energy = json.load(f)["energy"]
+            # Copy-on-write mapping: the file is never modified through the returned tensor.
+            specs_tensor = np.load(self._path(key, ".npy"), mmap_mode="c")
+        except (OSError, ValueError, KeyError):
+            return None
+        return specs_tensor, energy
+
+    def _store(self, key, specs_tensor, energy):
+        # Files are written under temporary names and then renamed, so concurrent readers never see partial files. The
+        # metadata file is written last, as its presence marks a complete entry.
+        pid = os.getpid()
+        tmp_npy, tmp_json = self._path(key, f".{pid}.tmp.npy"), self._path(key, f".{pid}.tmp.json")
+        np.save(tmp_npy, specs_tensor)
+        with open(tmp_json, "w") as f:
+            json.dump({"energy": float(energy)}, f)
+        os.replace(tmp_npy, self._path(key, ".npy"))
+        os.replace(tmp_json, self._path(key, ".json"))
+
+    def _init_state(self):
+        self._lock = Lock()
+        self._memory = _LRUCache(self.max_bytes)
+        self._hits = self._disk_hits = self._misses = 0
+
+    def __getstate__(self):
+        # Only the configuration is sent to other processes.
+        return {"max_bytes": self.max_bytes, "directory": self.directory}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_state()
+
+    def __repr__(self):
+        return f"SpecsCache(max_bytes={self.max_bytes}, directory={self.directory!r})"
+
+class PlanCache:
+    """Cache of the analysis plans that only depend on the computation parameters, such as STFT windows, CQT filter banks and the local windows of the combination methods.
+
+    A single process-wide instance, ``ctfr.plan_cache``, is used by all computations, so plans are built once and reused by subsequent calls with the same parameters, such as when processing many signals with the same sampling rate and TFRs parameters. It's thread-safe, and cached plans are read-only.
+
+    Parameters
+    ----------
+    max_bytes : int >= 0, default=2**27
+        maximum total size in bytes of the cached plans. When exceeded, the least recently used plans are evicted. If 0, no plans are kept.
+
+    Raises
+    ------
+    :external:class:`ValueError`
+        If ``max_bytes`` is negative.
+
+    Examples
+    --------
+    >>> for signal in signals:
+    ...     results.append(ctfr.ctfr(signal, sr, "fls", representation_type="cqt"))
+    >>> ctfr.plan_cache.info()
+    PlanCacheInfo(hits=..., misses=..., entries=..., nbytes=..., max_bytes=134217728)
+    >>> ctfr.plan_cache.resize(2**29) # For workers that alternate between many parameter sets.
+    """
+
+    def __init__(self, max_bytes: int = 2**27):
+        self._lock = Lock()
+        self._plans = _LRUCache(_check_max_bytes(max_bytes))
+        self._hits = self._misses = 0
+
+    @property
+    def max_bytes(self) -> int:
+        """Maximum total size in bytes of the cached plans."""
+        return self._plans.max_bytes
+
+    def info(self) -> PlanCacheInfo:
+        """Returns the cache statistics.
+
+        Returns
+        -------
+        PlanCacheInfo
+            named tuple with the number of ``hits`` and ``misses``, the number of ``entries`` and their total size ``nbytes``, and ``max_bytes``.
+        """
+        with self._lock:
+            return PlanCacheInfo(self._hits, self._misses, len(self._plans), self._plans.nbytes, self._plans.max_bytes)
+
+    def clear(self) -> None:
+        """Removes all cached plans and resets the statistics."""
+        with self._lock:
+            self._plans.clear()
+            self._hits = self._misses = 0
+
+    def resize(self, max_bytes: int) -> None:
+        """Sets the maximum total size in bytes of the cached plans, evicting the least recently used plans as needed.
+
+        Parameters
+        ----------
+        max_bytes : int >= 0
+            new maximum total size in bytes.
+
+        Raises
+        ------
+        :external:class:`ValueError`
+            If ``max_bytes`` is negative.
+        """
+        max_bytes = _check_max_bytes(max_bytes)
+        with self._lock:
+            self._plans.resize(max_bytes)
+
+    def _get(self, key, build, *args):
+        """Returns the plan for a key, building it as build(*args) and caching it on a miss. Built plans are made read-only."""
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._hits += 1
+                return plan
+            self._misses += 1
+        # Plans are built without holding the lock, so concurrent misses of the same key may build it more than once.
+        plan = build(*args)
+        nbytes = _set_read_only(plan)
+        with self._lock:
+            self._plans.put(key, plan, nbytes)
+        return plan
+
+    def __repr__(self):
+        return f"PlanCache(max_bytes={self.max_bytes})"
+
+def _check_max_bytes(max_bytes):
+    max_bytes = int(max_bytes)
+    if max_bytes < 0:
+        raise ValueError("The 'max_bytes' parameter must be a nonnegative integer.")
+    return max_bytes
+
+def _set_read_only(plan):
+    """Makes the arrays of a plan (arrays, sparse matrices and tuples or lists of them) read-only, and returns their total size in bytes."""
+    if isinstance(plan, np.ndarray):
+        plan.flags.writeable = False
+        return plan.nbytes
+    if isinstance(plan, (tuple, list)):
+        return sum(_set_read_only(item) for item in plan)
+    if hasattr(plan, "data") and hasattr(plan, "indices") and hasattr(plan, "indptr"): # Compressed sparse matrix.
+        return sum(_set_read_only(array) for array in (plan.data, plan.indices, plan.indptr))
+    return 0
+
+# Prefix of the files stored by SpecsCache, so clearing the cache doesn't remove unrelated files.
+_DISK_PREFIX = "ctfr_specs_"
+
+class _LRUCache:
+    """Least recently used mapping bounded by the total size of its values, as declared when they are inserted. Not thread-safe."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict() # key -> (value, nbytes)
+
+    def get(self, key):
+        """Returns the value for a key, marking it as the most recently used, or None if the key is not cached."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, nbytes):
+        """Inserts a value, evicting the least recently used values as needed. Values larger than max_bytes are not inserted."""
+        self.pop(key)
+        if nbytes > self.max_bytes:
+            return
+        self._entries[key] = (value, nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted_nbytes) = self._entries.popitem(last=False)
+            self.nbytes -= evicted_nbytes
+
+    def resize(self, max_bytes):
+        """Sets max_bytes, evicting the least recently used values as needed."""
+        self.max_bytes = max_bytes
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted_nbytes) = self._entries.popitem(last=False)
+            self.nbytes -= evicted_nbytes
+
+    def pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[1]
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+# Process-wide plan cache, exported as ctfr.plan_cache.
+plan_cache = PlanCache()
@@ -1,9 +1,22 @@
-from ctfr.exception import (
-    InvalidCombinationMethodError,
+import numpy as np
+from collections import namedtuple
+from typing import Any, Callable, Dict, Iterable, List, Union
+from ctfr.utils.private import (
+    _get_method_citations,
+    _get_method_parameters,
+    _get_method_entry,
+    _get_methods_dict,
+    _get_method_dtypes,
+    _request_tfrs_info,
+    _request_shared_intermediates,
+    _is_thread_safe,
+    _supports_streaming,
+    _get_method_memory,
+    _register_method,
+    _unregister_method,
 )
-from ctfr.utils.private import _get_method_citations, _get_method_parameters
-from ctfr.methods_dict import _methods_dict
-from warnings import warn
+
+MethodCapabilities = namedtuple("MethodCapabilities", ["dtypes", "request_tfrs_info", "request_shared_intermediates", "thread_safe", "streaming", "memory"])
 
 def show_methods():
     """Prints information for all installed combination methods.
@@ -13,7 +26,7 @@ def show_methods():
     ctfr.get_methods_list
     """
     print("Available combination methods:")
-    for key, val in _methods_dict.items():
+    for key, val in _get_methods_dict().items():
         print(f"- {val['name']} -- {key}")
 
 def show_method_params(method: str):
@@ -36,7 +49,7 @@ def show_method_params(method: str):
         for key, val in parameters.items():
             print(f"- {key} ({val['type_and_info']}, optional): {val['description']}")
     else:
-        print(f"Method '{_methods_dict[method]['name']}' has no parameters.")
+        print(f"Method '{_get_method_entry(method)['name']}' has no parameters.")
 
 def cite_method(method: str):
     """Prints the citation information for a combination method.
@@ -59,7 +72,7 @@ def cite_method(method: str):
     if citations:
         print("\n".join(citations))
     else:
-        print(f"No citation available for method '{_methods_dict[method]['name']}'.")
+        print(f"No citation available for method '{_get_method_entry(method)['name']}'.")
 
 def get_methods_list():
     """Returns a list of all installed combination methods' keys.
@@ -75,7 +88,7 @@ def get_methods_list():
     --------
     ctfr.show_methods
     """
-    return list(_methods_dict.keys())
+    return list(_get_methods_dict().keys())
 
 def get_method_name(key):
     """Returns the name for a given combination method key.
@@ -97,7 +110,143 @@ def get_method_name(key):
     ctfr.exception.InvalidCombinationMethodError
         If the given key is not a valid combination method.
     """
-    try:
-        return _methods_dict[key]["name"]
-    except KeyError:
-        raise InvalidCombinationMethodError(f"Invalid combination method: {key}")
+    return _get_method_entry(key)["name"]
+
+def get_method_capabilities(method: str) -> MethodCapabilities:
+    """Returns the capabilities advertised by a combination method.
+
+    Parameters
+    ----------
+    method : str
+        The key of the combination method.
+
+    Returns
+    -------
+    MethodCapabilities
+        named tuple with the following fields:
+
+        - ``dtypes``: data types of the spectrograms tensor supported by the method, in order of preference. Tensors of other data types are converted to the first one, and the result is converted back.
+        - ``request_tfrs_info``: whether the method receives information about the TFRs when called from :func:`ctfr.ctfr`.
+        - ``request_shared_intermediates``: whether the method shares intermediate results with other combinations in :func:`ctfr.ctfr_multi`.
+        - ``thread_safe``: whether the method can be called concurrently from multiple threads. Calls to methods that aren't thread-safe are serialized.
+        - ``streaming``: whether the method can be used with :func:`ctfr.ctfr_stream` and :class:`ctfr.CTFRProcessor`.
+        - ``memory``: order of the memory allocated by the method for a tensor of P spectrograms with K x M bins, either ``"KM"`` or ``"PKM"``, or `None` if unknown.
+
+    Raises
+    ------
+    ctfr.exception.InvalidCombinationMethodError
+        If the combination method is invalid.
+    """
+    return MethodCapabilities(
+        dtypes = _get_method_dtypes(method),
+        request_tfrs_info = _request_tfrs_info(method),
+        request_shared_intermediates = _request_shared_intermediates(method),
+        thread_safe = _is_thread_safe(method),
+        streaming = _supports_streaming(method),
+        memory = _get_method_memory(method)
+    )
+
+def register_method(
+    key: str,
+    function: Union[Callable, str],
+    *,
+    name: str = None,
+    citations: List[str] = None,
+    parameters: Dict[str, Dict[str, str]] = None,
+    time_lobe: Callable[..., int] = None,
+    request_tfrs_info: bool = False,
+    request_shared_intermediates: bool = False,
+    dtypes: Iterable[np.dtype] = (np.float32, np.float64),
+    thread_safe: bool = True,
+    memory: str = None,
+    stream_state: Union[type, str] = None,
+    overwrite: bool = False
+):
+    """Registers a combination method, which can then be used as any installed method.
+
+    The arguments correspond to the fields of a method entry, which are described in :ref:`adding methods`. Methods can also be provided by other packages through the ``"ctfr.methods"`` entry points group, which are discovered when an unregistered method is first requested or when the methods are listed.
+
+    Parameters
+    ----------
+    key : str
+        key of the method, used as ``method=key`` and in the ``ctfr.methods`` aliases. It must be a valid identifier that doesn't start with an underscore or end with ``"_from_specs"``.
+    function : callable or str
+        wrapper function of the method, or its import path in the form ``"module:function"``, in which case the module is only imported when the method is first used.
+    name : str, optional
+        name of the method. Defaults to ``key``.
+    citations : list of str, optional
+        citations of the method, in IEEE style.
+    parameters : dict, optional
+        description of the method's parameters.
+    time_lobe : callable, optional
+        function that receives the method's keyword arguments and returns the number of neighboring time frames, on each side, used to compute each output frame. Required for streaming.
+    request_tfrs_info : bool, default=False
+        whether the method receives information about the TFRs through the ``_info`` argument.
+    request_shared_intermediates : bool, default=False
+        whether the method shares intermediate results through the ``_shared`` argument.
+    dtypes : Iterable[np.dtype], default=(np.float32, np.float64)
+        data types of the spectrograms tensor supported by the method, in order of preference.
+    thread_safe : bool, default=True
+        whether the method can be called concurrently from multiple threads.
+    memory : {"KM", "PKM"}, optional
+        order of the memory allocated by the method for a tensor of P spectrograms with K x M bins.
+    stream_state : class or str, optional
+        class (or its import path in the form ``"module:class"``) whose instances keep the method's state between the blocks of a stream, so each frame is only processed once. Requires ``time_lobe``.
+    overwrite : bool, default=False
+        whether to replace a method already registered with the same key.
+
+    Raises
+    ------
+    :external:class:`ValueError`
+        If the key is invalid or already registered (and ``overwrite`` is `False`), or if ``function``, ``dtypes``, ``memory`` or ``stream_state`` are invalid.
+
+    See Also
+    --------
+    ctfr.unregister_method
+
+    Examples
+    --------
+    >>> ctfr.register_method("max", lambda X: np.max(X, axis=0), name="Binwise maximum", time_lobe=lambda **kwargs: 0)
+    >>> ctfr.methods.max_from_specs(specs)
+    """
+    _register_method(
+        key,
+        function,
+        name = name,
+        citations = citations,
+        parameters = parameters,
+        time_lobe = time_lobe,
+        request_tfrs_info = request_tfrs_info,
+        request_shared_intermediates = request_shared_intermediates,
+        dtypes = dtypes,
+        thread_safe = thread_safe,
+        memory = memory,
+        stream_state = stream_state,
+        overwrite = overwrite
+    )
+
+def unregister_method(key: str):
+    """Removes a registered combination method.
+
+    Parameters
+    ----------
+    key : str
+        The key of the combination method.
+
+    Raises
+    ------
+    ctfr.exception.InvalidCombinationMethodError
+        If the given key is not a valid combination method.
+
+    See Also
+    --------
+    ctfr.register_method
+    """
+    _unregister_method(key)
+    _remove_method_aliases(key)
+
+def _remove_method_aliases(key):
+    """Removes the ctfr.methods aliases of a removed method, if they were built."""
+    import ctfr.methods
+    for alias in (key, key + "_from_specs"):
+        vars(ctfr.methods).pop(alias, None)
@@ -1,7 +1,24 @@
 import numpy as np
-from ctfr.exception import InvalidCombinationMethodError
+from functools import wraps
+from importlib import import_module
+from threading import RLock, Lock
+from warnings import warn
+from ctfr.exception import InvalidCombinationMethodError, StreamingNotSupportedError
+from ctfr.warning import MethodNotLoadedWarning
 from ctfr.methods_dict import _methods_dict
 
+_ENTRY_POINTS_GROUP = "ctfr.methods"
+_SUPPORTED_DTYPES = ("float32", "float64")
+_MEMORY_ORDERS = ("KM", "PKM")
+_ENTRY_FIELDS = (
+    "name", "function", "citations", "parameters", "time_lobe", "request_tfrs_info", "request_shared_intermediates",
+    "dtypes", "thread_safe", "memory", "stream_state"
+)
+
+_method_functions = {} # Resolved wrapper functions, by method key.
+_registry_lock = RLock()
+_entry_points_loaded = False
+
 def _round_to_power_of_two(number, mode):
     if mode == "ceil":
         return int(2 ** np.ceil(np.log2(number)))
@@ -13,15 +30,59 @@ def _round_to_power_of_two(number, mode):
         raise ValueError(f"Invalid mode: {mode}")
 
 def _get_method_entry(key):
-    """Get the entry in the methods dictionary for a given key."""
+    """Get the entry in the methods dictionary for a given key. Methods advertised through entry points are discovered on the first lookup of an unregistered key."""
+    try:
+        return _methods_dict[key]
+    except KeyError:
+        pass
+    _load_entry_point_methods()
     try:
         return _methods_dict[key]
     except KeyError:
         raise InvalidCombinationMethodError(f"Invalid combination method: {key}")
 
+def _get_methods_dict():
+    """Get the methods dictionary, including the methods advertised through entry points."""
+    _load_entry_point_methods()
+    return _methods_dict
+
 def _get_method_function(key):
-    """Get the wrapper function for a given method key.""" 
-    return _get_method_entry(key)["function"]
+    """Get the wrapper function for a given method key. Functions specified by import path ("module:function") are imported on first use, and functions of methods that aren't thread-safe are serialized with a lock."""
+    function = _method_functions.get(key)
+    if function is None:
+        entry = _get_method_entry(key)
+        function = entry["function"]
+        if isinstance(function, str):
+            function = _import_from_path(function)
+        if not entry.get("thread_safe", True):
+            function = _serialized(function)
+        with _registry_lock:
+            # Threads resolving the function concurrently must share the same lock.
+            function = _method_functions.setdefault(key, function)
+    return function
+
+def _import_from_path(path):
+    """Imports an object from its import path, in the form "module:attribute"."""
+    module_name, _, attribute = path.partition(":")
+    return getattr(import_module(module_name), attribute)
+
+def _serialized(function):
+    """Wraps a function so that concurrent calls from multiple threads run one at a time."""
+    lock = Lock()
+    @wraps(function)
+    def _function(*args, **kwargs):
+        with lock:
+            return function(*args, **kwargs)
+    return _function
+
+def _apply_method(key, specs_tensor, kwargs):
+    """Combines a spectrograms tensor with a method. A tensor of a data type not supported by the method is converted to the first supported one, and the result is converted back to the data type of the tensor."""
+    function = _get_method_function(key)
+    dtypes = _get_method_dtypes(key)
+    if specs_tensor.dtype in dtypes:
+        return function(specs_tensor, **kwargs)
+    comb_spec = function(specs_tensor.astype(dtypes[0]), **kwargs)
+    return np.asarray(comb_spec).astype(specs_tensor.dtype, copy=False)
 
 def _get_method_citations(key):
     return _get_method_entry(key).get("citations", [])
@@ -30,4 +91,105 @@ def _get_method_parameters(key):
     return _get_method_entry(key).get("parameters", None)
 
 def _request_tfrs_info(key):
-    return _get_method_entry(key).get("request_tfrs_info", False)
\ No newline at end of file
+    return _get_method_entry(key).get("request_tfrs_info", False)
+
+def _request_shared_intermediates(key):
+    return _get_method_entry(key).get("request_shared_intermediates", False)
+
+def _get_method_dtypes(key):
+    """Get the data types of the spectrograms tensor supported by a method, in order of preference."""
+    return tuple(np.dtype(dtype) for dtype in _get_method_entry(key).get("dtypes", _SUPPORTED_DTYPES))
+
+def _is_thread_safe(key):
+    return _get_method_entry(key).get("thread_safe", True)
+
+def _get_method_memory(key):
+    return _get_method_entry(key).get("memory", None)
+
+def _supports_streaming(key):
+    return _get_method_entry(key).get("time_lobe", None) is not None
+
+def _get_method_time_lobe(key, kwargs):
+    """Get the number of neighboring time frames (on each side) used by a method to compute each output frame."""
+    time_lobe = _get_method_entry(key).get("time_lobe", None)
+    if time_lobe is None:
+        raise StreamingNotSupportedError(f"Combination method '{key}' does not support streaming.")
+    return time_lobe(**kwargs)
+
+def _get_method_stream_state(key, kwargs):
+    """Creates the stream state of a method for its keyword arguments, or returns None if the method doesn't have one. Classes specified by import path ("module:class") are imported on first use."""
+    stream_state = _get_method_entry(key).get("stream_state", None)
+    if stream_state is None:
+        return None
+    if isinstance(stream_state, str):
+        stream_state = _import_from_path(stream_state)
+    return stream_state(**kwargs)
+
+def _register_method(key, function, *, overwrite=False, **fields):
+    """Validates a method entry and adds it to the methods dictionary. See ctfr.register_method."""
+    if not isinstance(key, str) or not key.isidentifier() or key.startswith("_") or key.endswith("_from_specs"):
+        raise ValueError(f"Invalid combination method key: {key!r}. Keys must be valid identifiers that don't start with an underscore or end with '_from_specs'.")
+    if not (callable(function) or (isinstance(function, str) and ":" in function)):
+        raise ValueError(f"The 'function' of combination method '{key}' must be a callable or an import path in the form 'module:function'.")
+    stream_state = fields.get("stream_state", None)
+    if not (stream_state is None or callable(stream_state) or (isinstance(stream_state, str) and ":" in stream_state)):
+        raise ValueError(f"The 'stream_state' of combination method '{key}' must be a class or an import path in the form 'module:class'.")
+    unknown_fields = set(fields) - set(_ENTRY_FIELDS)
+    if unknown_fields:
+        raise ValueError(f"Unknown fields for combination method '{key}': {', '.join(sorted(unknown_fields))}.")
+
+    entry = {key_: value for key_, value in fields.items() if value is not None}
+    entry["name"] = entry.get("name", key)
+    entry["function"] = function
+    if "dtypes" in entry:
+        entry["dtypes"] = _check_method_dtypes(key, entry["dtypes"])
+    if entry.get("memory", None) not in (None, *_MEMORY_ORDERS):
+        raise ValueError(f"Invalid 'memory' for combination method '{key}': {entry['memory']!r}. Supported values are {', '.join(map(repr, _MEMORY_ORDERS))}.")
+
+    with _registry_lock:
+        if key in _methods_dict and not overwrite:
+            raise ValueError(f"Combination method '{key}' is already registered. Use overwrite=True to replace it.")
+        _methods_dict[key] = entry
+        _method_functions.pop(key, None)
+
+def _unregister_method(key):
+    """Removes a method from the methods dictionary. See ctfr.unregister_method."""
+    with _registry_lock:
+        _get_method_entry(key)
+        del _methods_dict[key]
+        _method_functions.pop(key, None)
+
+def _check_method_dtypes(key, dtypes):
+    """Validates the data types supported by a method, returning them as a tuple of names."""
+    try:
+        dtypes = tuple(np.dtype(dtype).name for dtype in dtypes)
+    except TypeError:
+        dtypes = ()
+    if not dtypes or not set(dtypes) <= set(_SUPPORTED_DTYPES):
+        raise ValueError(f"Invalid 'dtypes' for combination method '{key}'. It must be a non-empty iterable of np.float32 and np.float64.")
+    return dtypes
+
+def _load_entry_point_methods():
+    """Registers the methods advertised by installed packages in the "ctfr.methods" entry points group, only once.
+
+    Each entry point is named after the method key and refers either to a method entry (a dictionary with the fields of _methods_dict) or to the method's wrapper function. Methods that fail to load, or whose keys are already registered, are skipped with a warning.
+    """
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    with _registry_lock:
+        if _entry_points_loaded:
+            return
+        _entry_points_loaded = True
+        from importlib.metadata import entry_points
+        for entry_point in entry_points(group=_ENTRY_POINTS_GROUP):
+            if entry_point.name in _methods_dict:
+                warn(f"Combination method '{entry_point.name}' from entry point '{entry_point.value}' was not loaded, as its key is already registered.", MethodNotLoadedWarning)
+                continue
+            try:
+                entry = entry_point.load()
+                if not isinstance(entry, dict):
+                    entry = {"function": entry}
+                _register_method(entry_point.name, **entry)
+            except Exception as e:
+                warn(f"Combination method '{entry_point.name}' from entry point '{entry_point.value}' could not be loaded: {e}", MethodNotLoadedWarning)
@@ -0,0 +1,206 @@
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Callable
+
+StageRecord = namedtuple("StageRecord", ["name", "path", "depth", "wall_time", "allocated_bytes", "peak_bytes", "shape", "dtype", "info"])
+StageRecord.__doc__ = """Measurements of a computation stage recorded by :func:`ctfr.profile`.
+
+Attributes
+----------
+name : str
+    name of the stage, such as ``"spectrograms"``, ``"combination"`` or ``"local_energy"``.
+path : str
+    names of the enclosing stages and of the stage, separated by ``"/"``, such as ``"combination/local_energy"``.
+depth : int
+    number of enclosing stages.
+wall_time : float
+    wall time of the stage, in seconds.
+allocated_bytes : int or None
+    memory allocated during the stage and not released at its end, in bytes. None if memory is not traced.
+peak_bytes : int or None
+    peak memory allocated during the stage, relative to its start, in bytes. None if memory is not traced.
+shape : tuple or None
+    shape of the array produced by the stage, if any.
+dtype : str or None
+    data type of the array produced by the stage, if any.
+info : dict
+    additional information about the stage, such as the combination method.
+"""
+
+class Profile:
+    """Stage measurements recorded by :func:`ctfr.profile`.
+
+    Attributes
+    ----------
+    records : list[StageRecord]
+        measurements of each stage, in the order the stages started. Stages within other stages come after their enclosing stage.
+    """
+
+    def __init__(self, callback=None, trace_memory=False):
+        self.callback = callback
+        self.trace_memory = trace_memory
+        self.records = []
+        self._stack = []
+
+    def summary(self) -> dict:
+        """Aggregates the records by stage path.
+
+        Returns
+        -------
+        dict[str, dict]
+            mapping from stage paths to dictionaries with the number of ``calls`` and the total ``wall_time``, ``allocated_bytes`` and maximum ``peak_bytes`` of the stages with that path, in the order the paths first appeared.
+        """
+        summary = {}
+        for record in self.records:
+            if record is None: # Stage still running.
+                continue
+            entry = summary.setdefault(record.path, {"calls": 0, "wall_time": 0.0, "allocated_bytes": None, "peak_bytes": None})
+            entry["calls"] += 1
+            entry["wall_time"] += record.wall_time
+            if record.allocated_bytes is not None:
+                entry["allocated_bytes"] = (entry["allocated_bytes"] or 0) + record.allocated_bytes
+                entry["peak_bytes"] = max(entry["peak_bytes"] or 0, record.peak_bytes)
+        return summary
+
+    def report(self) -> str:
+        """Returns a table with the aggregated measurements of each stage path. See :meth:`summary`.
+
+        Returns
+        -------
+        str
+            the formatted table.
+        """
+        lines = [f"{'stage':<40} {'calls':>6} {'time (ms)':>12} {'allocated (MiB)':>16} {'peak (MiB)':>12}"]
+        for path, entry in self.summary().items():
+            depth = path.count("/")
+            name = "  " * depth + path.rsplit("/", 1)[-1]
+            allocated = "-" if entry["allocated_bytes"] is None else f"{entry['allocated_bytes'] / 2**20:.2f}"
+            peak = "-" if entry["peak_bytes"] is None else f"{entry['peak_bytes'] / 2**20:.2f}"
+            lines.append(f"{name:<40} {entry['calls']:>6} {entry['wall_time'] * 1e3:>12.3f} {allocated:>16} {peak:>12}")
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return f"Profile(records={len(self.records)}, trace_memory={self.trace_memory})"
+
+_active_profile = ContextVar("ctfr_active_profile", default=None)
+
+@contextmanager
+def profile(callback: Callable[[StageRecord], Any] = None, trace_memory: bool = False):
+    """Context manager that records the wall time, memory and output shape of each stage of the computations done in its context.
+
+    Within the context, calls to :func:`ctfr.ctfr`, :func:`ctfr.ctfr_from_specs` and the functions built on them (such as :func:`ctfr.ctfr_multi`) record their stages: the spectrograms computation (``"spectrograms"``) or stacking (``"stack"``), the input normalization (``"normalize_input"``), the combination (``"combination"``) and the output normalization (``"normalize_output"``). The included Cython combination methods also record their own stages within ``"combination"``, such as ``"local_energy"``, ``"local_sparsity"`` and ``"combination"`` for SLS-I, or ``"smearing"`` and ``"combination"`` for LT.
+
+    Parameters
+    ----------
+    callback : Callable[[StageRecord], Any], optional
+        function called with the :class:`~ctfr.utils.profiling.StageRecord` of each stage when it ends, such as a logging function.
+    trace_memory : bool, default=False
+        whether to record the memory allocated in each stage, using :mod:`tracemalloc`. Tracing memory makes the computations slower. If :mod:`tracemalloc` is not already tracing, it's started when entering the context and stopped when exiting it.
+
+    Yields
+    ------
+    ~ctfr.utils.profiling.Profile
+        object whose ``records`` attribute is filled with the :class:`~ctfr.utils.profiling.StageRecord` of each stage.
+
+    Notes
+    -----
+    Stages are only recorded in the thread (or asynchronous task) in which the context was entered, so computations run by other threads or processes, as in :func:`ctfr.ctfr_batch` with multiple workers, are not recorded.
+
+    Examples
+    --------
+    >>> with ctfr.profile() as prof:
+    ...     comb_spec = ctfr.ctfr(signal, sr, "sls_i")
+    >>> print(prof.report())
+    stage                                     calls    time (ms)  allocated (MiB)   peak (MiB)
+    spectrograms                                  1       20.718                -            -
+    normalize_input                               1        1.107                -            -
+    combination                                   1     1425.260                -            -
+      local_energy                                1       15.873                -            -
+      local_sparsity                              1     1393.455                -            -
+      combination                                 1       15.224                -            -
+    normalize_output                              1        0.184                -            -
+    """
+    prof = Profile(callback, trace_memory)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    token = _active_profile.set(prof)
+    try:
+        yield prof
+    finally:
+        _active_profile.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+class _Stage:
+    """Handle of a running stage, used to attach its output and additional information to its record."""
+
+    def __init__(self, name, path, info):
+        self.name = name
+        self.path = path
+        self.info = info
+        self.shape = None
+        self.dtype = None
+        self.child_peak = 0
+
+    def set_output(self, array):
+        self.shape = tuple(array.shape)
+        self.dtype = str(array.dtype)
+
+    def add_info(self, **info):
+        self.info.update(info)
+
+class _NullStage:
+    """Stage handle used when no profile is active."""
+
+    def set_output(self, array):
+        pass
+
+    def add_info(self, **info):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+@contextmanager
+def _profile_stage(name, **info):
+    """Records a stage in the active profile, if any. Yields a handle with the methods set_output(array) and add_info(**info)."""
+    prof = _active_profile.get()
+    if prof is None:
+        yield _NULL_STAGE
+        return
+
+    parent = prof._stack[-1] if prof._stack else None
+    stage = _Stage(name, name if parent is None else f"{parent.path}/{name}", info)
+    index = len(prof.records)
+    prof.records.append(None) # Reserves the position, so records are ordered by start.
+    prof._stack.append(stage)
+
+    trace_memory = prof.trace_memory and tracemalloc.is_tracing()
+    if trace_memory:
+        # The peak is reset for each stage, so the peak of the enclosing stage so far is kept in its handle.
+        memory_start, peak = tracemalloc.get_traced_memory()
+        if parent is not None:
+            parent.child_peak = max(parent.child_peak, peak)
+        tracemalloc.reset_peak()
+
+    start = perf_counter()
+    try:
+        yield stage
+    finally:
+        wall_time = perf_counter() - start
+        allocated_bytes = peak_bytes = None
+        if trace_memory:
+            memory_end, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, stage.child_peak)
+            if parent is not None:
+                parent.child_peak = max(parent.child_peak, peak)
+            allocated_bytes, peak_bytes = memory_end - memory_start, peak - memory_start
+        prof._stack.pop()
+
+        record = StageRecord(stage.name, stage.path, len(prof._stack), wall_time, allocated_bytes, peak_bytes, stage.shape, stage.dtype, stage.info)
+        prof.records[index] = record
+        if prof.callback is not None:
+            prof.callback(record)
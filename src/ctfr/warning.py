@@ -6,4 +6,7 @@ class FunctionNotBuiltWarning(Warning_):
     pass
 
 class ArgumentChangeWarning(Warning_):
-    pass
\ No newline at end of file
+    pass
+
+class MethodNotLoadedWarning(Warning_):
+    pass
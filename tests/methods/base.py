@@ -16,6 +16,13 @@ class BaseMethodTest():
         assert result.dtype == np.double
         assert np.allclose(result, 0)
 
+    def test_float32_output(self, func):
+        """Test that single precision input is kept in single precision and matches the double precision output."""
+        X = np.random.default_rng(0).random((3, 8, 10))
+        result = func(X.astype(np.float32))
+        assert result.dtype == np.float32
+        assert np.allclose(result, func(X), rtol=1e-4, atol=1e-6)
+
     def test_incorrect_arguments(self, func):
         """Test incorrect argument types/values. Override this in derived classes if the method has parameters."""
         pass
@@ -1,7 +1,12 @@
+import threading
+import time
+import numpy as np
 import pytest
 from ctfr.utils.private import _get_method_function
 from .base import BaseMethodTest
 from ctfr.warning import ArgumentChangeWarning
+from ctfr.implementations.fls_cy import _fls_log_suitability, _fls_wrapper
+from ctfr.implementations.local_energy import _get_active_bins
 
 @pytest.fixture
 def func():
@@ -22,4 +27,76 @@ class TestFls(BaseMethodTest):
         with pytest.warns(ArgumentChangeWarning):
             func(self.X, lm=10) # lm not odd
         with pytest.warns(ArgumentChangeWarning):
-            func(self.X, gamma=-1) # gamma negative 
\ No newline at end of file
+            func(self.X, gamma=-1) # gamma negative
+        with pytest.warns(ArgumentChangeWarning):
+            func(self.X, n_jobs=0) # n_jobs not positive
+
+    def test_weighted_mean(self, func):
+        """Test that the combination matches the weighted mean of the spectrograms with the local suitability weights."""
+        X = np.random.default_rng(0).exponential(size=(3, 40, 30))
+        log_suitability = _fls_log_suitability(X, 21, 11, 1, 1e-10)
+        weights = np.exp(2 * 20.0 * (log_suitability - np.max(log_suitability, axis=0)))
+        assert np.allclose(func(X), np.average(X, axis=0, weights=weights), rtol=1e-12, atol=0)
+
+    @pytest.mark.parametrize("n_jobs", [2, 3])
+    def test_n_jobs(self, func, n_jobs):
+        """Test that the result doesn't depend on the number of threads."""
+        X = np.random.default_rng(0).exponential(size=(3, 40, 30))
+        assert np.array_equal(func(X, n_jobs=n_jobs), func(X))
+
+    def test_shared_log_suitability(self, func):
+        """Test that the result with the shared local suitability tensor is identical to the one computed spectrogram by spectrogram."""
+        X = np.random.default_rng(0).exponential(size=(3, 40, 30))
+        shared = {}
+        assert np.array_equal(func(X, _shared=shared), func(X))
+        assert np.array_equal(func(X, gamma=5.0, _shared=shared), func(X, gamma=5.0))
+
+    def test_energy_criterium(self, func):
+        """Test that the energy criterium only replaces the combination with the binwise minimum in low-energy bins."""
+        X = np.random.default_rng(0).exponential(size=(3, 40, 30))
+        X[:, :, :12] *= 1e-3
+        result = func(X)
+        assert np.array_equal(func(X, energy_criterium_db=-np.inf), result)
+        assert np.array_equal(func(X, energy_criterium_db=np.inf), np.min(X, axis=0))
+        active = _get_active_bins(X, 21, 11, -10).astype(bool)
+        assert 0 < np.count_nonzero(active) < active.size
+        gated = func(X, energy_criterium_db=-10)
+        assert np.allclose(gated[active], result[active], rtol=1e-12, atol=0)
+        assert np.array_equal(gated[~active], np.min(X, axis=0)[~active])
+        # The shared local suitability is only computed in the active bins, so it's not shared with ungated combinations.
+        shared = {}
+        assert np.array_equal(func(X, energy_criterium_db=-10, _shared=shared), gated)
+        assert np.array_equal(func(X, _shared=shared), result)
+        assert set(shared) == {("fls_log_suitability", 21, 11, -10), ("fls_log_suitability", 21, 11, None)}
+
+    def test_energy_criterium_regions(self, func):
+        """Test that the local sparsity in separate high-energy regions, some at the borders, matches the ungated one."""
+        X = 1e-4 * np.random.default_rng(0).exponential(size=(3, 80, 90))
+        X[:, 0:6, 0:8] *= 1e4
+        X[:, 40:50, 30:45] *= 1e4
+        X[:, 70:80, 80:90] *= 1e4
+        active = _get_active_bins(X, 21, 11, -10).astype(bool)
+        gated = func(X, energy_criterium_db=-10)
+        assert np.allclose(gated[active], func(X)[active], rtol=1e-12, atol=0)
+        assert np.array_equal(gated[~active], np.min(X, axis=0)[~active])
+
+    def test_combination_releases_gil(self):
+        """Test that another Python thread makes progress while the FLS combination runs."""
+        X = np.random.default_rng(0).random((6, 512, 1024))
+        # With a precomputed local suitability, the call is almost entirely the combination.
+        shared = {("fls_log_suitability", 21, 11, None): _fls_log_suitability(X, 21, 11, 1, 1e-10)}
+        start = time.perf_counter()
+        _fls_wrapper(X, _shared=shared)
+        duration = time.perf_counter() - start
+
+        thread = threading.Thread(target=_fls_wrapper, args=(X,), kwargs={"_shared": shared})
+        last = time.perf_counter()
+        max_gap = 0.0
+        thread.start()
+        while thread.is_alive():
+            now = time.perf_counter()
+            max_gap = max(max_gap, now - last)
+            last = now
+        thread.join()
+        # If the GIL were held, this thread would be blocked for the whole combination.
+        assert max_gap < duration / 2
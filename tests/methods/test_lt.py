@@ -1,6 +1,8 @@
 import pytest
+import numpy as np
 from ctfr.utils.private import _get_method_function
 from .base import BaseMethodTest
+from ctfr.implementations.local_energy import _get_active_bins
 from ctfr.warning import ArgumentChangeWarning
 
 @pytest.fixture
@@ -15,6 +17,8 @@ class TestLt(BaseMethodTest):
             func(self.X, lm="string")
         with pytest.raises(ValueError):
             func(self.X, eta="string")
+        with pytest.raises(ValueError):
+            func(self.X, n_jobs="string")
 
     def test_parameter_changes(self, func):
         with pytest.warns(ArgumentChangeWarning):
@@ -22,4 +26,28 @@ class TestLt(BaseMethodTest):
         with pytest.warns(ArgumentChangeWarning):
             func(self.X, lm=10) # lm not odd
         with pytest.warns(ArgumentChangeWarning):
-            func(self.X, eta=-1) # eta negative 
\ No newline at end of file
+            func(self.X, eta=-1) # eta negative 
+        with pytest.warns(ArgumentChangeWarning):
+            func(self.X, n_jobs=0) # n_jobs not positive
+
+    def test_n_jobs(self, func):
+        """Test that the multithreaded computation is bit-identical to the serial one."""
+        X = np.random.default_rng(0).random((3, 40, 30))
+        result = func(X, n_jobs=1)
+        for n_jobs in (2, 4, 7):
+            assert np.array_equal(func(X, n_jobs=n_jobs), result)
+
+    def test_energy_criterium(self, func):
+        """Test that the energy criterium only replaces the combination with the binwise minimum in low-energy bins."""
+        # The low-energy region is surrounded by high-energy bins, so the smearing is reinitialized after it.
+        X = np.random.default_rng(0).exponential(size=(3, 60, 30))
+        X[:, 15:45, 8:22] *= 1e-3
+        result = func(X)
+        assert np.array_equal(func(X, energy_criterium_db=-np.inf), result)
+        assert np.array_equal(func(X, energy_criterium_db=np.inf), np.min(X, axis=0))
+        active = _get_active_bins(X, 21, 11, -10).astype(bool)
+        assert 0 < np.count_nonzero(active) < active.size
+        gated = func(X, energy_criterium_db=-10)
+        assert np.array_equal(gated[active], result[active])
+        assert np.array_equal(gated[~active], np.min(X, axis=0)[~active])
+        assert np.array_equal(func(X, energy_criterium_db=-10, n_jobs=3), gated)
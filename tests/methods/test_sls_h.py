@@ -1,7 +1,9 @@
 import pytest
+import numpy as np
 from ctfr.utils.private import _get_method_function
 from .base import BaseMethodTest
 from ctfr.warning import ArgumentChangeWarning
+from ctfr.exception import InvalidSpecError
 
 @pytest.fixture
 def func():
@@ -21,6 +23,8 @@ class TestSlsH(BaseMethodTest):
             func(self.X, beta="string")
         with pytest.raises(ValueError):
             func(self.X, energy_criterium_db="string")
+        with pytest.raises(ValueError):
+            func(self.X, gini_mode="invalid")
 
     def test_parameter_changes(self, func):
         with pytest.warns(ArgumentChangeWarning):
@@ -32,4 +36,22 @@ class TestSlsH(BaseMethodTest):
         with pytest.warns(ArgumentChangeWarning):
             func(self.X, lsm=10) # lsm not odd
         with pytest.warns(ArgumentChangeWarning):
-            func(self.X, beta=-1) # beta negative 
\ No newline at end of file
+            func(self.X, beta=-1) # beta negative
+
+    @pytest.mark.parametrize("gini_mode", ["exact", "fast"])
+    def test_equivalence_to_sls_i(self, func, gini_mode):
+        # Without the energy criterium and interpolation, SLS-H and SLS-I compute the same combination.
+        X = np.random.default_rng(0).random((3, 12, 16))
+        sls_i = _get_method_function("sls_i")
+        assert np.allclose(
+            func(X, energy_criterium_db=-np.inf, gini_mode=gini_mode),
+            sls_i(X, interp_steps=np.ones((3, 2)), gini_mode=gini_mode)
+        )
+
+    @pytest.mark.parametrize("gini_mode", ["exact", "fast"])
+    @pytest.mark.parametrize("value", [np.nan, np.inf])
+    def test_non_finite_input(self, func, gini_mode, value):
+        X = self.X.copy()
+        X[1, 2, 2] = value
+        with pytest.raises(InvalidSpecError):
+            func(X, gini_mode=gini_mode)
@@ -3,7 +3,9 @@ import numpy as np
 from ctfr.utils.private import _get_method_function
 from .base import BaseMethodTest
 from ctfr.warning import ArgumentChangeWarning
-from ctfr.exception import ArgumentRequiredError
+from ctfr.exception import ArgumentRequiredError, InvalidSpecError
+from ctfr.implementations.sls_i_cy import _sls_i_log_sparsity, _get_interp_steps
+from ctfr import profile
 
 @pytest.fixture
 def func():
@@ -21,6 +23,13 @@ class TestSlsI(BaseMethodTest):
         assert result.dtype == np.double
         assert np.allclose(result, 0)
 
+    def test_float32_output(self, func, valid_steps):
+        # Override base test to include required interp_steps
+        X = np.random.default_rng(0).random((3, 8, 10))
+        result = func(X.astype(np.float32), interp_steps=valid_steps)
+        assert result.dtype == np.float32
+        assert np.allclose(result, func(X, interp_steps=valid_steps), rtol=1e-4, atol=1e-6)
+
     def test_incorrect_arguments(self, func, valid_steps):
         with pytest.raises(ArgumentRequiredError):
             func(self.X) # missing required interp_steps
@@ -34,6 +43,8 @@ class TestSlsI(BaseMethodTest):
             func(self.X, lsm="string", interp_steps=valid_steps)
         with pytest.raises(ValueError):
             func(self.X, beta="string", interp_steps=valid_steps)
+        with pytest.raises(ValueError):
+            func(self.X, gini_mode="invalid", interp_steps=valid_steps)
         with pytest.raises(ValueError):
             func(self.X, interp_steps="invalid")
         with pytest.raises(ValueError):
@@ -53,4 +64,84 @@ class TestSlsI(BaseMethodTest):
         with pytest.warns(ArgumentChangeWarning):
             func(self.X, lsm=10, interp_steps=valid_steps) # lsm not odd
         with pytest.warns(ArgumentChangeWarning):
-            func(self.X, beta=-1, interp_steps=valid_steps) # beta negative
\ No newline at end of file
+            func(self.X, beta=-1, interp_steps=valid_steps) # beta negative
+        with pytest.warns(ArgumentChangeWarning):
+            func(self.X, sparsity_tolerance=-1, interp_steps=valid_steps) # sparsity_tolerance negative
+
+    def test_fast_gini_mode(self):
+        # In fast mode, the local sparsity is the Gini index of the region weighted by a Hamming window in frequency only.
+        X = np.random.default_rng(0).random((2, 12, 30))
+        X[:, :, 5:9] = 0.0 # Repeated values.
+        lsk, lsm, epsilon = 5, 7, 1e-10
+        steps = np.array([[1, 1], [2, 3]])
+        sparsity = np.exp(_sls_i_log_sparsity(X, lsk, lsm, steps, True, epsilon))
+
+        X_padded = np.pad(X, ((0, 0), (lsk//2, lsk//2), (lsm//2, lsm//2)))
+        for p in range(2):
+            for k in range(0, 12, steps[p, 0]):
+                for m in range(0, 30, steps[p, 1]):
+                    region = np.sort((X_padded[p, k:k + lsk, m:m + lsm] * np.hamming(lsk)[:, np.newaxis]).ravel())
+                    N = region.size
+                    gini = 1 - 2 * np.sum(region * (N - np.arange(N) - 0.5) / N) / (np.sum(region) + epsilon)
+                    assert np.isclose(sparsity[p, k, m], epsilon + gini)
+
+    @pytest.mark.parametrize("gini_mode", ["exact", "fast"])
+    def test_adaptive_refinement(self, func, gini_mode):
+        """Test that refining every cell computes the local sparsity in every bin, and refining none matches the fixed interpolation."""
+        X = np.random.default_rng(0).random((3, 30, 25))
+        steps = np.array([[4, 3], [2, 5], [3, 3]])
+        assert np.array_equal(
+            func(X, interp_steps=steps, adaptive=True, energy_criterium_db=-np.inf, gini_mode=gini_mode),
+            func(X, interp_steps=np.ones((3, 2)), gini_mode=gini_mode)
+        )
+        assert np.array_equal(
+            func(X, interp_steps=steps, adaptive=True, energy_criterium_db=np.inf, sparsity_tolerance=np.inf, gini_mode=gini_mode),
+            func(X, interp_steps=steps, gini_mode=gini_mode)
+        )
+
+    def test_adaptive_high_energy_cells(self):
+        """Test that only the grid cells containing high-energy bins are refined when the sparsity tolerance is infinite."""
+        X = np.random.default_rng(0).random((1, 13, 13))
+        steps = np.array([[4, 4]])
+        high_energy = np.zeros(X.shape, dtype=np.uint8)
+        high_energy[0, 5, 6] = 1
+        exact = _sls_i_log_sparsity(X, 5, 5, np.ones((1, 2), dtype=np.long), False, 1e-10)
+        fixed = _sls_i_log_sparsity(X, 5, 5, steps, False, 1e-10)
+        adaptive = _sls_i_log_sparsity(X, 5, 5, steps, False, 1e-10, high_energy, np.inf)
+
+        refined = np.zeros(X.shape, dtype=bool)
+        refined[0, 4:9, 4:9] = True
+        assert np.array_equal(adaptive[refined], exact[refined])
+        assert np.array_equal(adaptive[~refined], fixed[~refined])
+
+    def test_cqt_default_steps(self):
+        info = {"representation_type": "cqt", "filter_scales": [1/3, 2/3, 1], "bins_per_octave": 36, "fmin": 32.7, "n_bins": 288, "hop_length": 256}
+        assert np.array_equal(_get_interp_steps(3, info, None), [[3, 1], [2, 1], [1, 1]])
+
+    def test_adaptive_default_steps(self):
+        """Test that the default interpolation grid is coarser in adaptive mode, and that given steps are kept."""
+        info = {"representation_type": "stft", "win_lengths": [256, 512, 1024], "hop_length": 128, "n_fft": 1024}
+        assert np.array_equal(_get_interp_steps(3, info, None), [[4, 1], [2, 2], [1, 4]])
+        assert np.array_equal(_get_interp_steps(3, info, None, adaptive=True), [[16, 4], [8, 8], [4, 16]])
+        assert np.array_equal(_get_interp_steps(3, info, [[2, 2]] * 3, adaptive=True), [[2, 2]] * 3)
+
+    def test_adaptive_saves_evaluations(self, func):
+        """Test that, with default parameters, the adaptive mode computes the local sparsity in fewer bins than the fixed interpolation when most of the time-frequency plane is low-energy."""
+        X = 1e-8 * np.random.default_rng(0).random((3, 257, 400))
+        X[:, :, :60] *= 1e8
+        info = {"representation_type": "stft", "win_lengths": [128, 256, 512], "hop_length": 64, "n_fft": 512}
+
+        def evaluated_fraction(**kwargs):
+            with profile() as prof:
+                func(X, _info=info, **kwargs)
+            return next(record for record in prof.records if record.name == "local_sparsity").info["evaluated_fraction"]
+
+        assert 0 < evaluated_fraction(adaptive=True) < evaluated_fraction()
+
+    @pytest.mark.parametrize("gini_mode", ["exact", "fast"])
+    @pytest.mark.parametrize("value", [np.nan, np.inf])
+    def test_non_finite_input(self, func, valid_steps, gini_mode, value):
+        X = self.X.copy()
+        X[1, 2, 2] = value
+        with pytest.raises(InvalidSpecError):
+            func(X, gini_mode=gini_mode, interp_steps=valid_steps)
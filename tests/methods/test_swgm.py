@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 from .base import BaseMethodTest
 from ctfr.utils.private import _get_method_function
@@ -19,4 +20,25 @@ class TestSwgm(BaseMethodTest):
         with pytest.warns(ArgumentChangeWarning):
             func(self.X, beta = -1.0)
         with pytest.warns(ArgumentChangeWarning):
-            func(self.X, max_gamma = 0.5)
\ No newline at end of file
+            func(self.X, max_gamma = 0.5)
+        with pytest.warns(ArgumentChangeWarning):
+            func(self.X, n_jobs = 0)
+
+    @pytest.mark.parametrize("n_jobs", [2, 3])
+    def test_n_jobs(self, func, n_jobs):
+        """Test that the result doesn't depend on the number of threads."""
+        X = np.random.default_rng(0).exponential(size=(3, 64, 48))
+        assert np.array_equal(func(X, n_jobs=n_jobs), func(X))
+
+    def test_reference_formula(self, func):
+        """Test the result against a NumPy implementation of the method, including zero and near-zero bins."""
+        X = np.random.default_rng(0).exponential(size=(3, 16, 12))
+        X[0, :4] = 0.0
+        X[1, 4:8] *= 1e-12
+        beta, max_gamma, epsilon = 0.3, 20.0, 1e-15
+        log_X_eps = np.log(X + epsilon)
+        P = X.shape[0]
+        gammas = np.minimum(np.exp((np.sum(log_X_eps, axis=0) / (P - 1) - log_X_eps * P / (P - 1)) * beta), max_gamma)
+        with np.errstate(divide="ignore"):
+            expected = np.exp(np.sum(gammas * np.log(X), axis=0) / np.sum(gammas, axis=0))
+        assert np.allclose(func(X, beta=beta, max_gamma=max_gamma), expected, rtol=1e-12, atol=0)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from ctfr.utils.audio import stft_spec, multi_stft_spec, cqt_spec, multi_cqt_spec, _get_cqt_filter_bank
+
+@pytest.fixture
+def signal():
+    return np.random.default_rng(0).standard_normal(10000)
+
+@pytest.mark.parametrize("center", [True, False])
+def test_multi_stft_spec(signal, center):
+    """Test that multi_stft_spec matches stft_spec for each window length."""
+    win_lengths = [256, 512, 1024]
+    result = multi_stft_spec(signal, win_lengths=win_lengths, hop_length=128, center=center)
+    expected = np.array([stft_spec(signal, n_fft=1024, hop_length=128, win_length=l, center=center) for l in win_lengths])
+    assert result.shape == expected.shape
+    assert result.dtype == np.double
+    assert result.flags.c_contiguous
+    assert np.allclose(result, expected)
+
+def test_multi_stft_spec_out(signal):
+    """Test that multi_stft_spec writes to a preallocated output tensor."""
+    out = np.empty((2, 257, 1 + signal.shape[0] // 128))
+    result = multi_stft_spec(signal, win_lengths=[256, 512], n_fft=512, hop_length=128, out=out)
+    assert result is out
+    with pytest.raises(ValueError):
+        multi_stft_spec(signal, win_lengths=[256, 512], n_fft=512, hop_length=64, out=out)
+
+@pytest.mark.parametrize("sr, hop_length, filter_scales, n_bins, dtype", [
+    (22050, 256, [1/3, 2/3, 1], 192, np.double),
+    (22050, 512, [0.05, 0.5, 1], 96, np.double), # Different early downsampling counts.
+    (44100, 255, [0.5, 1], 120, np.float32), # Odd hop length, so there is no decimation.
+])
+def test_multi_cqt_spec(signal, sr, hop_length, filter_scales, n_bins, dtype):
+    """Test that multi_cqt_spec matches cqt_spec for each filter scale."""
+    cqt_dtype = np.result_type(dtype, np.complex64)
+    result = multi_cqt_spec(signal, filter_scales=filter_scales, sr=sr, hop_length=hop_length, fmin=32.7, n_bins=n_bins, bins_per_octave=24, dtype=dtype, cqt_dtype=cqt_dtype)
+    expected = np.array([
+        cqt_spec(signal, sr=sr, filter_scale=filter_scale, hop_length=hop_length, fmin=32.7, n_bins=n_bins, bins_per_octave=24, dtype=dtype, cqt_dtype=cqt_dtype)
+        for filter_scale in filter_scales
+    ])
+    assert result.dtype == dtype
+    assert result.flags.c_contiguous
+    assert np.array_equal(result, expected)
+
+def test_multi_cqt_spec_filter_bank_cache(signal):
+    """Test that filter banks are cached by parameters."""
+    multi_cqt_spec(signal, filter_scales=[1], hop_length=128, n_bins=72)
+    filter_bank = _get_cqt_filter_bank(22050, 32.7, 72, 36, 1, 128, np.complex128)
+    assert _get_cqt_filter_bank(22050, 32.7, 72, 36, 1, 128, np.complex128) is filter_bank
+    assert _get_cqt_filter_bank(22050, 32.7, 72, 36, 0.5, 128, np.complex128) is not filter_bank
+
+def test_multi_cqt_spec_invalid(signal):
+    with pytest.raises(ValueError):
+        multi_cqt_spec(signal, filter_scales=[1], sr=1000, n_bins=288) # Filters above the Nyquist frequency.
+    with pytest.raises(ValueError):
+        multi_cqt_spec(signal, filter_scales=[1], hop_length=128, n_bins=72, out=np.empty((2, 72, 10)))
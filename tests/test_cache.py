@@ -0,0 +1,77 @@
+import pickle
+import numpy as np
+import pytest
+from ctfr import ctfr, SpecsCache, PlanCache, plan_cache
+
+@pytest.fixture
+def signal():
+    return np.random.default_rng(0).standard_normal(5000)
+
+def test_cache_hits(signal):
+    """Test that cached spectrograms are reused and give the same results."""
+    cache = SpecsCache()
+    expected = [ctfr(signal, 22050, "lt", eta=eta) for eta in (2.0, 8.0)]
+    results = [ctfr(signal, 22050, "lt", eta=eta, cache=cache) for eta in (2.0, 8.0)]
+    assert all(np.array_equal(r, e) for r, e in zip(results, expected))
+    info = cache.info()
+    assert (info.hits, info.misses, info.entries) == (1, 1, 1)
+
+    ctfr(signal, 22050, "lt", hop_length=128, cache=cache) # Different parameters.
+    ctfr(signal[::-1], 22050, "lt", cache=cache) # Different signal.
+    ctfr(signal, 22050, "lt", dtype=np.float32, cache=cache) # Different data type.
+    assert cache.info().misses == 4
+
+    cache.clear()
+    assert cache.info() == (0, 0, 0, 0, 0, cache.max_bytes)
+
+def test_cache_eviction(signal):
+    cache = SpecsCache()
+    ctfr(signal, 22050, "mean", cache=cache)
+    nbytes = cache.info().nbytes
+    cache = SpecsCache(max_bytes=nbytes)
+    ctfr(signal, 22050, "mean", cache=cache)
+    ctfr(signal[::-1], 22050, "mean", cache=cache) # Evicts the first tensor.
+    ctfr(signal, 22050, "mean", cache=cache)
+    info = cache.info()
+    assert (info.hits, info.misses, info.entries, info.nbytes) == (0, 3, 1, nbytes)
+
+def test_cache_disk(signal, tmp_path):
+    cache = SpecsCache(max_bytes=0, directory=tmp_path)
+    expected = ctfr(signal, 22050, "fls", cache=cache)
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+
+    # A new cache (e.g. in another process) reads the stored tensor.
+    cache = pickle.loads(pickle.dumps(cache))
+    assert np.array_equal(ctfr(signal, 22050, "fls", cache=cache), expected)
+    assert cache.info().disk_hits == 1
+
+    cache.clear()
+    assert not list(tmp_path.iterdir())
+
+def test_cache_invalid_arguments():
+    with pytest.raises(ValueError):
+        SpecsCache(max_bytes=-1)
+
+def test_plan_cache(signal):
+    """Test that the plans of a computation are reused by subsequent computations with the same parameters."""
+    plan_cache.clear()
+    expected = ctfr(signal, 22050, "fls", representation_type="cqt", n_bins=144)
+    info = plan_cache.info()
+    assert info.misses > 0 and info.entries == info.misses and info.nbytes > 0
+    assert np.array_equal(ctfr(signal, 22050, "fls", representation_type="cqt", n_bins=144), expected)
+    assert plan_cache.info().misses == info.misses
+    assert plan_cache.info().hits > info.hits
+    plan_cache.clear()
+    assert plan_cache.info() == (0, 0, 0, 0, plan_cache.max_bytes)
+
+def test_plan_cache_bounded():
+    cache = PlanCache(max_bytes=100)
+    first = cache._get("a", np.zeros, 10) # 80 bytes.
+    assert not first.flags.writeable
+    assert cache._get("a", np.zeros, 10) is first
+    cache._get("b", np.zeros, 5) # Evicts "a".
+    assert cache.info() == (1, 2, 1, 40, 100)
+    cache.resize(0)
+    assert cache.info().entries == 0
+    with pytest.raises(ValueError):
+        PlanCache(max_bytes=-1)
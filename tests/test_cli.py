@@ -0,0 +1,152 @@
+import json
+import os
+import numpy as np
+import pytest
+import soundfile as sf
+import ctfr
+from ctfr.cli import main, _parse_bytes, _parse_param, _estimate_item_memory
+
+SR = 8000
+
+@pytest.fixture
+def input_dir(tmp_path):
+    """Directory with three short audio files, one of them in a subdirectory, and a file that isn't audio."""
+    rng = np.random.default_rng(0)
+    directory = tmp_path / "input"
+    (directory / "sub").mkdir(parents=True)
+    for i, name in enumerate(["a.wav", "b.wav", "sub/c.flac"]):
+        sf.write(directory / name, 0.1 * rng.standard_normal(SR + 1000 * i), SR)
+    (directory / "notes.txt").write_text("not audio")
+    return directory
+
+def _expected(path, method="swgm", **kwargs):
+    signal, sr = ctfr.load(str(path))
+    return ctfr.ctfr(signal, sr, method, **kwargs)
+
+def test_npy_output(input_dir, tmp_path, capsys):
+    """Test that a .npy file is written for each input, mirroring the input paths."""
+    output_dir = tmp_path / "output"
+    assert main([str(input_dir), str(output_dir), "-m", "swgm", "-p", "beta=0.5", "-j", "1"]) == 0
+
+    outputs = sorted(str(path.relative_to(output_dir)) for path in output_dir.rglob("*.npy"))
+    assert outputs == ["a.wav.npy", "b.wav.npy", os.path.join("sub", "c.flac.npy")]
+    assert np.allclose(np.load(output_dir / "sub" / "c.flac.npy"), _expected(input_dir / "sub" / "c.flac", beta=0.5))
+
+    captured = capsys.readouterr()
+    assert "[3/3]" in captured.err
+    assert "Done: 3 processed, 0 skipped, 0 failed" in captured.err
+
+def test_resume(input_dir, tmp_path, capsys):
+    """Test that existing outputs are skipped, unless overwrite is requested."""
+    output_dir = tmp_path / "output"
+    assert main([str(input_dir), str(output_dir), "-m", "mean", "-j", "1"]) == 0
+    os.remove(output_dir / "b.wav.npy")
+    np.save(output_dir / "a.wav.npy", np.zeros(1))
+    capsys.readouterr()
+
+    assert main([str(input_dir), str(output_dir), "-m", "mean", "-j", "1"]) == 0
+    assert "Done: 1 processed, 2 skipped, 0 failed" in capsys.readouterr().err
+    assert np.load(output_dir / "a.wav.npy").shape == (1,)
+    assert np.allclose(np.load(output_dir / "b.wav.npy"), _expected(input_dir / "b.wav", "mean"))
+
+    assert main([str(input_dir), str(output_dir), "-m", "mean", "-j", "1", "--overwrite"]) == 0
+    assert "Done: 3 processed, 0 skipped, 0 failed" in capsys.readouterr().err
+    assert np.allclose(np.load(output_dir / "a.wav.npy"), _expected(input_dir / "a.wav", "mean"))
+
+def test_npz_output(input_dir, tmp_path):
+    """Test that shards of inputs are written as .npz files keyed by the input paths."""
+    output_dir = tmp_path / "output"
+    assert main([str(input_dir), str(output_dir), "-m", "swgm", "--format", "npz", "--shard-size", "2", "-j", "1"]) == 0
+
+    assert sorted(os.listdir(output_dir)) == ["shard-00000.npz", "shard-00001.npz"]
+    with np.load(output_dir / "shard-00000.npz") as shard:
+        assert shard.files == ["a.wav", "b.wav"]
+        assert np.allclose(shard["b.wav"], _expected(input_dir / "b.wav"))
+    with np.load(output_dir / "shard-00001.npz") as shard:
+        assert shard.files == ["sub/c.flac"]
+
+def test_memmap_output(input_dir, tmp_path):
+    """Test that shards are written as .npy files with the CTFRs concatenated along time, indexed by a .json file."""
+    output_dir = tmp_path / "output"
+    assert main([str(input_dir), str(output_dir), "-m", "swgm", "--format", "memmap", "--dtype", "float32", "-j", "1"]) == 0
+
+    with open(output_dir / "shard-00000.json") as f:
+        index = json.load(f)
+    data = np.load(output_dir / index["data"], mmap_mode="r")
+    assert data.dtype == np.float32
+    assert [item["key"] for item in index["items"]] == ["a.wav", "b.wav", "sub/c.flac"]
+    assert index["items"][-1]["stop"] == data.shape[1]
+    for item in index["items"]:
+        expected = _expected(input_dir / item["key"], dtype=np.float32)
+        assert np.allclose(data[:, item["start"]:item["stop"]], expected, rtol=1e-5)
+
+def test_manifest_input(input_dir, tmp_path):
+    """Test that the inputs listed in a manifest are processed, keyed relative to their common directory."""
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text(f"# Comment\n{input_dir / 'sub' / 'c.flac'}\n\ninput/a.wav\n")
+    output_dir = tmp_path / "output"
+    assert main([str(manifest), str(output_dir), "-m", "mean", "-j", "1"]) == 0
+    assert sorted(str(path.relative_to(output_dir)) for path in output_dir.rglob("*.npy")) == ["a.wav.npy", os.path.join("sub", "c.flac.npy")]
+
+def test_failed_input(input_dir, tmp_path, capsys):
+    """Test that a failed input is reported without stopping the run, and that its shard is not written."""
+    (input_dir / "b.wav").write_bytes(b"corrupted")
+    output_dir = tmp_path / "output"
+    assert main([str(input_dir), str(output_dir), "-m", "mean", "--format", "npz", "--shard-size", "2", "-j", "1"]) == 1
+
+    assert "b.wav: failed with" in capsys.readouterr().err
+    assert os.listdir(output_dir) == ["shard-00001.npz"]
+
+def test_process_pool(input_dir, tmp_path, capsys):
+    """Test that the results with a process pool and a memory budget match the sequential ones."""
+    sequential_dir, pool_dir = tmp_path / "sequential", tmp_path / "pool"
+    assert main([str(input_dir), str(sequential_dir), "-m", "fls", "--format", "npz", "-j", "1"]) == 0
+    assert main([str(input_dir), str(pool_dir), "-m", "fls", "--format", "npz", "-j", "2", "--max-memory", "1K"]) == 0
+
+    with np.load(sequential_dir / "shard-00000.npz") as sequential, np.load(pool_dir / "shard-00000.npz") as pool:
+        for key in sequential.files:
+            assert np.array_equal(sequential[key], pool[key])
+
+def test_process_pool_without_memory_budget(input_dir, tmp_path, capsys):
+    """Test that a process pool without a memory budget processes every input."""
+    output_dir = tmp_path / "output"
+    assert main([str(input_dir), str(output_dir), "-m", "mean", "-j", "2"]) == 0
+    assert "Done: 3 processed, 0 skipped, 0 failed" in capsys.readouterr().err
+    assert np.allclose(np.load(output_dir / "b.wav.npy"), _expected(input_dir / "b.wav", "mean"))
+
+@pytest.mark.parametrize("arguments", [
+    ["-m", "nonexistent_method"],
+    ["-m", "mean", "--representation-type", "wavelet"],
+    ["-m", "mean", "--win-lengths", "512", "--n-fft", "256"],
+    ["-m", "mean", "-p", "not a parameter"],
+    ["-m", "mean", "--max-memory", "a lot"],
+])
+def test_invalid_arguments(input_dir, tmp_path, arguments):
+    """Test that invalid arguments are rejected before processing any input."""
+    with pytest.raises(SystemExit) as exc_info:
+        main([str(input_dir), str(tmp_path / "output"), *arguments])
+    assert exc_info.value.code == 2
+    assert not (tmp_path / "output").exists()
+
+def test_empty_input(tmp_path):
+    """Test that an input directory without audio files is rejected."""
+    with pytest.raises(SystemExit):
+        main([str(tmp_path), str(tmp_path / "output"), "-m", "mean"])
+
+@pytest.mark.parametrize("text,expected", [("1024", 1024), ("512K", 512 * 2**10), ("1.5G", 3 * 2**29), ("2GiB", 2**31), ("4mb", 4 * 2**20)])
+def test_parse_bytes(text, expected):
+    assert _parse_bytes(text) == expected
+
+@pytest.mark.parametrize("text,expected", [("lk=21", ("lk", 21)), ("gini_mode=fast", ("gini_mode", "fast")), ("interp_steps=[[2, 1], [1, 2]]", ("interp_steps", [[2, 1], [1, 2]]))])
+def test_parse_param(text, expected):
+    assert _parse_param(text) == expected
+
+def test_estimate_item_memory(input_dir):
+    """Test that the memory estimate grows with the input duration, and with the memory order of the method."""
+    def estimate(name, method):
+        options = {"sr": None, "dtype": "float64", "method": method, "kwargs": {"representation_type": "stft", "win_lengths": None, "hop_length": None, "n_fft": None, "filter_scales": None, "bins_per_octave": None, "fmin": None, "n_bins": None}}
+        return _estimate_item_memory(str(input_dir / name), options)
+
+    assert 0 < estimate("a.wav", "swgm") < estimate("b.wav", "swgm")
+    assert estimate("a.wav", "swgm") < estimate("a.wav", "lt")
+    assert estimate("notes.txt", "swgm") == 0
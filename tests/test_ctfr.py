@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+from ctfr import ctfr, ctfr_from_specs
+
+@pytest.fixture
+def signal():
+    return np.random.default_rng(0).standard_normal(5000)
+
+@pytest.mark.parametrize("method", ["mean", "swgm", "fls", "lt"])
+def test_ctfr_float32(signal, method):
+    """Test that dtype=np.float32 computes the CTFR in single precision."""
+    result = ctfr(signal, 22050, method, dtype=np.float32)
+    expected = ctfr(signal, 22050, method)
+    assert result.dtype == np.float32
+    assert expected.dtype == np.double
+    assert np.allclose(result, expected, rtol=1e-3, atol=1e-6 * np.max(expected))
+
+def test_ctfr_from_specs_dtype():
+    specs = np.random.default_rng(0).random((3, 8, 10))
+    assert ctfr_from_specs(specs, "lt", dtype=np.float32).dtype == np.float32
+    assert ctfr_from_specs(specs.astype(np.float32), "lt").dtype == np.double
+
+def test_invalid_dtype(signal):
+    with pytest.raises(ValueError):
+        ctfr(signal, 22050, "mean", dtype=np.int32)
+    with pytest.raises(ValueError):
+        ctfr_from_specs(np.ones((3, 8, 10)), "mean", dtype="invalid")
+
+def test_ctfr_from_specs_normalization():
+    """Test that the input spectrograms and the output are normalized to the mean input energy."""
+    specs = np.random.default_rng(0).random((3, 8, 10)) * np.array([1.0, 2.0, 6.0])[:, np.newaxis, np.newaxis]
+    energy = np.mean(np.sum(specs, axis=(1, 2)))
+    result = ctfr_from_specs(specs, "mean", normalize_output=False)
+    assert np.allclose(result, np.mean(specs / np.sum(specs, axis=(1, 2), keepdims=True) * energy, axis=0))
+    assert np.isclose(np.sum(ctfr_from_specs(specs, "min")), energy)
+
+@pytest.mark.parametrize("normalize_output", [True, False])
+def test_ctfr_from_specs_out(normalize_output):
+    specs = np.random.default_rng(0).random((3, 8, 10))
+    out = np.empty((8, 10))
+    result = ctfr_from_specs(specs, "fls", normalize_output=normalize_output, out=out)
+    assert result is out
+    assert np.array_equal(out, ctfr_from_specs(specs, "fls", normalize_output=normalize_output))
+    with pytest.raises(ValueError):
+        ctfr_from_specs(specs, "fls", out=np.empty((8, 9)))
+
+def test_ctfr_out(signal):
+    expected = ctfr(signal, 22050, "swgm")
+    out = np.empty_like(expected)
+    assert ctfr(signal, 22050, "swgm", out=out) is out
+    assert np.array_equal(out, expected)
+    with pytest.raises(ValueError):
+        ctfr(signal, 22050, "swgm", out=np.empty((3, 3)))
+
+@pytest.mark.parametrize("method", ["mean", "swgm", "fls", "lt", "sls_h"])
+@pytest.mark.parametrize("normalize_input", [True, False])
+def test_ctfr_from_specs_memmap(tmp_path, method, normalize_input):
+    """Test that a read-only memmapped tensor is combined without being modified, and that the CTFR can be written to a memmap."""
+    specs = np.random.default_rng(0).random((3, 16, 20)) * np.array([1.0, 2.0, 6.0])[:, np.newaxis, np.newaxis]
+    np.save(tmp_path / "specs.npy", specs)
+    specs_memmap = np.load(tmp_path / "specs.npy", mmap_mode="r")
+    out = np.lib.format.open_memmap(tmp_path / "out.npy", mode="w+", dtype=np.double, shape=(16, 20))
+
+    result = ctfr_from_specs(specs_memmap, method, normalize_input=normalize_input, out=out)
+    assert result is out
+    out.flush()
+    expected = ctfr_from_specs(list(specs), method, normalize_input=normalize_input)
+    assert np.array_equal(np.load(tmp_path / "out.npy"), expected)
+    assert np.array_equal(specs_memmap, specs)
+
+def test_ctfr_from_specs_tensor_not_modified():
+    """Test that a tensor used without copying is not normalized in place."""
+    specs = np.random.default_rng(0).random((3, 8, 10)) * np.array([1.0, 2.0, 6.0])[:, np.newaxis, np.newaxis]
+    specs_copy = specs.copy()
+    assert np.array_equal(ctfr_from_specs(specs, "mean"), ctfr_from_specs(list(specs), "mean"))
+    assert np.array_equal(specs, specs_copy)
+
+@pytest.fixture
+def stereo_signal():
+    signal = np.random.default_rng(0).standard_normal((2, 5000))
+    signal[1] *= 0.1
+    return signal
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_ctfr_multichannel(stereo_signal, n_workers):
+    """Test that the CTFR of a multichannel signal stacks the CTFRs of its channels."""
+    result = ctfr(stereo_signal, 22050, "lt", n_workers=n_workers)
+    assert result.shape[0] == 2
+    for channel, comb_spec in zip(stereo_signal, result):
+        assert np.array_equal(comb_spec, ctfr(channel, 22050, "lt"))
+
+def test_ctfr_multichannel_out(stereo_signal):
+    expected = ctfr(stereo_signal, 22050, "mean")
+    out = np.empty_like(expected)
+    assert ctfr(stereo_signal, 22050, "mean", out=out) is out
+    assert np.array_equal(out, expected)
+    with pytest.raises(ValueError):
+        ctfr(stereo_signal, 22050, "mean", out=np.empty(expected.shape[1:]))
+
+def test_ctfr_mid_side(stereo_signal):
+    mid, side = (stereo_signal[0] + stereo_signal[1]) / 2, (stereo_signal[0] - stereo_signal[1]) / 2
+    assert np.array_equal(ctfr(stereo_signal, 22050, "swgm", channel_reduction="mid"), ctfr(mid, 22050, "swgm"))
+    assert np.array_equal(ctfr(stereo_signal, 22050, "swgm", channel_reduction="side"), ctfr(side, 22050, "swgm"))
+    result = ctfr(stereo_signal, 22050, "swgm", channel_reduction="mid_side")
+    assert np.array_equal(result, np.stack([ctfr(mid, 22050, "swgm"), ctfr(side, 22050, "swgm")]))
+
+def test_ctfr_energy_reduction(stereo_signal):
+    """Test that the energy reduction combines the energy-weighted sum of the spectrograms of the channels."""
+    specs = [ctfr(channel, 22050, "mean") for channel in stereo_signal]
+    energies = np.array([np.sum(spec) for spec in specs])
+    weights = energies / np.sum(energies)
+    result = ctfr(stereo_signal, 22050, "mean", channel_reduction="energy")
+    assert np.allclose(result, weights[0] * specs[0] + weights[1] * specs[1])
+    # Identical channels reduce to the CTFR of the channel.
+    assert np.allclose(ctfr(np.stack([stereo_signal[0]] * 3), 22050, "lt", channel_reduction="energy"), ctfr(stereo_signal[0], 22050, "lt"))
+
+def test_ctfr_invalid_channels(signal, stereo_signal):
+    with pytest.raises(ValueError):
+        ctfr(np.stack([stereo_signal] * 2), 22050, "mean")
+    with pytest.raises(ValueError):
+        ctfr(signal, 22050, "mean", channel_reduction="mid")
+    with pytest.raises(ValueError):
+        ctfr(np.stack([signal] * 3), 22050, "mean", channel_reduction="mid_side")
+    with pytest.raises(ValueError):
+        ctfr(stereo_signal, 22050, "mean", channel_reduction="invalid")
+    with pytest.raises(ValueError):
+        ctfr(stereo_signal, 22050, "mean", n_workers=0)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from ctfr import ctfr, ctfr_batch, ctfr_from_specs, ctfr_from_specs_batch
+from ctfr.exception import BatchItemError
+
+@pytest.fixture
+def signals():
+    rng = np.random.default_rng(0)
+    return [rng.standard_normal(n) for n in (4000, 6000, 5000)]
+
+@pytest.mark.parametrize("executor,n_workers", [
+    ("process", 2),
+    ("thread", 2),
+    ("thread", 1),
+])
+def test_ctfr_batch_matches_ctfr(signals, executor, n_workers):
+    """Test that ctfr_batch returns the same results as ctfr, in input order."""
+    results = ctfr_batch(iter(signals), 22050, "swgm", n_workers=n_workers, executor=executor)
+    assert len(results) == len(signals)
+    for signal, result in zip(signals, results):
+        assert np.allclose(result, ctfr(signal, 22050, "swgm"))
+
+def test_ctfr_batch_item_errors(signals):
+    """Test that a failed item is reported in its position without stopping the batch."""
+    signals.insert(1, "invalid")
+    results = ctfr_batch(signals, 22050, "mean", n_workers=2, executor="thread")
+    assert isinstance(results[1], BatchItemError)
+    assert results[1].index == 1
+    assert results[1].__cause__ is not None
+    assert all(isinstance(results[i], np.ndarray) for i in (0, 2, 3))
+
+def test_ctfr_batch_raise(signals):
+    """Test that return_exceptions=False raises the item error."""
+    signals.append("invalid")
+    with pytest.raises(BatchItemError):
+        ctfr_batch(signals, 22050, "mean", n_workers=1, return_exceptions=False)
+
+def test_ctfr_batch_invalid_arguments(signals):
+    with pytest.raises(ValueError):
+        ctfr_batch(signals, 22050, "mean", n_workers=0)
+    with pytest.raises(ValueError):
+        ctfr_batch(signals, 22050, "mean", executor="invalid")
+
+@pytest.fixture
+def specs_batch():
+    rng = np.random.default_rng(1)
+    return [rng.exponential(size=(3, 65, m)) for m in (40, 60, 50)]
+
+@pytest.mark.parametrize("method", ["swgm", "fls", "lt", "sls_h"])
+@pytest.mark.parametrize("n_workers", [1, 3])
+def test_ctfr_from_specs_batch_matches_ctfr_from_specs(specs_batch, method, n_workers):
+    """Test that ctfr_from_specs_batch returns the same results as ctfr_from_specs, in input order."""
+    results = ctfr_from_specs_batch(iter(specs_batch), method, n_workers=n_workers)
+    assert len(results) == len(specs_batch)
+    for specs, result in zip(specs_batch, results):
+        assert np.array_equal(result, ctfr_from_specs(specs, method))
+
+def test_ctfr_from_specs_batch_kwargs(specs_batch):
+    """Test that the method parameters and the data type are passed to every item."""
+    results = ctfr_from_specs_batch(specs_batch, "sls_i", n_workers=2, dtype=np.float32, interp_steps=np.ones((3, 2)))
+    for specs, result in zip(specs_batch, results):
+        assert result.dtype == np.float32
+        assert np.array_equal(result, ctfr_from_specs(specs, "sls_i", dtype=np.float32, interp_steps=np.ones((3, 2))))
+
+def test_ctfr_from_specs_batch_item_errors(specs_batch):
+    """Test that a failed item is reported in its position, or raised if return_exceptions is False."""
+    specs_batch.insert(1, [np.ones((65, 40)), np.ones((65, 41))])
+    results = ctfr_from_specs_batch(specs_batch, "mean", n_workers=2)
+    assert isinstance(results[1], BatchItemError)
+    assert results[1].index == 1
+    with pytest.raises(BatchItemError):
+        ctfr_from_specs_batch(specs_batch, "mean", n_workers=1, return_exceptions=False)
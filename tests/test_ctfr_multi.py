@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from ctfr import ctfr, ctfr_multi
+from ctfr.exception import InvalidCombinationMethodError
+
+@pytest.fixture
+def signal():
+    return np.random.default_rng(0).standard_normal(5000)
+
+def test_ctfr_multi_matches_ctfr(signal):
+    """Test that each output of ctfr_multi matches ctfr with the same method and parameters."""
+    methods = {
+        "min": {},
+        "swgm": {"beta": 0.5},
+        "fls": {},
+        "lt_2": {"method": "lt", "eta": 2.0},
+        "lt_8": {"method": "lt", "eta": 8.0},
+        "sls_h": {},
+        "sls_i": {},
+    }
+    results = ctfr_multi(signal, 22050, methods)
+    assert list(results) == list(methods)
+    for label, kwargs in methods.items():
+        kwargs = dict(kwargs)
+        method = kwargs.pop("method", label)
+        assert np.array_equal(results[label], ctfr(signal, 22050, method, **kwargs))
+
+def test_ctfr_multi_method_list(signal):
+    results = ctfr_multi(signal, 22050, ["mean", "gmean"], dtype=np.float32)
+    assert list(results) == ["mean", "gmean"]
+    assert all(result.dtype == np.float32 for result in results.values())
+
+def test_ctfr_multi_invalid_method(signal):
+    with pytest.raises(InvalidCombinationMethodError):
+        ctfr_multi(signal, 22050, ["mean", "invalid"])
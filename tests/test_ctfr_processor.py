@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from ctfr import CTFRProcessor, ctfr_stream, stft_spec
+from ctfr.exception import StreamingNotSupportedError
+from ctfr.utils.audio import _get_multi_stft_windows
+from ctfr.utils.private import _get_method_function
+from ctfr.core.stream_utils import _get_window_energies
+
+SR = 22050
+WIN_LENGTHS = [256, 512, 1024]
+HOP_LENGTH = 128
+
+@pytest.fixture
+def signal():
+    return np.random.default_rng(0).standard_normal(SR // 4)
+
+@pytest.mark.parametrize("method", ["min", "fls", "lt", "sls_h"])
+def test_processor_matches_stream(signal, method):
+    """Test that pushing one hop at a time matches streaming the whole signal."""
+    processor = CTFRProcessor(SR, method, win_lengths=WIN_LENGTHS, hop_length=HOP_LENGTH)
+    frames = [processor.push(signal[i:i + HOP_LENGTH]) for i in range(0, signal.shape[0], HOP_LENGTH)]
+    frames.append(processor.flush())
+    expected = np.concatenate(list(ctfr_stream(iter([signal]), SR, method, win_lengths=WIN_LENGTHS, hop_length=HOP_LENGTH)), axis=1)
+    assert np.allclose(np.concatenate(frames, axis=1), expected)
+
+@pytest.mark.parametrize("method,kwargs", [
+    ("fls", {}),
+    ("fls", {"energy_criterium_db": -30}),
+    ("lt", {"energy_criterium_db": -30}),
+    ("sls_h", {"energy_criterium_db": -30}),
+    ("sls_h", {"gini_mode": "fast", "lsm": 5}),
+])
+def test_processor_matches_one_shot(signal, method, kwargs):
+    """Test that the stream states of the local methods, which keep their local statistics between calls, match the combination of the whole spectrograms."""
+    signal = signal * np.linspace(0, 1, signal.shape[0]) ** 4 # Low-energy regions, where the energy criteria apply.
+    processor = CTFRProcessor(SR, method, win_lengths=WIN_LENGTHS, hop_length=HOP_LENGTH, **kwargs)
+    assert processor._combiner._state is not None
+    frames = [processor.push(signal[i:i + HOP_LENGTH]) for i in range(0, signal.shape[0], HOP_LENGTH)]
+    frames.append(processor.flush())
+
+    specs = np.array([stft_spec(signal, n_fft=1024, hop_length=HOP_LENGTH, win_length=l) for l in WIN_LENGTHS])
+    energies = _get_window_energies(_get_multi_stft_windows(WIN_LENGTHS, 1024))
+    specs *= (np.mean(energies) / energies)[:, np.newaxis, np.newaxis]
+    assert np.allclose(np.concatenate(frames, axis=1), _get_method_function(method)(specs, **kwargs))
+
+def test_processor_varying_blocks(signal):
+    """Test that pushing blocks of varying lengths, including empty ones, matches pushing one hop at a time."""
+    processor = CTFRProcessor(SR, "fls", win_lengths=WIN_LENGTHS, hop_length=HOP_LENGTH)
+    frames = [processor.push(signal[i:i + HOP_LENGTH]) for i in range(0, signal.shape[0], HOP_LENGTH)]
+    expected = np.concatenate(frames + [processor.flush()], axis=1)
+
+    lengths = np.random.default_rng(1).integers(0, 5 * HOP_LENGTH, size=signal.shape[0] // HOP_LENGTH)
+    bounds = np.concatenate(([0], np.cumsum(lengths), [signal.shape[0]]))
+    frames = [processor.push(signal[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])]
+    assert np.allclose(np.concatenate(frames + [processor.flush()], axis=1), expected)
+
+def test_processor_reuses_buffers(signal):
+    """Test that, once the context is filled, pushing one hop at a time doesn't reallocate the frame buffers."""
+    processor = CTFRProcessor(SR, "lt", win_lengths=WIN_LENGTHS, hop_length=HOP_LENGTH)
+    for i in range(0, 20 * HOP_LENGTH, HOP_LENGTH):
+        processor.push(signal[i:i + HOP_LENGTH])
+    samples, frames = processor._framer._buffer, processor._combiner._frames
+    # The new frame, its context and the frame leaving the context, which the stream state of LT slides out.
+    assert frames.shape[2] == 2 * processor.time_lobe + 2
+    for i in range(20 * HOP_LENGTH, 40 * HOP_LENGTH, HOP_LENGTH):
+        assert processor.push(signal[i:i + HOP_LENGTH]).shape[1] == 1
+        assert processor._framer._buffer is samples
+        assert processor._combiner._frames is frames
+
+def test_processor_latency(signal):
+    """Test that frame m is returned once m * hop_length + latency samples have been pushed."""
+    processor = CTFRProcessor(SR, "lt", win_lengths=WIN_LENGTHS, hop_length=HOP_LENGTH)
+    assert processor.latency == 512 + 5 * HOP_LENGTH
+    m = 3
+    target = m * HOP_LENGTH + processor.latency
+    assert processor.push(signal[:target - 1]).shape[1] == m
+    assert processor.push(signal[target - 1:target]).shape[1] == 1
+
+def test_processor_reset(signal):
+    """Test that the processor can be reused after flushing."""
+    processor = CTFRProcessor(SR, "fls", win_lengths=WIN_LENGTHS, hop_length=HOP_LENGTH)
+    first = np.concatenate((processor.push(signal), processor.flush()), axis=1)
+    second = np.concatenate((processor.push(signal), processor.flush()), axis=1)
+    assert np.array_equal(first, second)
+
+def test_processor_not_supported():
+    with pytest.raises(StreamingNotSupportedError):
+        CTFRProcessor(SR, "sls_i")
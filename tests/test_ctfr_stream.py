@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import soundfile
+from ctfr import ctfr_stream, stft_spec
+from ctfr.utils.audio import _get_multi_stft_windows
+from ctfr.core.stream_utils import _get_window_energies
+from ctfr.utils.private import _get_method_function
+from ctfr.exception import StreamingNotSupportedError
+
+SR = 22050
+WIN_LENGTHS = [256, 512, 1024]
+HOP_LENGTH = 128
+
+@pytest.fixture
+def signal():
+    return np.random.default_rng(0).standard_normal(SR // 2)
+
+def _one_shot(signal, method, energies=None, **kwargs):
+    """Combines the normalized spectrograms of the whole signal."""
+    specs = np.array([stft_spec(signal, n_fft=1024, hop_length=HOP_LENGTH, win_length=l) for l in WIN_LENGTHS])
+    if energies is None:
+        energies = np.sum(specs, axis=(1, 2))
+    specs *= (np.mean(energies) / energies)[:, np.newaxis, np.newaxis]
+    return _get_method_function(method)(specs, **kwargs)
+
+@pytest.mark.parametrize("method,kwargs", [
+    ("min", {}),
+    ("swgm", {}),
+    ("fls", {"lm": 7}),
+    ("lt", {}),
+    ("sls_h", {"lsm": 9, "lem": 5}),
+])
+def test_stream_matches_one_shot(signal, method, kwargs):
+    """Test that the concatenated blocks match the combination of the whole spectrograms."""
+    blocks = list(ctfr_stream(signal, SR, method, block_length=20, win_lengths=WIN_LENGTHS, hop_length=HOP_LENGTH, **kwargs))
+    assert len(blocks) > 1
+    assert np.allclose(np.concatenate(blocks, axis=1), _one_shot(signal, method, **kwargs))
+
+def test_stream_from_iterable(signal):
+    """Test streaming from single-pass blocks of arbitrary sizes."""
+    sizes = [1000, 37, 5000, 2]
+    bounds = np.cumsum([0] + sizes + [signal.shape[0]])
+    source = (signal[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1))
+    result = np.concatenate(list(ctfr_stream(source, SR, "lt", block_length=16, win_lengths=WIN_LENGTHS, hop_length=HOP_LENGTH)), axis=1)
+    energies = _get_window_energies(_get_multi_stft_windows(WIN_LENGTHS, 1024))
+    assert np.allclose(result, _one_shot(signal, "lt", energies=energies))
+
+def test_stream_from_file(signal, tmp_path):
+    """Test that streaming from a file matches streaming from the loaded array."""
+    path = tmp_path / "signal.wav"
+    soundfile.write(path, signal, SR, subtype="DOUBLE")
+    from_file = np.concatenate(list(ctfr_stream(path, None, "fls", win_lengths=WIN_LENGTHS, hop_length=HOP_LENGTH)), axis=1)
+    from_array = np.concatenate(list(ctfr_stream(signal, SR, "fls", win_lengths=WIN_LENGTHS, hop_length=HOP_LENGTH)), axis=1)
+    assert np.allclose(from_file, from_array)
+    with pytest.raises(ValueError):
+        ctfr_stream(path, 44100, "fls")
+
+def test_stream_not_supported(signal):
+    with pytest.raises(StreamingNotSupportedError):
+        ctfr_stream(signal, SR, "sls_i")
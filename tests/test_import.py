@@ -0,0 +1,33 @@
+import json
+import subprocess
+import sys
+
+# Modules that are slow to import, and must only be imported when used.
+_HEAVY_MODULES = ["librosa", "matplotlib", "pooch", "requests", "scipy.signal", "scipy.stats", "numba"]
+
+def _imported_modules(code):
+    """Runs code in a new interpreter and returns the names of the modules imported by it."""
+    output = subprocess.run(
+        [sys.executable, "-c", f"import sys, json\n{code}\nprint(json.dumps(sorted(sys.modules)))"],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return set(json.loads(output.splitlines()[-1]))
+
+def test_import_is_lazy():
+    """Test that importing ctfr doesn't import heavy dependencies nor the combination methods."""
+    modules = _imported_modules("import ctfr")
+    assert not [name for name in _HEAVY_MODULES if name in modules]
+    assert not [name for name in modules if name.startswith("ctfr.implementations.") and name.endswith("_cy")]
+
+def test_lazy_attributes():
+    """Test that lazy attributes and method aliases import their modules on first access."""
+    modules = _imported_modules("import ctfr\nctfr.fetch_sample\nctfr.methods.swgm_from_specs")
+    assert "pooch" in modules
+    assert "ctfr.implementations.swgm_cy" not in modules # Only imported when the alias is called.
+    assert "ctfr.implementations.fls_cy" not in modules
+
+def test_method_loaded_on_use():
+    modules = _imported_modules("import ctfr, numpy as np\nctfr.methods.swgm_from_specs(np.ones((2, 4, 4)))")
+    assert "ctfr.implementations.swgm_cy" in modules
+    assert "ctfr.implementations.fls_cy" not in modules
+    assert "librosa" not in modules
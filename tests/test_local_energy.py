@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from scipy.signal import correlate
+from ctfr.implementations.local_energy import _local_energy, _get_active_blocks, _get_active_bins, _sls_local_energy, _StreamingLocalEnergy
+
+@pytest.fixture
+def X():
+    return np.random.default_rng(0).random((3, 40, 30))
+
+@pytest.mark.parametrize("method", ["direct", "fft", "auto"])
+def test_local_energy_matches_2d_correlation(X, method):
+    freq_window = np.hamming(11)
+    time_window = np.hamming(7)
+    time_window[4:] = 0 # Asymmetric window.
+    expected = np.array([correlate(X[p], np.outer(freq_window, time_window), mode="same") for p in range(X.shape[0])])
+    assert np.allclose(_local_energy(X, freq_window, time_window, method=method), expected)
+
+def test_local_energy_buffers(X):
+    X = X.astype(np.float32)
+    out = np.empty_like(X)
+    buffer = np.empty_like(X)
+    result = _local_energy(X, np.hamming(5), np.hamming(3), out=out, buffer=buffer)
+    assert result is out
+    assert result.dtype == np.float32
+    assert np.allclose(result, _local_energy(X.astype(np.double), np.hamming(5), np.hamming(3)), rtol=1e-5)
+
+def test_local_energy_invalid_method(X):
+    with pytest.raises(ValueError):
+        _local_energy(X, np.hamming(5), np.hamming(3), method="invalid")
+
+@pytest.mark.parametrize("squared", [False, True])
+def test_streaming_local_energy(X, squared):
+    """Test that the local energy of frames received in blocks of varying lengths matches that of the whole spectrograms."""
+    freq_window, time_window = np.hamming(11), np.hamming(7)
+    expected = _local_energy(np.square(X) if squared else X, freq_window, time_window)
+    streaming_energy = _StreamingLocalEnergy(freq_window, time_window, squared=squared)
+    frames = np.pad(X, ((0, 0), (0, 0), (3, 3))) # Zero frames around the spectrograms.
+    energy, start = [], 0
+    for num_frames in [1, 1, 4, 10, 2, 12]:
+        energy.append(streaming_energy.compute(frames[:, :, start:start + num_frames + 6], 3, 3 + num_frames))
+        start += num_frames
+    assert np.allclose(np.concatenate(energy, axis=2), expected)
+
+def test_active_bins_match_sls_local_energy(X):
+    """Test that the energy gate of FLS and LT selects the bins where SLS-H computes the local sparsity."""
+    X = X * np.logspace(-6, 0, X.shape[2])
+    energy = np.max(_sls_local_energy(X, 11, 7, 1e-10), axis=0)
+    for energy_criterium_db in [-40, -20, -5]:
+        active = _get_active_bins(X, 11, 7, energy_criterium_db)
+        assert active.dtype == np.uint8
+        assert np.array_equal(active.astype(bool), energy >= 10.0 ** (energy_criterium_db / 10.0))
+
+def test_active_blocks():
+    active = np.zeros((40, 30), dtype=np.uint8)
+    active[2:5, 3:6] = 1
+    active[30:35, 4:5] = 1 # Merged with the block above along time, but separate along frequency.
+    active[10, 9] = 1 # Merged with the first block, as the gaps are shorter than the window lengths.
+    active[20:22, 25:28] = 1
+    blocks = _get_active_blocks(active, 9, 5)
+    assert blocks == [(2, 11, 3, 10), (30, 35, 3, 10), (20, 22, 25, 28)]
+
+    covered = np.zeros_like(active)
+    for k_start, k_stop, m_start, m_stop in blocks:
+        covered[k_start:k_stop, m_start:m_stop] = 1
+    assert np.all(covered[active == 1] == 1)
+    assert _get_active_blocks(np.zeros_like(active), 9, 5) == []
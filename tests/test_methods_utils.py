@@ -1,12 +1,22 @@
+import importlib.metadata
+import threading
+import time
+import numpy as np
 import pytest
+import ctfr
+import ctfr.utils.private
 from ctfr.utils.methods import (
     show_methods,
     show_method_params,
     cite_method,
     get_methods_list,
-    get_method_name
+    get_method_name,
+    get_method_capabilities,
+    register_method,
+    unregister_method
 )
 from ctfr.exception import InvalidCombinationMethodError
+from ctfr.warning import MethodNotLoadedWarning
 from ctfr.methods_dict import _methods_dict
 
 def test_get_methods_list():
@@ -73,4 +83,164 @@ def test_show_method_params_invalid():
 def test_cite_method_invalid():
     """Test that cite_method raises error for invalid method."""
     with pytest.raises(InvalidCombinationMethodError):
-        cite_method("nonexistent_method") 
\ No newline at end of file
+        cite_method("nonexistent_method") 
+@pytest.fixture
+def registered_keys():
+    """Keys of the methods registered by a test, which are removed at teardown."""
+    keys = []
+    yield keys
+    for key in keys:
+        if key in _methods_dict:
+            unregister_method(key)
+
+def _max(X):
+    return np.max(X, axis=0)
+
+def test_register_method(registered_keys):
+    """Test that a registered method can be used as an installed method."""
+    register_method("test_max", _max, name="Binwise maximum", time_lobe=lambda **kwargs: 0)
+    registered_keys.append("test_max")
+    X = np.random.default_rng(0).random((3, 8, 10))
+
+    assert "test_max" in get_methods_list()
+    assert get_method_name("test_max") == "Binwise maximum"
+    assert np.array_equal(ctfr.ctfr_from_specs(X, method="test_max", normalize_input=False, normalize_output=False), _max(X))
+    assert np.array_equal(ctfr.methods.test_max_from_specs(X, normalize_input=False, normalize_output=False), _max(X))
+
+def test_register_method_import_path(registered_keys):
+    """Test that a method registered by import path is resolved on first use."""
+    register_method("test_min", "ctfr.implementations.binwise_simple:_min_wrapper")
+    registered_keys.append("test_min")
+    X = np.random.default_rng(0).random((3, 8, 10))
+
+    assert get_method_name("test_min") == "test_min"
+    assert "test_min" not in ctfr.utils.private._method_functions
+    assert np.array_equal(ctfr.ctfr_from_specs(X, method="test_min", normalize_input=False, normalize_output=False), np.min(X, axis=0))
+    assert "test_min" in ctfr.utils.private._method_functions
+
+@pytest.mark.parametrize("key", ["_private", "max_from_specs", "not-an-identifier", 3])
+def test_register_method_invalid_key(key):
+    """Test that register_method rejects invalid keys."""
+    with pytest.raises(ValueError):
+        register_method(key, _max)
+
+def test_register_method_invalid_fields():
+    """Test that register_method rejects invalid functions, data types, memory orders and stream states."""
+    with pytest.raises(ValueError):
+        register_method("test_invalid", "numpy.max")
+    with pytest.raises(ValueError):
+        register_method("test_invalid", _max, dtypes=[np.int32])
+    with pytest.raises(ValueError):
+        register_method("test_invalid", _max, dtypes=[])
+    with pytest.raises(ValueError):
+        register_method("test_invalid", _max, memory="P")
+    with pytest.raises(ValueError):
+        register_method("test_invalid", _max, stream_state="ctfr.implementations.fls_cy")
+    assert "test_invalid" not in _methods_dict
+
+def test_register_method_overwrite(registered_keys):
+    """Test that registered keys are only replaced with overwrite=True."""
+    register_method("test_max", _max)
+    registered_keys.append("test_max")
+    with pytest.raises(ValueError):
+        register_method("test_max", _max)
+    register_method("test_max", lambda X: np.min(X, axis=0), overwrite=True)
+    X = np.random.default_rng(0).random((3, 8, 10))
+    assert np.array_equal(ctfr.ctfr_from_specs(X, method="test_max", normalize_input=False, normalize_output=False), np.min(X, axis=0))
+
+def test_unregister_method():
+    """Test that unregistered methods and their aliases are removed."""
+    register_method("test_max", _max)
+    assert callable(ctfr.methods.test_max_from_specs)
+    unregister_method("test_max")
+    assert "test_max" not in get_methods_list()
+    assert not hasattr(ctfr.methods, "test_max_from_specs")
+    with pytest.raises(InvalidCombinationMethodError):
+        unregister_method("test_max")
+
+@pytest.mark.parametrize("method", ["mean", "fls", "sls_i"])
+def test_get_method_capabilities(method):
+    """Test that the capabilities of the included methods match their entries."""
+    capabilities = get_method_capabilities(method)
+    assert capabilities.dtypes == (np.dtype(np.float32), np.dtype(np.float64))
+    assert capabilities.request_tfrs_info == _methods_dict[method].get("request_tfrs_info", False)
+    assert capabilities.request_shared_intermediates == _methods_dict[method].get("request_shared_intermediates", False)
+    assert capabilities.thread_safe
+    assert capabilities.streaming == ("time_lobe" in _methods_dict[method])
+    assert capabilities.memory in ("KM", "PKM")
+
+def test_get_method_capabilities_invalid():
+    """Test that get_method_capabilities raises error for invalid method."""
+    with pytest.raises(InvalidCombinationMethodError):
+        get_method_capabilities("nonexistent_method")
+
+def test_unsupported_dtype_conversion(registered_keys):
+    """Test that tensors of data types not supported by a method are converted, and the result is converted back."""
+    received = []
+    def _recording_max(X):
+        received.append(X.dtype)
+        return _max(X)
+    register_method("test_max", _recording_max, dtypes=[np.float64])
+    registered_keys.append("test_max")
+    X = np.random.default_rng(0).random((3, 8, 10)).astype(np.float32)
+
+    result = ctfr.ctfr_from_specs(X, method="test_max", dtype=np.float32, normalize_input=False, normalize_output=False)
+    assert received == [np.float64]
+    assert result.dtype == np.float32
+    assert np.array_equal(result, _max(X))
+
+def test_thread_unsafe_method_serialized(registered_keys):
+    """Test that concurrent calls to a method that isn't thread-safe run one at a time."""
+    running = []
+    overlaps = []
+    def _slow_max(X):
+        running.append(None)
+        overlaps.append(len(running) > 1)
+        time.sleep(0.01)
+        running.pop()
+        return _max(X)
+    register_method("test_max", _slow_max, thread_safe=False)
+    registered_keys.append("test_max")
+    X = np.random.default_rng(0).random((3, 8, 10))
+
+    results = ctfr.ctfr_from_specs_batch([X] * 4, method="test_max", n_workers=4)
+    assert all(np.allclose(result, results[0]) for result in results)
+    assert not any(overlaps)
+    assert not get_method_capabilities("test_max").thread_safe
+
+class _FakeEntryPoint:
+    def __init__(self, name, value, obj):
+        self.name = name
+        self.value = value
+        self.obj = obj
+
+    def load(self):
+        if isinstance(self.obj, Exception):
+            raise self.obj
+        return self.obj
+
+def test_entry_point_methods(monkeypatch, registered_keys):
+    """Test that methods advertised through entry points are discovered when first requested."""
+    entry_points = [
+        _FakeEntryPoint("test_plugin_max", "plugin:entry", {"name": "Plugin maximum", "function": _max, "memory": "KM"}),
+        _FakeEntryPoint("test_plugin_min", "plugin:min", lambda X: np.min(X, axis=0)),
+        _FakeEntryPoint("test_plugin_broken", "plugin:broken", ImportError("No module named 'plugin'")),
+        _FakeEntryPoint("mean", "plugin:mean", _max),
+    ]
+    def _entry_points(group):
+        assert group == "ctfr.methods"
+        return entry_points
+    monkeypatch.setattr(importlib.metadata, "entry_points", _entry_points)
+    monkeypatch.setattr(ctfr.utils.private, "_entry_points_loaded", False)
+    registered_keys.extend(["test_plugin_max", "test_plugin_min"])
+
+    with pytest.warns(MethodNotLoadedWarning) as record:
+        assert get_method_name("test_plugin_max") == "Plugin maximum"
+    assert len(record) == 2
+    assert get_method_capabilities("test_plugin_max").memory == "KM"
+    assert "test_plugin_min" in get_methods_list()
+    assert "test_plugin_broken" not in get_methods_list()
+    assert _methods_dict["mean"]["name"] == "Binwise mean"
+
+    X = np.random.default_rng(0).random((3, 8, 10))
+    assert np.array_equal(ctfr.methods.test_plugin_min_from_specs(X, normalize_input=False, normalize_output=False), np.min(X, axis=0))
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from ctfr import ctfr, ctfr_from_specs, profile
+
+@pytest.fixture
+def signal():
+    return np.random.default_rng(0).standard_normal(5000)
+
+def test_profile_ctfr_stages(signal):
+    with profile() as prof:
+        result = ctfr(signal, 22050, "sls_i")
+    paths = [record.path for record in prof.records]
+    assert paths == [
+        "spectrograms",
+        "normalize_input",
+        "combination",
+        "combination/local_energy",
+        "combination/local_sparsity",
+        "combination/combination",
+        "normalize_output",
+    ]
+    combination = prof.records[2]
+    assert combination.info == {"method": "sls_i"}
+    assert combination.shape == result.shape
+    assert all(record.wall_time >= 0 for record in prof.records)
+    assert all(record.allocated_bytes is None for record in prof.records)
+
+def test_profile_from_specs_stages():
+    specs = np.random.default_rng(0).random((3, 8, 10))
+    with profile() as prof:
+        ctfr_from_specs(specs, "lt")
+    assert [record.path for record in prof.records] == [
+        "stack", "normalize_input", "combination", "combination/smearing", "combination/combination", "normalize_output"
+    ]
+    assert prof.records[0].shape == (3, 8, 10)
+
+def test_profile_energy_gate():
+    specs = np.random.default_rng(0).random((3, 8, 10))
+    with profile() as prof:
+        ctfr_from_specs(specs, "fls", energy_criterium_db=np.inf)
+    gate = next(record for record in prof.records if record.path == "combination/energy_gate")
+    assert gate.info == {"skipped_fraction": 1.0}
+
+def test_profile_callback_and_memory(signal):
+    records = []
+    with profile(callback=records.append, trace_memory=True) as prof:
+        ctfr(signal, 22050, "mean")
+    # The callback receives each record when its stage ends.
+    assert sorted(records, key=prof.records.index) == prof.records
+    spectrograms = prof.records[0]
+    assert spectrograms.peak_bytes >= spectrograms.allocated_bytes >= np.prod(spectrograms.shape) * 8
+    assert list(prof.summary()) == ["spectrograms", "normalize_input", "combination", "normalize_output"]
+    assert "combination" in prof.report()
+
+def test_no_profile_outside_context(signal):
+    with profile() as prof:
+        pass
+    ctfr(signal, 22050, "mean")
+    assert prof.records == []